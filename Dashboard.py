@@ -1,28 +1,64 @@
+import json
+import os
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import numpy as np # Adicionado para operações numéricas e seleção de tipos
+import plotly.graph_objects as go
+
+from manufatura import atualizacao, correlacao, exportacao, ingestao, nucleo, perfil
 
 st.set_page_config(layout="wide") # Movido para o início
+# O dataset é compartilhado entre sessões: com copy-on-write, qualquer alteração em um
+# recorte dele gera uma cópia local em vez de escrever nos dados de todos
+pd.set_option('mode.copy_on_write', True)
+
+# Medição das fases desta execução (manufatura/perfil.py). O tempo é sempre medido; a memória só
+# com o diagnóstico ligado e pedida, porque o tracemalloc deixa tudo várias vezes mais lento.
+# Os widgets do diagnóstico ficam mais abaixo, mas seus valores já estão no session_state
+ARQUIVO_LOG_PERFIL = os.environ.get('DASHBOARD_PERFIL_LOG')  # Uma linha JSON por execução, se definido
+if 'perfil' in st.session_state:
+    st.session_state['perfil'].stop()  # Execução anterior interrompida antes do fim
+perfil_execucao = perfil.Perfil(
+    memoria=st.session_state.get('diagnostico', False) and st.session_state.get('diagnostico_memoria', False),
+    rastrear=st.session_state.pop('rastrear_execucao', False),
+).start()
+st.session_state['perfil'] = perfil_execucao
+
+def mostrar_grafico(fig):
+    # A conversão da figura para JSON é medida à parte da montagem da figura
+    with perfil.fase('serializacao_grafico'):
+        st.plotly_chart(fig, use_container_width=True)
 
 # --------------------
 #        Dados
 # --------------------
 
+ARQUIVO_DADOS = 'smart_manufacturing_data.csv'
+# Exportações até este número de linhas são preparadas automaticamente; acima, só a pedido
+LIMITE_EXPORTACAO_AUTOMATICA = 250_000
+OPCOES_LINHAS_POR_PAGINA = [50, 100, 500, 1000]
+INTERVALO_ATUALIZACAO = 5  # Segundos entre verificações de linhas novas no CSV
+PONTOS_POR_SERIE = 1000  # Pontos por série no gráfico de tendências (~largura do gráfico em pixels)
+MAX_MAQUINAS_TENDENCIA = 8
+
 # Cache data loading to improve performance
-@st.cache_data
-def load_data(file_path):
-    df_loaded = pd.read_csv(file_path)
-    #Eliminar todas as linhas com valores Nan
-    df_loaded.dropna(axis=0, inplace=True)
-    df_loaded.reset_index(drop=True, inplace=True)
-    #Separando os valores de data e hora
-    df_loaded['timestamp'] = pd.to_datetime(df_loaded['timestamp'])
-    df_loaded['date'] = df_loaded['timestamp'].dt.date
-    df_loaded['time'] = df_loaded['timestamp'].dt.time
-    return df_loaded
-
-df_original = load_data('smart_manufacturing_data.csv')
+# O processamento fica em manufatura/nucleo.py (sem Streamlit): cache colunar, cubo de
+# agregação, motor de filtros e estatísticas de correlação. cache_resource guarda um único
+# Dataset, somente leitura, para o processo inteiro: todas as sessões e reruns usam o mesmo
+# objeto, sem a cópia que o cache_data faria. Cada sessão guarda só os filtros selecionados.
+# Uma thread em segundo plano ingere as linhas anexadas ao CSV e publica um novo Dataset
+# (snapshot) sem recarregar o arquivo inteiro
+@st.cache_resource
+def load_refresher(file_path):
+    return atualizacao.Refresher(file_path, INTERVALO_ATUALIZACAO).start()
+
+with perfil.fase('dados'):
+    atualizador = load_refresher(ARQUIVO_DADOS)
+snapshot = atualizador.snapshot # Fixo durante a execução: todas as abas veem os mesmos dados
+dataset = snapshot.dataset
 
 # --------------------
 #       FILTROS STREAMLIT
@@ -30,10 +66,10 @@ df_original = load_data('smart_manufacturing_data.csv')
 st.sidebar.header("Filtros")
 
 # Opções para filtros (baseadas no dataset original completo)
-lista_maquinas_original = ['Todas'] + sorted(df_original['machine'].unique().tolist())
-min_date_original = df_original['date'].min()
-max_date_original = df_original['date'].max()
-lista_tipos_falha_original = ['Todos'] + sorted(df_original['failure_type'].unique().tolist())
+lista_maquinas_original = [nucleo.OPCAO_TODAS_MAQUINAS] + dataset.maquinas
+min_date_original = dataset.data_min
+max_date_original = dataset.data_max
+lista_tipos_falha_original = [nucleo.OPCAO_TODOS_TIPOS] + dataset.tipos_falha
 
 # Filtro de Máquina
 maquinas_selecionadas = st.sidebar.multiselect(
@@ -53,142 +89,71 @@ tipos_falha_selecionados = st.sidebar.multiselect(
     default=['Todos']
 )
 
-# Aplicar filtros ao DataFrame
-df = df_original.copy()
+# Spearman exato reordena todas as colunas; o modo aproximado usa uma amostra uniforme. No
+# backend em disco o aproximado é o padrão: o exato carrega as colunas filtradas na memória
+spearman_aproximado = st.sidebar.checkbox(
+    "Spearman aproximado (amostragem)",
+    value=dataset.backend.spearman_aproximado,
+    help="Calcula a correlação de Spearman sobre uma amostra uniforme das linhas filtradas. "
+         "Mais rápido em grandes volumes; o erro máximo estimado é mostrado na aba de correlação."
+)
+
+# Com a atualização automática, o painel é refeito quando chegam linhas novas
+atualizacao_automatica = st.sidebar.toggle(
+    "Atualização automática",
+    value=False,
+    help=f"Verifica a cada {INTERVALO_ATUALIZACAO} s se o arquivo de dados recebeu linhas novas "
+         "e atualiza o painel."
+)
+
+# Aba com o tempo e a memória de cada fase da execução, para achar o que deixa o painel lento
+diagnostico = st.sidebar.toggle(
+    "Diagnóstico de desempenho",
+    key='diagnostico',
+    help="Mostra uma aba com o tempo de cada fase desta execução (carga, filtros, agregações, "
+         "correlação, montagem e serialização dos gráficos), com exportação das medidas."
+)
 
 # --------------------------
 #    Tratamento de Dados
 # --------------------------
-if data_inicio_selecionada > data_fim_selecionada:
+if not nucleo.dates_valid(data_inicio_selecionada, data_fim_selecionada):
     st.sidebar.error("Erro: Data de início não pode ser posterior à data de fim.")
-    # Mantém o df com todos os dados ou o último estado válido em vez de parar
+    # Mantém todos os dados em vez de parar (normalize_filters ignora o intervalo inválido)
     # Ou você pode optar por st.stop() se preferir interromper a renderização
-else:
-    df = df[(df['date'] >= data_inicio_selecionada) & (df['date'] <= data_fim_selecionada)]
-
-if not ('Todas' in maquinas_selecionadas or not maquinas_selecionadas):
-    df = df[df['machine'].isin(maquinas_selecionadas)]
 
-if not ('Todos' in tipos_falha_selecionados or not tipos_falha_selecionados):
-    df = df[df['failure_type'].isin(tipos_falha_selecionados)]
+# Filtros normalizados: None significa "sem filtro" na dimensão
+filtros = nucleo.normalize_filters(data_inicio_selecionada, data_fim_selecionada,
+                                   maquinas_selecionadas, tipos_falha_selecionados)
 
-# O restante do tratamento de dados e geração de tabelas/gráficos usará o 'df' filtrado.
-# É importante adicionar verificações para 'df.empty' antes de cada operação de groupby ou plotagem
-# para evitar erros se a combinação de filtros resultar em um DataFrame vazio.
+# Aplicar filtros: as abas consultam o backend com os filtros e só materializam o que exibem
+# (cubo agregado, página da tabela, séries reduzidas); aqui basta o número de linhas
+with perfil.fase('filtro'):
+    total_filtrado = dataset.count(filtros)
 
 # --------------------
 #        TABELAS E CÁLCULOS DE CORRELAÇÃO
 # --------------------
 
-# Inicializar DataFrames de correlação como vazios
-corr_pearson = pd.DataFrame()
-corr_spearman = pd.DataFrame()
-# Inicializar variáveis para métricas
-maquina_mais_paradas = "N/A"
-cont_mais_paradas = 0
-maquina_menos_paradas = "N/A"
-cont_menos_paradas = 0
-
-
-if not df.empty:
-    media_consumo_energia = df.groupby('machine')['energy_consumption'].mean().reset_index()
-    mediatemp = df.groupby('machine')['temperature'].mean().reset_index()
-    media_press = df.groupby('machine')['pressure'].mean().reset_index()
-    media_vibration = df.groupby('machine')['vibration'].mean().reset_index()
-
-    df_manutencao = df[df['maintenance_required'] == "Yes"]
-    if not df_manutencao.empty:
-        df_manutencao_required = df_manutencao.groupby('machine')['maintenance_required'].count().reset_index(name='contagem_manutencao')
-    else:
-        df_manutencao_required = pd.DataFrame(columns=['machine', 'contagem_manutencao'])
-
-    rodando_count = df[df['machine_status'] == "Running"]['machine'].count()
-    total_count_filtrado = df['machine'].count()
-    perc_rodando = (rodando_count / total_count_filtrado) * 100 if total_count_filtrado > 0 else 0
-
-    falha_count = df[df['machine_status'] == "Failure"]['machine'].count()
-    perc_falha = (falha_count / total_count_filtrado) * 100 if total_count_filtrado > 0 else 0
-
-    parada_count_total = df[df['machine_status'] == "Idle"]['machine'].count() # Renomeado para evitar conflito
-    perc_parada = (parada_count_total / total_count_filtrado) * 100 if total_count_filtrado > 0 else 0
-
-    # Cálculo para métricas de paradas por máquina
-    df_paradas_maquina = df[df['machine_status'] == 'Idle']
-    if not df_paradas_maquina.empty:
-        contagem_paradas_por_maquina = df_paradas_maquina.groupby('machine')['machine_status'].count().sort_values(ascending=False)
-        if not contagem_paradas_por_maquina.empty:
-            maquina_mais_paradas = contagem_paradas_por_maquina.index[0]
-            cont_mais_paradas = contagem_paradas_por_maquina.iloc[0]
-            maquina_menos_paradas = contagem_paradas_por_maquina.index[-1]
-            cont_menos_paradas = contagem_paradas_por_maquina.iloc[-1]
-
-    df_status_maquinas = pd.DataFrame({
-        'Status': ['Rodando', 'Em Falha', 'Paradas'],
-        'Porcentagem': [perc_rodando, perc_falha, perc_parada]
-    })
-    df_status_maquinas = df_status_maquinas[df_status_maquinas['Porcentagem'] > 0.001] # Evitar floats muito pequenos
-
-    df_idle_failure = df[df['machine_status'].isin(['Idle', 'Failure'])]
-    if not df_idle_failure.empty:
-        contagem_status_por_falha = df_idle_failure.groupby(['failure_type', 'machine_status']).size().reset_index(name='contagem')
-        contagem_status_por_falha.loc[
-            (contagem_status_por_falha['machine_status'] == 'Idle') & (contagem_status_por_falha['failure_type'] == 'No Failure'),
-            'failure_type'
-        ] = 'Parada Programada/Outra'
-        contagem_status_por_falha.loc[
-            (contagem_status_por_falha['machine_status'] == 'Failure') & (contagem_status_por_falha['failure_type'] == 'No Failure'),
-            'failure_type'
-        ] = 'Falha (Tipo Não Especificado)'
-    else:
-        contagem_status_por_falha = pd.DataFrame(columns=['failure_type', 'machine_status', 'contagem'])
-
-    df_falhas_reais = df[df['machine_status'] == 'Failure']
-    df_falhas_reais = df_falhas_reais[df_falhas_reais['failure_type'] != 'No Failure']
-    if not df_falhas_reais.empty:
-        contagem_tipos_falha_por_maquina = df_falhas_reais.groupby(['machine', 'failure_type']).size().reset_index(name='quantidade_falhas')
-    else:
-        contagem_tipos_falha_por_maquina = pd.DataFrame(columns=['machine', 'failure_type', 'quantidade_falhas'])
-
-    # Renomear colunas de valor para evitar conflitos e para clareza no melt
-    media_consumo_energia = media_consumo_energia.rename(columns={'energy_consumption': 'Consumo de Energia'})
-    mediatemp = mediatemp.rename(columns={'temperature': 'Temperatura'})
-    media_press = media_press.rename(columns={'pressure': 'Pressão'})
-    media_vibration = media_vibration.rename(columns={'vibration': 'Vibração'})
-
-    # Unir os DataFrames
-    df_medias_combinadas = mediatemp.merge(media_press, on='machine', how='left')
-    df_medias_combinadas = df_medias_combinadas.merge(media_vibration, on='machine', how='left')
-    df_medias_combinadas = df_medias_combinadas.merge(media_consumo_energia, on='machine', how='left')
-    df_medias_combinadas.dropna(inplace=True) # Remove linhas se alguma métrica estiver faltando para uma máquina
-
-    if not df_medias_combinadas.empty:
-        df_medias_melted = df_medias_combinadas.melt(id_vars=['machine'],
-                                                     value_vars=['Temperatura', 'Pressão', 'Vibração', 'Consumo de Energia'],
-                                                     var_name='Metrica',
-                                                     value_name='Valor Médio')
-    else:
-        df_medias_melted = pd.DataFrame(columns=['machine', 'Metrica', 'Valor Médio'])
-
-    # Dados para correlação
-    numeric_df = df.select_dtypes(include=np.number)
-    # Remover colunas que não fazem sentido para correlação direta ou que são identificadores
-    cols_to_drop_corr = ['Unnamed: 0'] # Adicione outras colunas se necessário (ex: colunas de ID se não forem numéricas por natureza)
-    numeric_df = numeric_df.drop(columns=cols_to_drop_corr, errors='ignore')
-    
-    if numeric_df.shape[1] > 1: # Precisa de pelo menos 2 colunas numéricas para calcular correlação
-        corr_pearson = numeric_df.corr(method='pearson')
-        corr_spearman = numeric_df.corr(method='spearman')
-
-    # else: corr_pearson e corr_spearman permanecem como DataFrames vazios inicializados antes do if not df.empty
-
-else: # Caso df esteja vazio após filtros
-    # Criar DataFrames vazios para evitar erros nos gráficos
-    df_medias_melted = pd.DataFrame(columns=['machine', 'Metrica', 'Valor Médio'])
-    df_manutencao_required = pd.DataFrame(columns=['machine', 'contagem_manutencao'])
-    df_status_maquinas = pd.DataFrame(columns=['Status', 'Porcentagem'])
-    contagem_status_por_falha = pd.DataFrame(columns=['failure_type', 'machine_status', 'contagem'])
-    contagem_tipos_falha_por_maquina = pd.DataFrame(columns=['machine', 'failure_type', 'quantidade_falhas'])
-    # corr_pearson e corr_spearman já foram inicializados como DataFrames vazios
+# Indicadores da Visão Geral, a partir do cubo pré-agregado (DataFrames vazios se não houver dados).
+# Guardados no cache do Dataset pelos filtros normalizados, então são compartilhados entre sessões
+with perfil.fase('kpis'):
+    kpis = dataset.kpis(filtros)
+df_medias_melted = kpis.medias_melted
+df_manutencao_required = kpis.manutencao
+df_status_maquinas = kpis.status_maquinas
+contagem_status_por_falha = kpis.status_por_falha
+contagem_tipos_falha_por_maquina = kpis.tipos_falha_por_maquina
+maquina_mais_paradas, cont_mais_paradas = kpis.maquina_mais_paradas, kpis.cont_mais_paradas
+maquina_menos_paradas, cont_menos_paradas = kpis.maquina_menos_paradas, kpis.cont_menos_paradas
+
+# Correlações (matrizes vazias se não houver dados ou colunas numéricas suficientes)
+with perfil.fase('correlacao'):
+    correlacoes = dataset.correlations(filtros, spearman_aproximado)
+colunas_corr = correlacoes.colunas
+corr_pearson = correlacoes.pearson
+corr_spearman = correlacoes.spearman
+erro_spearman = correlacoes.erro_spearman
 
 # --------------------
 #       LAYOUT STREAMLIT
@@ -196,12 +161,14 @@ else: # Caso df esteja vazio após filtros
 st.title("Dashboard de Manufatura Inteligente")
 
 # Criar abas
-tab_principal, tab_correlacao, tab_tabela_dados = st.tabs(["Visão Geral", "Análise de Correlação", "Tabela de Dados"])
+abas = st.tabs(["Visão Geral", "Tendências dos Sensores", "Análise de Correlação", "Tabela de Dados"]
+               + (["Diagnóstico"] if diagnostico else []))
+tab_principal, tab_tendencias, tab_correlacao, tab_tabela_dados = abas[:4]
 
-with tab_principal:
-    if df.empty and not ('Todas' in maquinas_selecionadas or not maquinas_selecionadas): # Adicionado para cobrir caso de filtro de data resultar em df vazio
+with tab_principal, perfil.fase('visao_geral'):
+    if total_filtrado == 0 and not ('Todas' in maquinas_selecionadas or not maquinas_selecionadas): # Adicionado para cobrir caso de filtro de data resultar em df vazio
         st.warning("Nenhuma máquina selecionada ou dados disponíveis para a seleção e período.")
-    elif df.empty:
+    elif total_filtrado == 0:
         st.warning("Não há dados disponíveis para o período selecionado.")
     else:
         # Métricas de Paradas
@@ -226,7 +193,7 @@ with tab_principal:
                                                       title='Médias de Sensores por Máquina',
                                                       markers=True,
                                                       labels={'machine': 'Máquina', 'Valor Médio': 'Valor Médio da Métrica', 'Metrica': 'Tipo de Métrica'})
-                st.plotly_chart(fig_medias_combinadas_linha, use_container_width=True)
+                mostrar_grafico(fig_medias_combinadas_linha)
             else:
                 st.info("Sem dados de médias de sensores para exibir para a seleção atual.")
 
@@ -240,7 +207,7 @@ with tab_principal:
                                                                        'Em Falha':'red',
                                                                        'Paradas': 'orange',
                                                                        'Outros':'lightgrey'})
-                st.plotly_chart(fig_status_maquinas_rosca, use_container_width=True)
+                mostrar_grafico(fig_status_maquinas_rosca)
             else:
                 st.info("Sem dados de status das máquinas para exibir para a seleção atual.")
 
@@ -258,7 +225,7 @@ with tab_principal:
                                                              'machine_status': "Status da Máquina"},
                                                      color_discrete_map={'Idle': 'orange',
                                                                          'Failure': 'red'})
-                st.plotly_chart(fig_status_por_falha_barras, use_container_width=True)
+                mostrar_grafico(fig_status_por_falha_barras)
             else:
                 st.info("Sem dados de ocorrências de parada/falha para exibir para a seleção atual.")
 
@@ -269,7 +236,7 @@ with tab_principal:
                                                title='Número de Manutenções Necessárias por Máquina',
                                                labels={'machine': 'Máquina', 'contagem_manutencao': 'Número de Manutenções'},
                                                color='machine')
-                st.plotly_chart(fig_manutencao_barras, use_container_width=True)
+                mostrar_grafico(fig_manutencao_barras)
             else:
                 st.info("Sem dados de manutenção para exibir para a seleção atual.")
 
@@ -285,17 +252,77 @@ with tab_principal:
                                                 labels={'machine': 'Máquina',
                                                         'quantidade_falhas': 'Número de Falhas',
                                                         'failure_type': 'Tipo de Falha'})
-            st.plotly_chart(fig_tipos_falha_maquina, use_container_width=True)
+            mostrar_grafico(fig_tipos_falha_maquina)
         else:
             st.info("Sem dados de tipos de falha por máquina para exibir para a seleção atual.")
 
-with tab_correlacao:
+with tab_tendencias, perfil.fase('tendencias'):
+    st.header("Tendências dos Sensores")
+
+    if total_filtrado > 0:
+        col_sensor, col_maquinas_tendencia = st.columns([1, 3])
+        sensor_tendencia = col_sensor.selectbox("Sensor:", options=list(nucleo.NOMES_SENSORES),
+                                                format_func=nucleo.NOMES_SENSORES.get)
+        opcoes_maquinas_tendencia = list(filtros.maquinas or dataset.maquinas)
+        maquinas_tendencia = col_maquinas_tendencia.multiselect(
+            "Máquinas no gráfico:",
+            options=opcoes_maquinas_tendencia,
+            default=opcoes_maquinas_tendencia[:3],
+            max_selections=MAX_MAQUINAS_TENDENCIA,
+        )
+
+        # Zoom no período dos filtros; a série é reduzida de novo no servidor para o trecho escolhido
+        inicio_periodo = datetime.combine(filtros.data_inicio or dataset.data_min, time.min)
+        fim_periodo = datetime.combine(filtros.data_fim or dataset.data_max, time.max).replace(microsecond=0)
+        inicio_zoom, fim_zoom = st.slider("Período:", min_value=inicio_periodo, max_value=fim_periodo,
+                                          value=(inicio_periodo, fim_periodo), step=timedelta(hours=1),
+                                          format="DD/MM/YY HH:mm")
+
+        fig_tendencia = go.Figure()
+        resolucoes, pontos_exibidos, linhas_cobertas, com_faixa = set(), 0, 0, False
+        cores = px.colors.qualitative.Plotly
+        for i, maquina in enumerate(maquinas_tendencia):
+            with perfil.fase('series'):
+                serie = dataset.trend(filtros, maquina, sensor_tendencia, inicio_zoom, fim_zoom, PONTOS_POR_SERIE)
+            pontos = serie.pontos
+            resolucoes.add(serie.resolucao)
+            pontos_exibidos += len(pontos)
+            linhas_cobertas += serie.linhas
+            cor = cores[i % len(cores)]
+            if (pontos['minimo'] != pontos['maximo']).any():
+                com_faixa = True
+                # Faixa mínimo–máximo de cada intervalo agregado, atrás da média
+                fig_tendencia.add_trace(go.Scatter(x=pontos['timestamp'], y=pontos['maximo'], mode='lines',
+                                                   line=dict(width=0, color=cor), legendgroup=maquina,
+                                                   showlegend=False, hoverinfo='skip'))
+                fig_tendencia.add_trace(go.Scatter(x=pontos['timestamp'], y=pontos['minimo'], mode='lines',
+                                                   line=dict(width=0, color=cor), fill='tonexty', opacity=0.2,
+                                                   legendgroup=maquina, showlegend=False, hoverinfo='skip'))
+            fig_tendencia.add_trace(go.Scatter(x=pontos['timestamp'], y=pontos['media'], mode='lines',
+                                               name=maquina, legendgroup=maquina, line=dict(color=cor)))
+
+        if pontos_exibidos > 0:
+            fig_tendencia.update_layout(title=f'{nucleo.NOMES_SENSORES[sensor_tendencia]} ao Longo do Tempo',
+                                        xaxis_title='Data', yaxis_title=nucleo.NOMES_SENSORES[sensor_tendencia],
+                                        legend_title='Máquina')
+            mostrar_grafico(fig_tendencia)
+            contagens = f"{pontos_exibidos:,} pontos exibidos de {linhas_cobertas:,} leituras".replace(',', '.')
+            st.caption(f"{contagens}; resolução: {', '.join(sorted(resolucoes))}."
+                       + (" A faixa sombreada mostra o mínimo e o máximo de cada intervalo." if com_faixa else ""))
+        elif maquinas_tendencia:
+            st.info("Sem leituras das máquinas selecionadas no período.")
+        else:
+            st.info("Selecione ao menos uma máquina.")
+    else:
+        st.info("Não há dados para exibir com os filtros atuais.")
+
+with tab_correlacao, perfil.fase('graficos_correlacao'):
     st.header("Análise de Correlação") # Título geral da aba
     
-    if df.empty:
+    if total_filtrado == 0:
         st.info("Não há dados para calcular a correlação com os filtros atuais.")
-    # Verifica se numeric_df foi definido (ou seja, df não estava vazio) e se tem colunas suficientes
-    elif 'numeric_df' not in locals() or numeric_df.shape[1] <= 1 : 
+    # Verifica se há colunas numéricas suficientes
+    elif len(colunas_corr) <= 1:
         st.info("Não há variáveis numéricas suficientes (pelo menos 2) para calcular uma matriz de correlação significativa com os filtros atuais.")
     else:
         st.subheader("Heatmap de Correlação de Pearson")
@@ -306,7 +333,7 @@ with tab_correlacao:
                                          color_continuous_scale='RdBu_r', # Escala de cores (Vermelho-Azul)
                                          title="Matriz de Correlação de Pearson entre Variáveis Numéricas")
             fig_corr_pearson.update_layout(height=700) # Ajustar altura se necessário
-            st.plotly_chart(fig_corr_pearson, use_container_width=True)
+            mostrar_grafico(fig_corr_pearson)
             st.markdown("""
             **Correlação de Pearson:** Mede a relação linear entre duas variáveis contínuas.
             - **Valores próximos de +1:** Indicam uma forte correlação linear positiva (quando uma variável aumenta, a outra tende a aumentar).
@@ -314,16 +341,10 @@ with tab_correlacao:
             - **Valores próximos de 0:** Indicam pouca ou nenhuma correlação linear.
             """)
             # Análise da maior correlação de Pearson
-            if not corr_pearson.empty and corr_pearson.shape[0] > 1:
-                # Para encontrar a maior correlação, ignoramos a diagonal (correlação de uma variável consigo mesma)
-                corr_pearson_no_diag = corr_pearson.mask(np.equal(*np.indices(corr_pearson.shape)))
-                max_corr_pearson_val = corr_pearson_no_diag.abs().max().max()
-                # Encontrar os pares
-                s = corr_pearson_no_diag.abs().unstack()
-                so = s.sort_values(kind="quicksort", ascending=False)
-                if not so.empty:
-                    pair_max_corr_pearson = so.index[0]
-                    st.markdown(f"**Análise (Pearson):** O par com maior correlação linear absoluta é **{pair_max_corr_pearson[0]}** e **{pair_max_corr_pearson[1]}** com um valor de **{max_corr_pearson_val:.2f}**.")
+            # Ignora a diagonal (correlação de uma variável consigo mesma) percorrendo só o triângulo superior
+            par_pearson = correlacao.strongest_pair(corr_pearson)
+            if par_pearson is not None:
+                st.markdown(f"**Análise (Pearson):** O par com maior correlação linear absoluta é **{par_pearson[0]}** e **{par_pearson[1]}** com um valor de **{par_pearson[2]:.2f}**.")
         else: # Adicionado para o caso de corr_pearson ser vazio mesmo que numeric_df não seja (improvável com a lógica atual, mas seguro)
             st.info("Não foi possível calcular a correlação de Pearson.")
 
@@ -335,7 +356,7 @@ with tab_correlacao:
                                          color_continuous_scale='RdBu_r', # Escala de cores (Vermelho-Azul)
                                          title="Matriz de Correlação de Spearman entre Variáveis Numéricas")
             fig_corr_spearman.update_layout(height=700) # Ajustar altura se necessário
-            st.plotly_chart(fig_corr_spearman, use_container_width=True)
+            mostrar_grafico(fig_corr_spearman)
             st.markdown("""
             **Correlação de Spearman:** Mede a relação monotônica entre duas variáveis (sejam elas contínuas ou ordinais).
             Verifica se, à medida que uma variável aumenta, a outra tende a aumentar ou diminuir, não necessariamente a uma taxa constante (diferente da linearidade de Pearson).
@@ -344,34 +365,173 @@ with tab_correlacao:
             - **Valores próximos de 0:** Indicam pouca ou nenhuma correlação monotônica.
             """)
             # Análise da maior correlação de Spearman
-            if not corr_spearman.empty and corr_spearman.shape[0] > 1:
-                corr_spearman_no_diag = corr_spearman.mask(np.equal(*np.indices(corr_spearman.shape)))
-                max_corr_spearman_val = corr_spearman_no_diag.abs().max().max()
-                s_spearman = corr_spearman_no_diag.abs().unstack()
-                so_spearman = s_spearman.sort_values(kind="quicksort", ascending=False)
-                if not so_spearman.empty:
-                    pair_max_corr_spearman = so_spearman.index[0]
-                    st.markdown(f"**Análise (Spearman):** O par com maior correlação monotônica absoluta é **{pair_max_corr_spearman[0]}** e **{pair_max_corr_spearman[1]}** com um valor de **{max_corr_spearman_val:.2f}**.")
+            if erro_spearman is not None:
+                st.caption(f"Valores aproximados por amostragem: erro máximo estimado de ±{erro_spearman:.3f} por coeficiente (3 erros padrão).")
+            par_spearman = correlacao.strongest_pair(corr_spearman)
+            if par_spearman is not None:
+                st.markdown(f"**Análise (Spearman):** O par com maior correlação monotônica absoluta é **{par_spearman[0]}** e **{par_spearman[1]}** com um valor de **{par_spearman[2]:.2f}**.")
         else:
             st.info("Não foi possível calcular a correlação de Spearman.")
 
-with tab_tabela_dados:
+with tab_tabela_dados, perfil.fase('tabela_dados'):
     st.header("Tabela de Dados Filtrados")
 
-    # Função para converter DataFrame para CSV
-    @st.cache_data # Cache para evitar reprocessamento desnecessário
-    def convert_df_to_csv(input_df):
-        return input_df.to_csv(index=False).encode('utf-8')
+    if total_filtrado > 0:
+        # Paginação no servidor: busca e ordenação viram posições (em cache por filtros) e só a
+        # página visível é materializada e enviada ao navegador
+        colunas_tabela = list(dataset.columns)
+        col_ordenar, col_direcao, col_tamanho = st.columns([2, 1, 1])
+        ordenar_por = col_ordenar.selectbox("Ordenar por:", options=[None] + colunas_tabela,
+                                            format_func=lambda coluna: "(ordem original)" if coluna is None else coluna)
+        decrescente = col_direcao.checkbox("Decrescente", value=False, disabled=ordenar_por is None)
+        linhas_por_pagina = col_tamanho.selectbox("Linhas por página:", options=OPCOES_LINHAS_POR_PAGINA, index=1)
+
+        col_coluna_busca, col_termo_busca = st.columns([1, 3])
+        coluna_busca = col_coluna_busca.selectbox("Buscar na coluna:", options=colunas_tabela)
+        termo_busca = col_termo_busca.text_input("Termo de busca:",
+                                                 help="Texto contido (colunas de texto), valor exato (números) "
+                                                      "ou prefixo de data/hora, como 2025-01-03 ou 2025-01-03 10:30.")
+        busca = (coluna_busca, termo_busca.strip()) if termo_busca.strip() else None
+
+        def pagina_tabela(numero):
+            with perfil.fase('paginacao'):
+                return dataset.table_page(filtros, numero, linhas_por_pagina, ordenar_por, not decrescente, busca)
+
+        try:
+            pagina = pagina_tabela(1)
+        except ValueError as erro:
+            st.warning(f"{erro}. Mostrando a tabela sem busca.")
+            busca = None
+            pagina = pagina_tabela(1)
+        if pagina.paginas > 1:
+            numero_pagina = st.number_input(f"Página (de {pagina.paginas}):", min_value=1,
+                                            max_value=pagina.paginas, value=1, step=1)
+            pagina = pagina_tabela(int(numero_pagina))
+
+        if pagina.total > 0:
+            inicio_pagina = (pagina.numero - 1) * linhas_por_pagina + 1
+            st.caption(f"Linhas {inicio_pagina:,}–{inicio_pagina + len(pagina.linhas) - 1:,} de "
+                       f"{pagina.total:,}".replace(',', '.'))
+            # 'date' é datetime64 em memória; exibido só com o dia, como antes
+            with perfil.fase('serializacao_tabela'):
+                st.dataframe(ingestao.display_frame(pagina.linhas), use_container_width=True,
+                             column_config={'date': st.column_config.DateColumn('date', format='YYYY-MM-DD')})
+        else:
+            st.info("Nenhuma linha corresponde à busca.")
 
-    if not df.empty:
-        st.dataframe(df, use_container_width=True)
-        
-        csv_data = convert_df_to_csv(df)
-        st.download_button(
-            label="Download da Tabela como CSV",
-            data=csv_data,
-            file_name='dados_filtrados.csv',
-            mime='text/csv',
+        # O arquivo é escrito em disco, em blocos, e reaproveitado para os mesmos filtros e formato
+        formato_exportacao = st.selectbox(
+            "Formato do download:",
+            options=list(exportacao.FORMATOS),
+            format_func=lambda formato: exportacao.FORMATOS[formato].rotulo,
         )
+        formato = exportacao.FORMATOS[formato_exportacao]
+        pedido = (filtros, formato_exportacao)
+        if total_filtrado <= LIMITE_EXPORTACAO_AUTOMATICA or \
+                st.button(f"Preparar arquivo ({total_filtrado:,} linhas)".replace(',', '.')):
+            barra = st.progress(0.0, text="Gerando arquivo...")
+            with perfil.fase('exportacao'):
+                dataset.export_file(filtros, formato_exportacao,
+                                    progresso=lambda fracao: barra.progress(fracao, text=f"Gerando arquivo... {fracao:.0%}"))
+            barra.empty()
+            st.session_state['exportacao'] = pedido
+
+        if st.session_state.get('exportacao') == pedido:
+            st.download_button(
+                label=f"Download da Tabela como {formato.rotulo}",
+                # Lido do disco só quando o usuário clica (e regerado se já tiver sido descartado)
+                data=lambda pedido=pedido: Path(dataset.export_file(*pedido)).read_bytes(),
+                file_name=f'dados_filtrados.{formato.extensao}',
+                mime=formato.mime,
+            )
     else:
         st.info("Não há dados para exibir com os filtros atuais.")
+
+# Contadores do cache de resultados, para dimensionar DASHBOARD_CACHE_MB / DASHBOARD_CACHE_TTL
+with st.sidebar.expander("Cache de resultados"):
+    estatisticas_cache = dataset.cache.stats()
+    st.caption(f"Acertos: {estatisticas_cache.acertos} · Falhas: {estatisticas_cache.falhas} · "
+               f"Despejos: {estatisticas_cache.despejos} · Expirados: {estatisticas_cache.expirados}")
+    st.caption(f"{estatisticas_cache.entradas} entradas, "
+               f"{estatisticas_cache.bytes / 2**20:.1f} de {estatisticas_cache.max_bytes / 2**20:.0f} MB")
+    st.caption(f"Backend de consultas: {dataset.backend.descricao}")
+
+# Fim da execução medida; o que vem abaixo (o próprio diagnóstico) fica de fora
+perfil_execucao.stop()
+if ARQUIVO_LOG_PERFIL:
+    perfil_execucao.append_log(ARQUIVO_LOG_PERFIL, linhas_filtradas=total_filtrado, versao_dados=snapshot.versao)
+if perfil_execucao.rastreado:
+    st.session_state['rastreamento'] = (perfil_execucao.profile_report(), perfil_execucao.profile_data())
+
+if diagnostico:
+    with abas[4]:
+        st.header("Diagnóstico de Desempenho")
+        st.checkbox("Medir memória por fase (tracemalloc)", key='diagnostico_memoria',
+                    help="Registra a memória alocada e o pico de alocação de cada fase. "
+                         "Deixa as execuções várias vezes mais lentas enquanto estiver ligado.")
+
+        total = perfil_execucao.total
+        medidas = pd.DataFrame(perfil_execucao.measures(), columns=perfil.Medida._fields)
+        # Fases internas aparecem como 'externa/interna'; o tempo próprio desconta as internas
+        tabela_fases = pd.DataFrame({
+            'Fase': medidas['fase'],
+            'Chamadas': medidas['chamadas'],
+            'Tempo (ms)': medidas['segundos'] * 1000,
+            'Tempo próprio (ms)': medidas['segundos_proprios'] * 1000,
+            '% do total': medidas['segundos_proprios'] / total.segundos * 100,
+        })
+        if perfil_execucao.memoria:
+            tabela_fases['Alocado (MB)'] = medidas['alocado'] / 2**20
+            tabela_fases['Pico (MB)'] = medidas['pico'] / 2**20
+        nao_medido = total.segundos_proprios * 1000
+        st.caption(f"Execução de {total.segundos * 1000:.0f} ms às {perfil_execucao.inicio:%H:%M:%S}; "
+                   f"{nao_medido:.0f} ms fora das fases (widgets e layout)."
+                   + (f" Pico de memória alocada: {total.pico / 2**20:.1f} MB." if perfil_execucao.memoria else ""))
+        st.dataframe(tabela_fases, use_container_width=True, hide_index=True,
+                     column_config={coluna: st.column_config.NumberColumn(format='%.1f')
+                                    for coluna in tabela_fases.columns[2:]})
+
+        if not tabela_fases.empty:
+            fig_fases = px.bar(tabela_fases.sort_values('Tempo próprio (ms)'), x='Tempo próprio (ms)', y='Fase',
+                               orientation='h', title='Tempo Próprio por Fase')
+            fig_fases.update_layout(height=max(300, 25 * len(tabela_fases)))
+            mostrar_grafico(fig_fases)
+
+        col_json, col_metricas = st.columns(2)
+        col_json.download_button(
+            "Download das medidas (JSON)",
+            data=json.dumps(perfil_execucao.to_dict(linhas_filtradas=total_filtrado, versao_dados=snapshot.versao),
+                            ensure_ascii=False, indent=2),
+            file_name='perfil_execucao.json', mime='application/json')
+        col_metricas.download_button(
+            "Download das métricas (Prometheus)",
+            data=perfil_execucao.to_metrics(), file_name='perfil_execucao.prom', mime='text/plain')
+        if ARQUIVO_LOG_PERFIL:
+            st.caption(f"Cada execução também é registrada em {ARQUIVO_LOG_PERFIL} (uma linha JSON por execução).")
+
+        # Rastreamento completo, função a função, de uma execução: o clique agenda o cProfile
+        # para a execução que ele mesmo dispara
+        st.subheader("Rastreamento com cProfile")
+        st.button("Rastrear uma execução",
+                  on_click=lambda: st.session_state.update(rastrear_execucao=True),
+                  help="Refaz o painel sob o cProfile e mostra as funções mais custosas. "
+                       "O arquivo .prof pode ser aberto com pstats ou snakeviz.")
+        if perfil_execucao.rastrear and not perfil_execucao.rastreado:
+            st.warning("Não foi possível rastrear: outro profiler está ativo no processo.")
+        if 'rastreamento' in st.session_state:
+            relatorio, dados_rastreamento = st.session_state['rastreamento']
+            st.code(relatorio, language=None)
+            st.download_button("Download do rastreamento (.prof)", data=dados_rastreamento,
+                               file_name='rastreamento.prof', mime='application/octet-stream')
+
+if atualizacao_automatica:
+    # Só este fragmento roda periodicamente; o painel inteiro é refeito apenas se houver snapshot novo
+    @st.fragment(run_every=INTERVALO_ATUALIZACAO)
+    def verificar_atualizacao():
+        if atualizador.snapshot.versao != snapshot.versao:
+            st.rerun()
+        linhas_carregadas = f"{len(dataset):,}".replace(',', '.')
+        st.caption(f"{linhas_carregadas} linhas carregadas, até {dataset.data_max:%d/%m/%Y}.")
+
+    with st.sidebar:
+        verificar_atualizacao()
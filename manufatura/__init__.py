@@ -0,0 +1 @@
+"""Rotinas de dados do dashboard de manufatura inteligente (sem dependência do Streamlit)."""
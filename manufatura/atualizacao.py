@@ -0,0 +1,79 @@
+"""Atualização ao vivo do dataset enquanto o CSV recebe linhas novas.
+
+Um ``Refresher`` guarda o ``Dataset`` corrente de um arquivo e, numa thread
+em segundo plano, verifica o CSV a cada ``intervalo`` segundos. Linhas
+anexadas são ingeridas incrementalmente (``ingestao.update_columnar_cache``)
+e viram um novo ``Dataset`` (``Dataset.append``); se o arquivo foi
+reescrito, o dataset é recarregado do cache reconstruído.
+
+O novo dataset é montado à parte e publicado numa única atribuição do
+``Snapshot`` (dataset + versão). Quem leu o snapshot anterior continua com
+ele até o fim da execução; a próxima leitura já vê o novo.
+"""
+import logging
+import threading
+from collections import namedtuple
+
+from manufatura import ingestao
+from manufatura.cache import ResultCache
+from manufatura.nucleo import Dataset
+
+INTERVALO_PADRAO = 5.0  # Segundos entre verificações do CSV
+
+Snapshot = namedtuple('Snapshot', ['dataset', 'versao'])
+
+logger = logging.getLogger(__name__)
+
+
+class Refresher:
+    """Mantém o ``Dataset`` mais recente de ``file_path``."""
+
+    def __init__(self, file_path, intervalo=INTERVALO_PADRAO, dataset=None):
+        self.file_path = file_path
+        self.intervalo = intervalo
+        self.snapshot = Snapshot(dataset or Dataset.load(file_path), 0)
+        self._trava = threading.Lock()  # Uma atualização por vez
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def dataset(self):
+        return self.snapshot.dataset
+
+    def refresh(self):
+        """Ingere o que foi anexado ao CSV; retorna True se publicou um novo snapshot."""
+        with self._trava:
+            atual = self.snapshot
+            atualizacao = ingestao.update_columnar_cache(self.file_path)
+            if atualizacao.reconstruido:
+                cache = atual.dataset.cache
+                dataset = Dataset.load(self.file_path, ResultCache(cache.max_bytes, cache.ttl),
+                                       atual.dataset.backend.nome)
+            elif atualizacao.novas_linhas is not None:
+                dataset = atual.dataset.append(atualizacao)
+            else:
+                return False
+            self.snapshot = Snapshot(dataset, atual.versao + 1)
+            return True
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.refresh()
+            except Exception:
+                # Um CSV momentaneamente ilegível não deve matar a thread
+                logger.exception("Falha ao atualizar %s", self.file_path)
+
+    def start(self):
+        """Inicia a verificação periódica em segundo plano (idempotente)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._executar, name='atualizacao-dataset',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,857 @@
+"""Backends de consulta: onde ficam as linhas e os agregados que o dashboard consulta.
+
+O ``Dataset`` (``manufatura.nucleo``) faz todas as consultas por filtros
+através de um ``QueryBackend``: o cubo de agregação da Visão Geral (médias
+por máquina, contagens por status, falhas por tipo), as páginas da tabela,
+os blocos da exportação e as séries dos sensores. Há duas implementações:
+
+- ``PandasBackend``: o histórico inteiro em memória, com o motor de filtros
+  indexado (``manufatura.filtros``) e o cubo (``manufatura.cubo``). É o
+  mais rápido enquanto os dados cabem na RAM.
+- ``SQLiteBackend``: as linhas e o cubo num banco SQLite em disco, ao lado
+  do cache colunar, com índices por data, máquina e tipo de falha. O
+  histórico nunca é carregado: o banco filtra, ordena e agrega, e só o
+  resultado (o cubo já somado, uma página, um bloco da exportação) chega ao
+  pandas. As estatísticas de correlação também ficam no banco (somas por
+  partição e o esboço de amostragem), e o Spearman é aproximado por
+  padrão: o exato precisa das colunas filtradas inteiras em memória.
+  Serve históricos maiores que a memória.
+
+O backend é escolhido pelo nome (``BACKENDS``), em ``Dataset.load`` ou pela
+variável de ambiente ``DASHBOARD_BACKEND`` (``pandas``, o padrão, ou
+``sqlite``).
+"""
+import glob
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import weakref
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+
+from manufatura import correlacao, cubo, exportacao, ingestao, paralelo, perfil, series, tabela
+from manufatura.filtros import FilterEngine
+from manufatura.vetores import AppendableFrame
+
+BACKEND_PADRAO = 'pandas'
+PADRAO_BANCO = 'consultas-*.sqlite'  # Um arquivo por versão da fonte, em ``database_dir_for``
+VERSAO_BANCO = 3
+LINHAS_POR_LOTE = 50_000  # Linhas convertidas por vez entre o banco e o Arrow/pandas
+MINUTO = 60 * 10**9  # Em ns: intervalos do primeiro nível das séries agregadas pelo banco
+
+# Dimensões do cubo que sobram depois de somar as datas do período filtrado
+DIMENSOES_RESUMO = [d for d in cubo.DIMENSOES if d != 'date']
+
+# Seleção da tabela no banco: condição, parâmetros e ordem da consulta, e o total de linhas
+_Consulta = namedtuple('_Consulta', ['onde', 'parametros', 'ordem', 'total'])
+
+# Bancos abertos neste processo (caminho -> _Banco) e o mais recente de cada diretório: um banco
+# substituído só é apagado quando o último snapshot que o usa é liberado
+_bancos_abertos = weakref.WeakValueDictionary()
+_bancos_atuais = {}
+_trava_bancos = threading.RLock()  # Reentrante: a liberação pode vir do coletor de lixo
+
+
+def rows_in_window(df, janela):
+    """Linhas de ``df`` (com ``date`` e ``machine``) na ``janela`` de um backend (None: todas)."""
+    if janela is None:
+        return df
+    data_inicio, data_fim, maquinas = janela[:3]
+    mascara = np.ones(len(df), dtype=bool)
+    if data_inicio is not None:
+        mascara &= (df['date'] >= pd.Timestamp(data_inicio)).to_numpy()
+    if data_fim is not None:
+        mascara &= (df['date'] <= pd.Timestamp(data_fim)).to_numpy()
+    if maquinas is not None:
+        mascara &= df['machine'].isin(maquinas).to_numpy()
+    return df if mascara.all() else df[mascara].reset_index(drop=True)
+
+
+class QueryBackend:
+    """Consultas do dashboard sobre as linhas de um arquivo de dados.
+
+    ``filtros`` são sempre ``nucleo.Filtros`` normalizados. ``schema`` é um
+    DataFrame vazio com as colunas e os tipos dos DataFrames devolvidos. Um
+    backend é somente leitura: ``append`` devolve um novo, e quem ainda usa
+    o anterior continua vendo as mesmas linhas.
+    """
+
+    nome = None
+    descricao = None
+    schema = None
+    spearman_aproximado = False  # Modo padrão do Spearman nas consultas de correlação
+    janela = None  # Recorte (datas e máquinas) das linhas carregadas; None = o arquivo inteiro
+
+    @classmethod
+    def load(cls, file_path, manifesto, janela=None):
+        """Backend sobre o cache colunar de ``file_path``, com as linhas listadas em ``manifesto``.
+
+        O CSV não é verificado de novo: linhas anexadas depois do
+        ``manifesto`` ficam para a próxima atualização. ``janela`` são
+        ``Filtros`` só com datas e máquinas: um backend que carrega as
+        linhas em memória carrega só as dela (e ``janela`` fica no
+        backend); os demais a ignoram.
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def pearson(self, filtros):
+        """Matriz de Pearson exata das linhas filtradas, das somas por partição (``manufatura.correlacao``)."""
+        raise NotImplementedError
+
+    def spearman_approx(self, filtros):
+        """Spearman aproximado pelo esboço de amostragem: ``(matriz, erro)`` (``manufatura.correlacao``)."""
+        raise NotImplementedError
+
+    def frame(self, filtros, colunas=None):
+        """Linhas filtradas (só as ``colunas`` dadas, se houver), em ordem temporal, em memória."""
+        raise NotImplementedError
+
+    def is_view(self, df):
+        """Se ``df`` só referencia dados que o backend já mantém em memória."""
+        return False
+
+    def cube(self, filtros):
+        """Cubo de agregação restrito aos filtros (ver ``manufatura.cubo``).
+
+        Pode vir já somado sobre as datas, sem a coluna ``date``; as
+        funções de ``manufatura.cubo`` usadas pelos indicadores não precisam
+        dela.
+        """
+        raise NotImplementedError
+
+    def table_rows(self, filtros, ordenar_por=None, ascendente=True, busca=None):
+        """Seleção da tabela depois da busca e da ordenação, a ser paginada por ``page``.
+
+        ``busca`` é ``(coluna, termo)`` ou ``None``, com a semântica de
+        ``tabela.search``; levanta ``ValueError`` se o termo não puder ser
+        interpretado para o tipo da coluna.
+        """
+        raise NotImplementedError
+
+    def page(self, linhas, numero, tamanho):
+        """``tabela.Pagina`` número ``numero`` de uma seleção de ``table_rows``."""
+        raise NotImplementedError
+
+    def blocks(self, filtros, tamanho_bloco):
+        """Linhas filtradas, em ordem temporal, em DataFrames de até ``tamanho_bloco`` linhas.
+
+        Há sempre ao menos um bloco (vazio, se nada passar nos filtros).
+        """
+        raise NotImplementedError
+
+    def series_base(self, maquina, sensores):
+        """``series.Nivel`` de partida da pirâmide de ``maquina`` (linhas ou intervalos de 1 minuto)."""
+        raise NotImplementedError
+
+    def series_rows(self, maquina, sensor, inicio, fim, tipos_falha=None, limite=None):
+        """Leituras de ``sensor`` da ``maquina`` entre ``inicio`` e ``fim`` (inclusive).
+
+        Retorna ``(timestamps, valores, total)``. Com ``limite``, se houver
+        mais de ``limite`` leituras, os arrays voltam ``None`` e só o total
+        é calculado.
+        """
+        raise NotImplementedError
+
+    def append(self, atualizacao):
+        """Novo backend com as linhas de uma ``ingestao.Atualizacao`` anexadas."""
+        raise NotImplementedError
+
+
+class PandasBackend(QueryBackend):
+    """Histórico inteiro em memória: ``FilterEngine`` sobre o DataFrame e o cubo em pandas.
+
+    As colunas ficam num ``vetores.AppendableFrame``: ``append`` escreve só
+    as linhas novas, sem copiar o histórico. ``estatisticas`` são as
+    ``correlacao.CorrelationStats`` de todas as linhas. Com ``janela``, as
+    linhas, o cubo e as estatísticas são só os da janela, inclusive nas
+    linhas anexadas depois.
+    """
+
+    nome = 'pandas'
+    descricao = 'pandas (em memória)'
+
+    def __init__(self, motor_filtros, cubo_original, estatisticas, linhas=None, janela=None):
+        self.motor_filtros = motor_filtros.freeze()
+        self.cubo = cubo_original
+        self.estatisticas = estatisticas.freeze()
+        self.schema = motor_filtros.df.iloc[:0]
+        self.janela = janela
+        self._linhas = AppendableFrame(motor_filtros.df) if linhas is None else linhas
+
+    @classmethod
+    def load(cls, file_path, manifesto, janela=None):
+        # Só as partições (mês e máquina) da janela são lidas do cache colunar
+        recorte = () if janela is None else janela[:3]
+        df = ingestao.load_data(file_path, manifesto, *recorte)
+        with perfil.fase('indice_filtros'):
+            motor_filtros = FilterEngine(df)
+        with perfil.fase('estatisticas_correlacao'):
+            estatisticas = paralelo.aggregate(motor_filtros.df, com_cubo=False).estatisticas
+        cubo_janela = cubo.filter_cube(ingestao.load_cube(file_path, manifesto), *recorte)
+        return cls(motor_filtros, cubo_janela, estatisticas, janela=janela)
+
+    def __len__(self):
+        return len(self.motor_filtros)
+
+    def pearson(self, filtros):
+        return self.estatisticas.pearson(*filtros)
+
+    def spearman_approx(self, filtros):
+        return self.estatisticas.spearman_approx(*filtros)
+
+    def _recorte(self, selecao, colunas=None):
+        df = self.motor_filtros.df
+        if colunas is not None:
+            df = df[list(colunas)]
+        return df.iloc[selecao] if isinstance(selecao, slice) else df.take(selecao)
+
+    def frame(self, filtros, colunas=None):
+        return self._recorte(self.motor_filtros.select(*filtros), colunas)
+
+    def is_view(self, df):
+        # Uma fatia de datas é view do DataFrame compartilhado: não ocupa memória além dele
+        return 'timestamp' in df and np.may_share_memory(df['timestamp'].to_numpy(),
+                                                         self.motor_filtros.df['timestamp'].to_numpy())
+
+    def cube(self, filtros):
+        return cubo.filter_cube(self.cubo, *filtros)
+
+    def table_rows(self, filtros, ordenar_por=None, ascendente=True, busca=None):
+        """Posições no dataset (fatia ou array) das linhas da tabela, na ordem de exibição."""
+        selecao = self.motor_filtros.select(*filtros)
+        colunas = list(dict.fromkeys(c for c in (ordenar_por, busca and busca[0]) if c is not None))
+        if not colunas:
+            return selecao
+        # Busca e ordenação só precisam das suas colunas; as posições voltam para o dataset inteiro
+        locais = tabela.table_rows(self._recorte(selecao, colunas), ordenar_por, ascendente, busca)
+        linhas = locais + selecao.start if isinstance(selecao, slice) else selecao[locais]
+        linhas.flags.writeable = False  # Fica no cache compartilhado
+        return linhas
+
+    def page(self, linhas, numero, tamanho):
+        df = self.motor_filtros.df
+        if isinstance(linhas, slice):
+            return tabela.page(df.iloc[linhas], None, numero, tamanho)
+        return tabela.page(df, linhas, numero, tamanho)
+
+    def blocks(self, filtros, tamanho_bloco):
+        selecao = self.motor_filtros.select(*filtros)
+        if isinstance(selecao, slice):
+            return exportacao.frame_blocks(self.motor_filtros.df.iloc[selecao], tamanho_bloco)
+        # Cada bloco é materializado só quando vai ser escrito
+        return (self.motor_filtros.df.take(selecao[inicio:inicio + tamanho_bloco])
+                for inicio in range(0, max(len(selecao), 1), tamanho_bloco))
+
+    def series_base(self, maquina, sensores):
+        df = self.motor_filtros.df
+        linhas = self.motor_filtros.machine_rows(maquina)
+        valores = np.column_stack([df[s].to_numpy()[linhas] for s in sensores]).astype(np.float64)
+        return series.rows_level(df['timestamp'].to_numpy()[linhas], valores)
+
+    def series_rows(self, maquina, sensor, inicio, fim, tipos_falha=None, limite=None):
+        inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+        df = self.motor_filtros.df
+        linhas = self.motor_filtros.select(inicio.date(), fim.date(), (maquina,), tipos_falha)
+        timestamps = df['timestamp'].to_numpy()[linhas]
+        i = np.searchsorted(timestamps, inicio.to_datetime64(), side='left')
+        j = max(i, np.searchsorted(timestamps, fim.to_datetime64(), side='right'))
+        total = int(j - i)
+        if limite is not None and total > limite:
+            return None, None, total
+        return timestamps[i:j], df[sensor].to_numpy()[linhas[i:j]].astype(np.float64), total
+
+    def append(self, atualizacao):
+        # As linhas novas nos tipos das colunas atuais, quando couberem, para anexar sem converter
+        novas = rows_in_window(ingestao.table_to_frame(atualizacao.tabela, self.schema.dtypes), self.janela)
+        linhas = self._linhas.append(novas)
+        recorte = () if self.janela is None else self.janela[:3]
+        cubo_novo = cubo.merge_cubes([self.cubo, cubo.filter_cube(atualizacao.cubo, *recorte)])
+        # Mesmo deslocamento das estatísticas atuais, para somar as partições
+        estatisticas = self.estatisticas.merge([self.estatisticas.like(
+            rows_in_window(atualizacao.novas_linhas, self.janela), seed=len(self) + len(novas))])
+        timestamps = self.motor_filtros.df['timestamp']
+        if len(timestamps) and len(novas) and novas['timestamp'].iloc[0] < timestamps.iloc[-1]:
+            # Linhas anteriores às já carregadas: o motor reordena tudo (com cópia) e as colunas
+            # passam a ser as dele
+            return PandasBackend(FilterEngine(linhas.frame()), cubo_novo, estatisticas, janela=self.janela)
+        return PandasBackend(self.motor_filtros.append(linhas.frame()), cubo_novo, estatisticas, linhas,
+                             self.janela)
+
+
+def _nome(coluna):
+    """Identificador SQL entre aspas (as colunas do CSV podem ter espaços, como ``Unnamed: 0``)."""
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def _tipo_sql(tipo):
+    if pa.types.is_floating(tipo):
+        return 'REAL'
+    if pa.types.is_integer(tipo) or pa.types.is_temporal(tipo):
+        return 'INTEGER'  # Datas e horários em ns desde 1970
+    return 'TEXT'
+
+
+def _criar_tabela(conexao, nome, schema, chave=None):
+    colunas = [f'{_nome(campo.name)} {_tipo_sql(campo.type)}' for campo in schema]
+    if chave is not None:
+        # AUTOINCREMENT: um id apagado não é reusado, então os limites dos snapshots continuam valendo
+        colunas.insert(0, f'{chave} INTEGER PRIMARY KEY AUTOINCREMENT')
+    conexao.execute(f'CREATE TABLE {nome} ({", ".join(colunas)})')
+
+
+def _inserir(conexao, nome, tabela):
+    """Insere as linhas de uma tabela Arrow (datas viram ns; categorias, texto).
+
+    As linhas viram objetos Python só ``LINHAS_POR_LOTE`` por vez.
+    """
+    nomes = ', '.join(map(_nome, tabela.column_names))
+    marcadores = ', '.join('?' * tabela.num_columns)
+    for lote in tabela.to_batches(max_chunksize=LINHAS_POR_LOTE):
+        colunas = []
+        for campo, coluna in zip(lote.schema, lote.columns):
+            if pa.types.is_temporal(campo.type):
+                coluna = coluna.cast(pa.timestamp('ns')).cast(pa.int64())
+            colunas.append(coluna.to_pylist())
+        conexao.executemany(f'INSERT INTO {nome} ({nomes}) VALUES ({marcadores})', zip(*colunas))
+
+
+def _gravar_correlacao(conexao, estatisticas, criar=False):
+    """Grava as somas por partição e o esboço de uma ``correlacao.CorrelationStats``.
+
+    ``correlacao`` tem uma linha por partição com ``n``, ``soma_i`` e
+    ``produto_i_j`` (``i <= j``, índices de ``colunas`` na meta
+    ``correlacao``); ``amostra`` tem as linhas do esboço, com a partição, a
+    prioridade e os valores ``valor_i``. Só há inserções em ``correlacao``:
+    uma partição que recebe linhas novas ganha outra linha, somada nas
+    consultas.
+    """
+    k = len(estatisticas.colunas)
+    pares = list(zip(*np.triu_indices(k)))
+    chaves = estatisticas.chaves[correlacao.CHAVES]
+    particoes = chaves.assign(
+        n=estatisticas.n,
+        **{f'soma_{i}': estatisticas.somas[:, i] for i in range(k)},
+        **{f'produto_{i}_{j}': estatisticas.produtos[:, i, j] for i, j in pares})
+    amostra = chaves.iloc[estatisticas.amostra_particao].reset_index(drop=True).assign(
+        prioridade=estatisticas.amostra_prioridade,
+        **{f'valor_{i}': estatisticas.amostra[:, i] for i in range(k)})
+    particoes = pa.Table.from_pandas(particoes, preserve_index=False)
+    amostra = pa.Table.from_pandas(amostra, preserve_index=False)
+    if criar:
+        _criar_tabela(conexao, 'correlacao', particoes.schema)
+        _criar_tabela(conexao, 'amostra', amostra.schema, chave='id')
+        conexao.execute('CREATE INDEX amostra_grupo ON amostra (machine, failure_type, prioridade)')
+        conexao.execute('CREATE TABLE meta (chave TEXT PRIMARY KEY, valor TEXT)')
+        conexao.execute("INSERT INTO meta VALUES ('correlacao', ?)", (json.dumps({
+            'colunas': estatisticas.colunas, 'deslocamento': estatisticas.deslocamento.tolist(),
+            'amostra_por_grupo': estatisticas.amostra_por_grupo}),))
+    _inserir(conexao, 'correlacao', particoes)
+    _inserir(conexao, 'amostra', amostra)
+
+
+def _podar_amostra(conexao, amostra_por_grupo, grupos):
+    """Deixa no esboço só as ``amostra_por_grupo`` linhas de menor prioridade de cada um dos ``grupos``."""
+    # Pelo índice (grupo, prioridade): acha a última prioridade mantida e apaga as maiores
+    conexao.executemany(
+        'DELETE FROM amostra WHERE machine = ? AND failure_type = ? AND prioridade > ('
+        'SELECT prioridade FROM amostra WHERE machine = ? AND failure_type = ? '
+        'ORDER BY prioridade LIMIT 1 OFFSET ?)',
+        [(maquina, falha, maquina, falha, amostra_por_grupo - 1) for maquina, falha in grupos])
+
+
+def _em(coluna, valores):
+    return f'{_nome(coluna)} IN ({", ".join("?" * len(valores))})', list(valores)
+
+
+def _fonte(manifesto):
+    """Identifica a versão do cache colunar da qual o banco foi montado."""
+    return {'versao': VERSAO_BANCO, 'origem': manifesto['origem'], 'offset': manifesto['offset']}
+
+
+def _uri(caminho, modo):
+    # Pela URI, um banco ausente é um erro em vez de um arquivo vazio novo
+    return f'{pathlib.Path(caminho).absolute().as_uri()}?mode={modo}'
+
+
+def _fonte_do_banco(caminho):
+    try:
+        conexao = sqlite3.connect(_uri(caminho, 'ro'), uri=True)
+        try:
+            return json.loads(conexao.execute("SELECT valor FROM meta WHERE chave = 'fonte'").fetchone()[0])
+        finally:
+            conexao.close()
+    except (sqlite3.Error, TypeError):  # Banco ausente, incompleto ou de outro formato
+        return None
+
+
+def database_dir_for(file_path):
+    """Diretório dos bancos SQLite de ``file_path``.
+
+    Fica fora do cache colunar, que é apagado quando reconstruído: os
+    snapshots que ainda usam o banco anterior continuam a abri-lo.
+    """
+    return os.path.splitext(file_path)[0] + '_consultas'
+
+
+def _arquivo_banco(diretorio, manifesto):
+    """Caminho do banco montado para ``manifesto`` (o nome vem da versão da fonte)."""
+    fonte = json.dumps(_fonte(manifesto), sort_keys=True).encode()
+    return os.path.join(diretorio, PADRAO_BANCO.replace('*', hashlib.sha1(fonte).hexdigest()[:16]))
+
+
+def _banco_da_fonte(diretorio, manifesto):
+    """Banco de ``diretorio`` em dia com ``manifesto`` (os anexados mudam a fonte), ou None."""
+    fonte = _fonte(manifesto)
+    for caminho in sorted(glob.glob(os.path.join(diretorio, PADRAO_BANCO))):
+        if _fonte_do_banco(caminho) == fonte:
+            return caminho
+    return None
+
+
+class _Banco:
+    """Um arquivo de banco e as conexões a ele (uma por thread), comuns aos snapshots.
+
+    ``cache_dir`` é o cache colunar do qual ele é remontado.
+    """
+
+    def __init__(self, caminho, cache_dir):
+        self.caminho = caminho
+        self.cache_dir = cache_dir
+        self.conexoes = threading.local()
+        weakref.finalize(self, _liberar_banco, caminho)
+
+    def conexao(self):
+        conexao = getattr(self.conexoes, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(_uri(self.caminho, 'rw'), uri=True, timeout=30)
+            self.conexoes.conexao = conexao
+        return conexao
+
+
+def _abrir_banco(caminho, cache_dir):
+    """``_Banco`` de ``caminho``, que passa a ser o atual do diretório."""
+    with _trava_bancos:
+        banco = _bancos_abertos.get(caminho)
+        if banco is None:
+            banco = _bancos_abertos[caminho] = _Banco(caminho, cache_dir)
+        _bancos_atuais[os.path.dirname(caminho)] = caminho
+        return banco
+
+
+def _remover_banco(caminho):
+    for arquivo in (caminho, caminho + '-wal', caminho + '-shm'):
+        try:
+            os.remove(arquivo)
+        except OSError:  # Já removido, ou ainda aberto (no Windows)
+            pass
+
+
+def _liberar_banco(caminho):
+    """Apaga o banco quando o último snapshot que o usava é liberado, se ele já foi substituído."""
+    with _trava_bancos:
+        if _bancos_atuais.get(os.path.dirname(caminho)) != caminho and caminho not in _bancos_abertos:
+            _remover_banco(caminho)
+
+
+def _limpar_bancos(diretorio):
+    """Apaga os bancos substituídos que nenhum snapshot deste processo usa (ex.: de execuções anteriores)."""
+    with _trava_bancos:
+        for caminho in glob.glob(os.path.join(diretorio, PADRAO_BANCO)):
+            if caminho != _bancos_atuais.get(diretorio) and caminho not in _bancos_abertos:
+                _remover_banco(caminho)
+
+
+def build_database(caminho, cache_dir, manifesto):
+    """Monta o banco SQLite a partir do cache colunar, um lote de linhas por vez.
+
+    O banco é escrito num arquivo temporário e só substitui o anterior
+    quando está completo, então quem ainda lê o antigo não é afetado. Cada
+    carga usa o seu temporário: dois processos montando o mesmo banco não
+    escrevem no mesmo arquivo.
+    """
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or None,
+                                             prefix=os.path.basename(caminho) + '.', suffix='.tmp')
+    os.close(descritor)
+    try:
+        _carregar_banco(temporario, cache_dir, manifesto)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _carregar_banco(temporario, cache_dir, manifesto):
+    conexao = sqlite3.connect(temporario)
+    try:
+        # Sem journal durante a carga: se ela falhar, o temporário é descartado
+        conexao.execute('PRAGMA journal_mode = OFF')
+        conexao.execute('PRAGMA synchronous = OFF')
+        # O cache vem na ordem das partições; as linhas passam por uma tabela temporária e são
+        # gravadas em ordem temporal (empates na ordem do CSV), então o rowid - 1 é a posição
+        # da linha no dataset
+        # As estatísticas de correlação são montadas no mesmo percurso, lote a lote
+        estatisticas = None
+        for i, lote in enumerate(ingestao.scan_cache(cache_dir, manifesto)):
+            if i == 0:
+                _criar_tabela(conexao, 'temp.carga', lote.schema)
+                _criar_tabela(conexao, 'linhas', lote.drop_columns([ingestao.COLUNA_LINHA]).schema)
+            _inserir(conexao, 'temp.carga', lote)
+            df = ingestao.table_to_frame(lote)
+            if estatisticas is None:
+                estatisticas = paralelo.aggregate(df, com_cubo=False).estatisticas
+            else:
+                estatisticas = estatisticas.merge([paralelo.aggregate(
+                    df, com_cubo=False, colunas=estatisticas.colunas, deslocamento=estatisticas.deslocamento,
+                    amostra_por_grupo=estatisticas.amostra_por_grupo, seed=i).estatisticas])
+            del df
+        colunas = ', '.join(_nome(c) for c in lote.column_names if c != ingestao.COLUNA_LINHA)
+        conexao.execute(f'INSERT INTO linhas SELECT {colunas} FROM temp.carga '
+                        f'ORDER BY timestamp, {_nome(ingestao.COLUNA_LINHA)}')
+        conexao.execute('DROP TABLE temp.carga')
+        # Índices por data para os filtros; por máquina para as séries
+        conexao.execute('CREATE INDEX linhas_tempo ON linhas (timestamp, machine)')
+        conexao.execute('CREATE INDEX linhas_maquina ON linhas (machine, timestamp)')
+        conexao.execute('CREATE INDEX linhas_falha ON linhas (failure_type, timestamp)')
+
+        tabela_cubo = pa.Table.from_pandas(pd.read_parquet(os.path.join(cache_dir, 'cubo.parquet')),
+                                           preserve_index=False)
+        _criar_tabela(conexao, 'cubo', tabela_cubo.schema)
+        _inserir(conexao, 'cubo', tabela_cubo)
+        conexao.execute('CREATE INDEX cubo_data ON cubo (date)')
+
+        _gravar_correlacao(conexao, estatisticas, criar=True)
+        conexao.execute("INSERT INTO meta VALUES ('fonte', ?)", (json.dumps(_fonte(manifesto)),))
+        conexao.commit()
+        conexao.execute('ANALYZE')
+        # WAL: as sessões leem enquanto a atualização ao vivo grava linhas novas
+        conexao.execute('PRAGMA journal_mode = WAL')
+    finally:
+        conexao.close()
+
+
+class SQLiteBackend(QueryBackend):
+    """Linhas e cubo num banco SQLite indexado, consultados sem carregar o histórico.
+
+    As linhas ficam em ordem temporal (a ordem original da tabela é a do
+    ``rowid``). Cada thread usa a sua conexão ao ``_Banco``, que os
+    snapshots de um mesmo arquivo compartilham. As linhas anexadas depois da criação do
+    backend têm ``rowid`` maior que ``_ultima_linha`` e ficam de fora das
+    consultas dele, então cada snapshot do ``Dataset`` vê sempre as mesmas
+    linhas, mesmo com o banco crescendo. O mesmo vale para o cubo e para as
+    tabelas de correlação (ver ``_gravar_correlacao``).
+    """
+
+    nome = 'sqlite'
+    descricao = 'SQLite (em disco)'
+    spearman_aproximado = True
+
+    def __init__(self, banco, manifesto):
+        self.banco = banco
+        self.manifesto = manifesto
+        conexao = self._conexao()
+        self._ultima_linha = conexao.execute('SELECT MAX(rowid) FROM linhas').fetchone()[0] or 0
+        self._ultimo_cubo = conexao.execute('SELECT MAX(rowid) FROM cubo').fetchone()[0] or 0
+        self._ultima_particao = conexao.execute('SELECT MAX(rowid) FROM correlacao').fetchone()[0] or 0
+        self._ultima_amostra = conexao.execute('SELECT MAX(id) FROM amostra').fetchone()[0] or 0
+        meta = json.loads(conexao.execute("SELECT valor FROM meta WHERE chave = 'correlacao'").fetchone()[0])
+        self._colunas_corr = meta['colunas']
+        self._deslocamento = np.array(meta['deslocamento'], dtype=np.float64)
+        self._amostra_por_grupo = meta['amostra_por_grupo']
+        self._tipos = {}
+        for _, coluna, tipo, *_ in conexao.execute('PRAGMA table_info(linhas)'):
+            if coluna in ('timestamp', 'date'):
+                self._tipos[coluna] = 'datetime64[ns]'
+            elif coluna in ingestao.COLUNAS_CATEGORICAS:
+                self._tipos[coluna] = 'category'
+            else:
+                self._tipos[coluna] = {'INTEGER': 'int64', 'REAL': 'float64'}.get(tipo, object)
+        self.schema = self._frame([])
+
+    @classmethod
+    def load(cls, file_path, manifesto, janela=None):
+        # O banco não carrega o histórico: a janela não se aplica
+        diretorio = database_dir_for(file_path)
+        cache_dir = ingestao.cache_dir_for(file_path)
+        caminho = _banco_da_fonte(diretorio, manifesto)
+        if caminho is None:
+            os.makedirs(diretorio, exist_ok=True)
+            caminho = _arquivo_banco(diretorio, manifesto)
+            with perfil.fase('banco_sqlite'):
+                build_database(caminho, cache_dir, manifesto)
+        backend = cls(_abrir_banco(caminho, cache_dir), manifesto)
+        _limpar_bancos(diretorio)
+        return backend
+
+    def _conexao(self):
+        return self.banco.conexao()
+
+    def _executar(self, sql, parametros=()):
+        return self._conexao().execute(sql, parametros)
+
+    def _frame(self, linhas, colunas=None):
+        colunas = list(self._tipos) if colunas is None else list(colunas)
+        df = pd.DataFrame.from_records(linhas, columns=colunas)
+        return df.astype({coluna: self._tipos[coluna] for coluna in colunas})
+
+    def _lotes(self, cursor, tamanho, colunas=None):
+        """DataFrames de até ``tamanho`` linhas do ``cursor``; ao menos um (vazio, se não houver linhas)."""
+        lote = cursor.fetchmany(tamanho)
+        yield self._frame(lote, colunas)
+        while len(lote) == tamanho:
+            lote = cursor.fetchmany(tamanho)
+            if lote:
+                yield self._frame(lote, colunas)
+
+    def __len__(self):
+        return self._ultima_linha  # Só há inserções, então os rowid vão de 1 ao total
+
+    def _condicoes_particao(self, filtros, ultima):
+        """Condições dos filtros numa tabela por partição (``cubo``, ``correlacao``, ``amostra``)."""
+        condicoes, parametros = ['+rowid <= ?'], [ultima]
+        datas, parametros_datas = self._condicoes_datas(filtros)
+        grupos, parametros_grupos = self._condicoes_grupos(filtros)
+        return condicoes + datas + grupos, parametros + parametros_datas + parametros_grupos
+
+    @staticmethod
+    def _condicoes_datas(filtros):
+        condicoes, parametros = [], []
+        if filtros.data_inicio is not None:
+            condicoes.append('date >= ?')
+            parametros.append(pd.Timestamp(filtros.data_inicio).value)
+        if filtros.data_fim is not None:
+            condicoes.append('date <= ?')
+            parametros.append(pd.Timestamp(filtros.data_fim).value)
+        return condicoes, parametros
+
+    @staticmethod
+    def _condicoes_grupos(filtros):
+        condicoes, parametros = [], []
+        for coluna, valores in (('machine', filtros.maquinas), ('failure_type', filtros.tipos_falha)):
+            if valores is not None:
+                condicao, valores = _em(coluna, valores)
+                condicoes.append(condicao)
+                parametros.extend(valores)
+        return condicoes, parametros
+
+    def pearson(self, filtros):
+        # As somas das partições filtradas, feitas pelo banco
+        k = len(self._colunas_corr)
+        pares = np.triu_indices(k)
+        somas = [f'SUM(soma_{i})' for i in range(k)] + [f'SUM(produto_{i}_{j})' for i, j in zip(*pares)]
+        condicoes, parametros = self._condicoes_particao(filtros, self._ultima_particao)
+        linha = self._executar(f'SELECT SUM(n), {", ".join(somas)} FROM correlacao '
+                               f'WHERE {" AND ".join(condicoes)}', parametros).fetchone()
+        valores = np.array(linha[1:], dtype=np.float64)
+        produtos = np.zeros((k, k))
+        produtos[pares] = valores[k:]
+        produtos[pares[1], pares[0]] = valores[k:]
+        return correlacao.pearson_from_sums(self._colunas_corr, linha[0] or 0, valores[:k], produtos)
+
+    def spearman_approx(self, filtros, tamanho_maximo=50_000):
+        # A mesma amostra de ``CorrelationStats.spearman_approx``, numa consulta só (um snapshot do
+        # banco, mesmo com a poda do esboço em andamento). Um grupo está completo no esboço se
+        # guarda todas as suas linhas; senão, guarda as de prioridade até o seu corte, e a amostra é
+        # cortada no menor corte entre os grupos truncados que os filtros tocam
+        datas, parametros_datas = self._condicoes_datas(filtros)
+        grupos, parametros_grupos = self._condicoes_grupos(filtros)
+        tocado = ' AND '.join(datas) or '1'
+        onde_grupos = ' AND '.join(['+rowid <= ?'] + grupos)
+        condicoes, parametros = self._condicoes_particao(filtros, self._ultima_amostra)
+        valores = ', '.join(f'valor_{i}' for i in range(len(self._colunas_corr)))
+        linhas = self._executar(
+            f'WITH grupos AS (SELECT machine, failure_type, SUM(n) AS n, MAX({tocado}) AS tocado '
+            f'FROM correlacao WHERE {onde_grupos} GROUP BY machine, failure_type), '
+            f'guardadas AS (SELECT machine, failure_type, COUNT(*) AS m, MAX(prioridade) AS corte '
+            f'FROM amostra WHERE {onde_grupos} GROUP BY machine, failure_type), '
+            f'limite AS (SELECT MIN(corte) AS corte FROM grupos JOIN guardadas USING (machine, failure_type) '
+            f'WHERE tocado AND m < n) '
+            f'SELECT (SELECT corte FROM limite), {valores} FROM amostra '
+            f'WHERE {" AND ".join(condicoes)} AND prioridade <= COALESCE((SELECT corte FROM limite), 1) '
+            f'ORDER BY prioridade LIMIT ?',
+            [*parametros_datas, self._ultima_particao, *parametros_grupos,
+             self._ultima_amostra, *parametros_grupos, *parametros, tamanho_maximo + 1]).fetchall()
+        # Sem linhas na amostra, mas com linhas filtradas (``compute_correlations`` confere), algum
+        # grupo tocado está truncado
+        completa = bool(linhas) and linhas[0][0] is None and len(linhas) <= tamanho_maximo
+        amostra = np.array([linha[1:] for linha in linhas[:tamanho_maximo]], dtype=np.float64)
+        return correlacao.sample_spearman(self._colunas_corr, amostra.reshape(-1, len(self._colunas_corr)),
+                                          completa)
+
+    def _condicoes(self, filtros):
+        # '+rowid' não usa índice: os índices ficam para as datas, máquinas e tipos de falha
+        condicoes, parametros = ['+rowid <= ?'], [self._ultima_linha]
+        if filtros.data_inicio is not None:
+            condicoes.append('timestamp >= ?')
+            parametros.append(pd.Timestamp(filtros.data_inicio).value)
+        if filtros.data_fim is not None:
+            condicoes.append('timestamp < ?')
+            parametros.append((pd.Timestamp(filtros.data_fim) + pd.Timedelta(days=1)).value)
+        for coluna, valores in (('machine', filtros.maquinas), ('failure_type', filtros.tipos_falha)):
+            if valores is not None:
+                condicao, valores = _em(coluna, valores)
+                condicoes.append(condicao)
+                parametros.extend(valores)
+        return condicoes, parametros
+
+    def frame(self, filtros, colunas=None):
+        colunas = list(self._tipos) if colunas is None else list(colunas)
+        condicoes, parametros = self._condicoes(filtros)
+        cursor = self._executar(f'SELECT {", ".join(map(_nome, colunas))} FROM linhas '
+                                f'WHERE {" AND ".join(condicoes)} ORDER BY rowid', parametros)
+        # Em lotes: só um lote fica como objetos Python; as categorias dos lotes são unidas no fim
+        lotes = list(self._lotes(cursor, LINHAS_POR_LOTE, colunas))
+        if len(lotes) == 1:
+            return lotes[0]
+        dados = {}
+        for coluna in colunas:
+            partes = [lote[coluna] for lote in lotes]
+            if isinstance(partes[0].dtype, pd.CategoricalDtype):
+                dados[coluna] = union_categoricals(partes, sort_categories=True)
+            else:
+                dados[coluna] = np.concatenate([parte.to_numpy() for parte in partes])
+            for lote in lotes:
+                del lote[coluna]
+        return pd.DataFrame(dados, columns=colunas)
+
+    def cube(self, filtros):
+        condicoes, parametros = self._condicoes_particao(filtros, self._ultimo_cubo)
+        somas = cubo.COLUNAS_SOMA + cubo.COLUNAS_SOMA_QUAD + ['contagem']
+        dimensoes = ', '.join(map(_nome, DIMENSOES_RESUMO))
+        cursor = self._executar(
+            f'SELECT {dimensoes}, {", ".join(f"SUM({_nome(c)})" for c in somas)} FROM cubo '
+            f'WHERE {" AND ".join(condicoes)} GROUP BY {dimensoes}', parametros)
+        resumo = pd.DataFrame.from_records(cursor.fetchall(), columns=DIMENSOES_RESUMO + somas)
+        return resumo.astype({**{c: 'float64' for c in somas[:-1]}, 'contagem': 'int64'})
+
+    def _condicao_busca(self, coluna, termo):
+        """Condição SQL equivalente a ``tabela.search``."""
+        tipo = self.schema[coluna].dtype
+        termo = termo.strip()
+        nome = _nome(coluna)
+        if pd.api.types.is_datetime64_any_dtype(tipo):
+            inicio, fim = tabela.parse_interval(termo)
+            return f'{nome} >= ? AND {nome} < ?', [inicio.value, fim.value]
+        if pd.api.types.is_numeric_dtype(tipo):
+            valor = tabela.parse_number(termo)
+            if pd.api.types.is_integer_dtype(tipo):
+                if not valor.is_integer():
+                    return '0', []
+                valor = int(valor)
+            return f'{nome} = ?', [valor]
+        # Texto e categorias: contém o termo (o LIKE do SQLite ignora maiúsculas só em ASCII)
+        padrao = termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return f"{nome} LIKE ? ESCAPE '\\'", [f'%{padrao}%']
+
+    def table_rows(self, filtros, ordenar_por=None, ascendente=True, busca=None):
+        """Consulta da tabela e o total de linhas; cada página é lida com LIMIT/OFFSET."""
+        condicoes, parametros = self._condicoes(filtros)
+        if busca is not None:
+            condicao, valores = self._condicao_busca(*busca)
+            condicoes.append(condicao)
+            parametros.extend(valores)
+        onde = ' AND '.join(condicoes)
+        total = self._executar(f'SELECT COUNT(*) FROM linhas WHERE {onde}', parametros).fetchone()[0]
+        # Empates ficam na ordem original, como na ordenação estável do pandas
+        ordem = 'rowid'
+        if ordenar_por is not None:
+            ordem = f'{_nome(ordenar_por)} {"ASC" if ascendente else "DESC"}, rowid'
+        return _Consulta(onde, tuple(parametros), ordem, total)
+
+    def page(self, linhas, numero, tamanho):
+        paginas = max(1, -(-linhas.total // tamanho))
+        numero = min(max(numero, 1), paginas)
+        inicio = (numero - 1) * tamanho
+        # O rowid - 1 é a posição da linha no dataset: o mesmo índice exibido pelo backend pandas
+        cursor = self._executar(f'SELECT rowid - 1, {", ".join(map(_nome, self._tipos))} FROM linhas '
+                                f'WHERE {linhas.onde} ORDER BY {linhas.ordem} LIMIT ? OFFSET ?',
+                                (*linhas.parametros, tamanho, inicio))
+        registros = cursor.fetchall()
+        recorte = self._frame([registro[1:] for registro in registros])
+        recorte.index = pd.Index([registro[0] for registro in registros], dtype=np.int64)
+        return tabela.Pagina(recorte, linhas.total, numero, paginas)
+
+    def blocks(self, filtros, tamanho_bloco):
+        condicoes, parametros = self._condicoes(filtros)
+        cursor = self._executar(f'SELECT {", ".join(map(_nome, self._tipos))} FROM linhas '
+                                f'WHERE {" AND ".join(condicoes)} ORDER BY rowid', parametros)
+        return self._lotes(cursor, tamanho_bloco)
+
+    def series_base(self, maquina, sensores):
+        # O banco agrega por minuto; a pirâmide parte desse nível em vez das linhas
+        agregados = ', '.join(f'MIN({n}), MAX({n}), SUM({n})' for n in map(_nome, sensores))
+        linhas = self._executar(
+            f'SELECT timestamp / {MINUTO} AS minuto, {agregados}, COUNT(*) FROM linhas '
+            f'WHERE machine = ? AND +rowid <= ? GROUP BY minuto ORDER BY minuto',
+            (maquina, self._ultima_linha)).fetchall()
+        minutos = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        valores = np.array([linha[1:-1] for linha in linhas], dtype=np.float64).reshape(len(linhas), -1)
+        contagem = np.array([linha[-1] for linha in linhas], dtype=np.int64)
+        return series.Nivel('1min', minutos * MINUTO, valores[:, 0::3], valores[:, 1::3],
+                            valores[:, 2::3], contagem)
+
+    def series_rows(self, maquina, sensor, inicio, fim, tipos_falha=None, limite=None):
+        condicoes = ['machine = ?', 'timestamp >= ?', 'timestamp <= ?', '+rowid <= ?']
+        parametros = [maquina, pd.Timestamp(inicio).value, pd.Timestamp(fim).value, self._ultima_linha]
+        if tipos_falha is not None:
+            condicao, valores = _em('failure_type', tipos_falha)
+            condicoes.append(condicao)
+            parametros.extend(valores)
+        onde = ' AND '.join(condicoes)
+        total = self._executar(f'SELECT COUNT(*) FROM linhas WHERE {onde}', parametros).fetchone()[0]
+        if limite is not None and total > limite:
+            return None, None, total
+        linhas = self._executar(f'SELECT timestamp, {_nome(sensor)} FROM linhas WHERE {onde} '
+                                f'ORDER BY timestamp', parametros).fetchall()
+        timestamps = np.array([linha[0] for linha in linhas], dtype=np.int64).view('datetime64[ns]')
+        return timestamps, np.array([linha[1] for linha in linhas], dtype=np.float64), total
+
+    def append(self, atualizacao):
+        """Grava as linhas novas no banco; este backend continua sem enxergá-las.
+
+        Linhas anteriores à última gravada quebrariam a ordem temporal do
+        ``rowid``: nesse caso o banco é remontado, num arquivo novo, do cache
+        colunar (que já as inclui), e este backend continua com o dele.
+        """
+        novas = atualizacao.novas_linhas
+        conexao = self._conexao()
+        ultima = conexao.execute('SELECT timestamp FROM linhas ORDER BY rowid DESC LIMIT 1').fetchone()
+        if ultima is not None and novas['timestamp'].iloc[0].value < ultima[0]:
+            caminho = _arquivo_banco(os.path.dirname(self.banco.caminho), atualizacao.manifesto)
+            with perfil.fase('banco_sqlite'):
+                build_database(caminho, self.banco.cache_dir, atualizacao.manifesto)
+            return SQLiteBackend(_abrir_banco(caminho, self.banco.cache_dir), atualizacao.manifesto)
+        # Mesmo deslocamento das somas já gravadas, para somar as partições
+        estatisticas = correlacao.CorrelationStats.from_frame(
+            novas, self._colunas_corr, self._deslocamento, self._amostra_por_grupo, seed=len(self) + len(novas))
+        with conexao:  # Uma transação: linhas, cubo, correlação e a versão da fonte
+            _inserir(conexao, 'linhas', atualizacao.tabela)
+            _inserir(conexao, 'cubo', pa.Table.from_pandas(atualizacao.cubo, preserve_index=False))
+            _gravar_correlacao(conexao, estatisticas)
+            grupos = estatisticas.chaves[correlacao.CHAVES_GRUPO].drop_duplicates()
+            _podar_amostra(conexao, self._amostra_por_grupo, grupos.itertuples(index=False))
+            conexao.execute("UPDATE meta SET valor = ? WHERE chave = 'fonte'",
+                            (json.dumps(_fonte(atualizacao.manifesto)),))
+        return SQLiteBackend(self.banco, atualizacao.manifesto)
+
+
+BACKENDS = {classe.nome: classe for classe in (PandasBackend, SQLiteBackend)}
+
+
+def get_backend(nome=None):
+    """Classe do backend ``nome``; sem nome, o da variável ``DASHBOARD_BACKEND`` (padrão ``pandas``)."""
+    nome = nome or os.environ.get('DASHBOARD_BACKEND', BACKEND_PADRAO)
+    try:
+        return BACKENDS[nome]
+    except KeyError:
+        raise ValueError(f"Backend de consultas desconhecido: {nome} (opções: {', '.join(BACKENDS)})")
@@ -0,0 +1,217 @@
+"""Benchmark das fases do dashboard sobre dados sintéticos.
+
+    python -m manufatura.benchmark --linhas 1e5 1e6 --saida resultados.json
+    python -m manufatura.benchmark --linhas 1e5 1e6 --comparar resultados.json
+
+Para cada tamanho gera (ou reaproveita) um CSV sintético
+(``manufatura.sintetico``) e mede tempo de parede e pico de memória de cada
+fase: ingestão do CSV para o cache colunar, carga do dataset, filtros, KPIs
+da Visão Geral, correlação e exportação CSV (em memória e em blocos para
+um arquivo). As fases de consulta rodam um conjunto fixo de filtros e
+reportam o melhor de ``--repeticoes`` execuções. ``--backend`` escolhe o
+backend de consultas medido (``manufatura.backends``); no ``sqlite``, a fase
+``filtro`` mede o total e a primeira página da tabela no banco, e as fases
+que precisam do recorte inteiro em memória (``agregacao`` e
+``exportacao_csv``) não são medidas. A fase
+``agregacao`` recalcula o cubo e as estatísticas de correlação de todas as
+linhas com ``--trabalhadores`` processos (``manufatura.paralelo``), que
+também valem para o cubo da ingestão e os postos do Spearman exato da fase
+``correlacao``; comparar execuções com 1 e N processos mostra o ganho com
+os núcleos (numa máquina com um núcleo só, N processos são mais lentos).
+
+O pico de memória vem de uma execução extra sob ``tracemalloc``
+(alocações do Python e do NumPy/pandas; buffers alocados internamente pelo
+Arrow e memória dos processos trabalhadores não entram na conta). O tempo é
+medido em execuções separadas, porque o ``tracemalloc`` deixa as fases com
+muitos objetos Python várias vezes mais lentas.
+
+Com ``--comparar``, o processo termina com código 1 se alguma fase ficar
+mais lenta que a referência além de ``--tolerancia``.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+from manufatura import backends, exportacao, ingestao, nucleo, paralelo, sintetico
+from manufatura.cache import ResultCache
+
+LINHAS_POR_PAGINA = 100  # Página da tabela lida na fase ``filtro`` do backend SQLite
+FASES = ['ingestao', 'carga', 'filtro', 'kpis', 'correlacao', 'agregacao', 'exportacao_csv',
+         'exportacao_arquivo']
+
+
+def measure(funcao, repeticoes=1, medir_memoria=True):
+    """Executa ``funcao`` e retorna ``(resultado, segundos, pico_em_bytes)``.
+
+    ``segundos`` é o melhor de ``repeticoes`` execuções sem rastreamento;
+    o pico de memória vem de uma execução adicional sob ``tracemalloc``
+    (``None`` com ``medir_memoria=False``).
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    if not medir_memoria:
+        return resultado, min(tempos), None
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, min(tempos), pico
+
+
+def filter_scenarios(dataset):
+    """Combinações de filtros representativas do uso do dashboard."""
+    inicio, fim = dataset.data_min, dataset.data_max
+    terco = inicio + timedelta(days=max((fim - inicio).days // 3, 0))
+    maquinas = tuple(dataset.maquinas[:2])
+    tipos = tuple(t for t in dataset.tipos_falha if t != 'No Failure')[:1]
+    return [
+        nucleo.Filtros(),
+        nucleo.Filtros(inicio, terco),
+        nucleo.Filtros(inicio, terco, maquinas),
+        nucleo.Filtros(None, None, None, tipos),
+        nucleo.Filtros(inicio, terco, maquinas, tipos),
+    ]
+
+
+def run(file_path, repeticoes=3, medir_memoria=True, backend=None):
+    """Mede todas as fases sobre ``file_path`` no ``backend`` dado; retorna ``{fase: {...}}``."""
+    resultados = {}
+
+    def medir(funcao, repeticoes=1):
+        return measure(funcao, repeticoes, medir_memoria)
+
+    def registrar(fase, segundos, pico):
+        resultados[fase] = {'segundos': segundos, 'pico_mb': None if pico is None else pico / 2**20}
+
+    _, segundos, pico = medir(lambda: ingestao.build_columnar_cache(file_path))
+    registrar('ingestao', segundos, pico)
+
+    # Sem cache de resultados: as repetições medem o cálculo, não acertos no cache. O banco do
+    # backend SQLite fica fora do cache colunar; apagado, a carga mede também a montagem dele
+    shutil.rmtree(backends.database_dir_for(file_path), ignore_errors=True)
+    dataset, segundos, pico = medir(lambda: nucleo.Dataset.load(file_path, ResultCache(0), backend))
+    registrar('carga', segundos, pico)
+
+    cenarios = filter_scenarios(dataset)
+    # O backend SQLite não traz o histórico para a memória: o filtro é medido como a aba de dados
+    # o usa (total e primeira página, no banco), e as fases sobre o recorte inteiro em memória
+    # (agregação e exportação CSV em memória) ficam de fora
+    em_memoria = isinstance(dataset.backend, backends.PandasBackend)
+    if em_memoria:
+        frames, segundos, pico = medir(lambda: [dataset.filter(f) for f in cenarios], repeticoes)
+    else:
+        _, segundos, pico = medir(lambda: [dataset.table_page(f, 1, LINHAS_POR_PAGINA) for f in cenarios],
+                                  repeticoes)
+    registrar('filtro', segundos, pico)
+
+    _, segundos, pico = medir(
+        lambda: [nucleo.compute_kpis(dataset.filter_cube(f)) for f in cenarios], repeticoes)
+    registrar('kpis', segundos, pico)
+
+    _, segundos, pico = medir(
+        lambda: [nucleo.compute_correlations(dataset, f) for f in cenarios],
+        repeticoes)
+    registrar('correlacao', segundos, pico)
+
+    # Cubo e estatísticas de correlação recalculados de todas as linhas, nos processos de
+    # ``manufatura.paralelo``; o pool é criado antes, fora da medição
+    if em_memoria:
+        trabalhadores = paralelo.workers_from_env()
+        if trabalhadores > 1:
+            paralelo.aggregate(frames[0], trabalhadores)
+        _, segundos, pico = medir(lambda: paralelo.aggregate(frames[0], trabalhadores), repeticoes)
+        registrar('agregacao', segundos, pico)
+
+        # Exportação do recorte mais largo (sem filtros), o pior caso da aba de dados
+        _, segundos, pico = medir(lambda: nucleo.export_csv(frames[0]))
+        registrar('exportacao_csv', segundos, pico)
+
+    # O mesmo CSV gravado em disco em blocos lidos do backend (download da aba de dados)
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'exportacao.csv')
+        _, segundos, pico = medir(lambda: exportacao.write_blocks(
+            dataset.backend.blocks(nucleo.Filtros(), exportacao.TAMANHO_BLOCO), len(dataset), caminho))
+    registrar('exportacao_arquivo', segundos, pico)
+    return resultados
+
+
+def compare(atual, referencia, tolerancia):
+    """Lista de regressões ``(linhas, fase, segundos, segundos_ref)``."""
+    regressoes = []
+    for linhas, fases in atual.items():
+        for fase, medida in fases.items():
+            ref = referencia.get(linhas, {}).get(fase)
+            if ref and medida['segundos'] > ref['segundos'] * (1 + tolerancia):
+                regressoes.append((linhas, fase, medida['segundos'], ref['segundos']))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das fases do dashboard de manufatura.")
+    parser.add_argument('--linhas', type=float, nargs='+', default=[1e5, 1e6],
+                        help="tamanhos dos datasets sintéticos (ex.: 1e5 1e6 1e7)")
+    parser.add_argument('--dir', default=None,
+                        help="diretório para os CSVs gerados (reaproveitados entre execuções)")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--trabalhadores', type=int, default=None,
+                        help="processos das agregações paralelas (padrão: DASHBOARD_TRABALHADORES ou 1; "
+                             "0 = um por núcleo)")
+    parser.add_argument('--backend', choices=sorted(backends.BACKENDS), default=None,
+                        help="backend de consultas (padrão: DASHBOARD_BACKEND ou pandas)")
+    parser.add_argument('--sem-memoria', action='store_true',
+                        help="não mede o pico de memória (evita a execução extra sob tracemalloc)")
+    parser.add_argument('--saida', help="grava os resultados em JSON")
+    parser.add_argument('--comparar', help="JSON de referência para detectar regressões")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="aumento relativo de tempo aceito antes de acusar regressão")
+    args = parser.parse_args(argv)
+
+    if args.trabalhadores is not None:
+        os.environ['DASHBOARD_TRABALHADORES'] = str(args.trabalhadores)  # Vale também para a carga
+    diretorio = args.dir or tempfile.mkdtemp(prefix='benchmark_manufatura_')
+    os.makedirs(diretorio, exist_ok=True)
+
+    resultados = {}
+    for linhas in (int(n) for n in args.linhas):
+        file_path = os.path.join(diretorio, f'sintetico_{linhas}.csv')
+        if not os.path.exists(file_path):
+            print(f"Gerando {linhas} linhas em {file_path}...", file=sys.stderr)
+            sintetico.write_csv(file_path, linhas)
+        resultados[str(linhas)] = run(file_path, args.repeticoes, not args.sem_memoria, args.backend)
+
+    print(f"{'linhas':>12} {'fase':<20} {'segundos':>10} {'pico (MB)':>10}")
+    for linhas, fases in resultados.items():
+        for fase in (f for f in FASES if f in fases):
+            medida = fases[fase]
+            pico = '-' if medida['pico_mb'] is None else f"{medida['pico_mb']:.1f}"
+            print(f"{linhas:>12} {fase:<20} {medida['segundos']:>10.4f} {pico:>10}")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            referencia = json.load(f)
+        regressoes = compare(resultados, referencia, args.tolerancia)
+        for linhas, fase, segundos, ref in regressoes:
+            print(f"REGRESSÃO: {linhas} linhas, fase {fase}: {segundos:.4f}s (referência {ref:.4f}s)",
+                  file=sys.stderr)
+        if regressoes:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Cache de resultados limitado em memória, com despejo LRU e TTL.
+
+Os resultados (recortes filtrados, indicadores e matrizes de correlação)
+são indexados pelos ``Filtros`` normalizados, não pelo conteúdo dos
+DataFrames: achar uma entrada custa o hash de uma tupla pequena. O total
+guardado é limitado por ``max_bytes``; ao passar do limite, saem as
+entradas usadas há mais tempo. Com ``ttl``, entradas mais velhas que
+``ttl`` segundos são descartadas na próxima consulta.
+
+Uma entrada pode ocupar recursos fora da memória (ex.: um arquivo de
+exportação em disco, medido pelo tamanho do arquivo): ``put`` aceita
+``ao_remover``, chamado quando ela sai do cache por despejo, expiração ou
+``clear``, para liberar o recurso.
+
+O orçamento vem das variáveis de ambiente ``DASHBOARD_CACHE_MB`` (padrão
+256) e ``DASHBOARD_CACHE_TTL`` (segundos; sem expiração por padrão), lidas
+por ``ResultCache.from_env``.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+CACHE_MB_PADRAO = 256
+
+Estatisticas = namedtuple('Estatisticas', ['acertos', 'falhas', 'despejos', 'expirados',
+                                           'entradas', 'bytes', 'max_bytes'])
+
+_Entrada = namedtuple('_Entrada', ['valor', 'tamanho', 'criado_em', 'ao_remover'])
+
+
+def size_of(valor):
+    """Estimativa, em bytes, da memória ocupada por um resultado.
+
+    Colunas ``object`` (textos) contam os objetos, não só os ponteiros; nas
+    categóricas, entram os códigos e as categorias.
+    """
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, (tuple, list)):  # Inclui namedtuples como KPIs e Correlacoes
+        return sum(size_of(item) for item in valor)
+    if isinstance(valor, str):
+        return len(valor)
+    return 64  # Escalares e objetos pequenos
+
+
+class ResultCache:
+    """Mapa chave → resultado, limitado por bytes, seguro entre threads.
+
+    O cálculo de uma entrada ausente roda fora da trava; se duas sessões
+    pedirem a mesma chave ao mesmo tempo, as duas calculam e a segunda
+    substitui a primeira. Resultados maiores que ``max_bytes`` não são
+    guardados (``max_bytes=0`` desliga o cache).
+    """
+
+    def __init__(self, max_bytes=CACHE_MB_PADRAO * 2**20, ttl=None, relogio=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._relogio = relogio
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.Lock()
+        self._acertos = self._falhas = self._despejos = self._expirados = 0
+
+    @classmethod
+    def from_env(cls):
+        max_mb = float(os.environ.get('DASHBOARD_CACHE_MB', CACHE_MB_PADRAO))
+        ttl = os.environ.get('DASHBOARD_CACHE_TTL')
+        return cls(int(max_mb * 2**20), float(ttl) if ttl else None)
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _remover(self, chave):
+        entrada = self._entradas.pop(chave)
+        self._bytes -= entrada.tamanho
+        return entrada
+
+    @staticmethod
+    def _liberar(entradas):
+        # Fora da trava: liberar um recurso (ex.: apagar um arquivo) não segura as outras sessões
+        for entrada in entradas:
+            if entrada.ao_remover is not None:
+                entrada.ao_remover(entrada.valor)
+
+    def get(self, chave, padrao=None):
+        removidas = []
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and self.ttl is not None \
+                    and self._relogio() - entrada.criado_em > self.ttl:
+                removidas.append(self._remover(chave))
+                self._expirados += 1
+                entrada = None
+            if entrada is None:
+                self._falhas += 1
+            else:
+                self._entradas.move_to_end(chave)
+                self._acertos += 1
+        self._liberar(removidas)
+        return padrao if entrada is None else entrada.valor
+
+    def put(self, chave, valor, tamanho=None, ao_remover=None):
+        """Guarda ``valor`` em ``chave``; retorna se ele coube no orçamento.
+
+        ``ao_remover(valor)`` é chamado quando a entrada sair do cache. Se
+        ``chave`` já existia, a entrada antiga é só substituída, sem chamar
+        o ``ao_remover`` dela (o mesmo pedido gera o mesmo recurso).
+        """
+        tamanho = size_of(valor) if tamanho is None else tamanho
+        removidas = []
+        with self._trava:
+            if chave in self._entradas:
+                self._remover(chave)
+            guardado = tamanho <= self.max_bytes
+            if guardado:
+                self._entradas[chave] = _Entrada(valor, tamanho, self._relogio(), ao_remover)
+                self._bytes += tamanho
+                while self._bytes > self.max_bytes:
+                    removidas.append(self._remover(next(iter(self._entradas))))
+                    self._despejos += 1
+        self._liberar(removidas)
+        return guardado
+
+    def get_or_compute(self, chave, funcao):
+        """Valor guardado em ``chave`` ou, se ausente, ``funcao()`` (que passa a ser guardado)."""
+        ausente = object()
+        valor = self.get(chave, ausente)
+        if valor is ausente:
+            valor = funcao()
+            self.put(chave, valor)
+        return valor
+
+    def clear(self):
+        with self._trava:
+            removidas = list(self._entradas.values())
+            self._entradas.clear()
+            self._bytes = 0
+        self._liberar(removidas)
+
+    def stats(self):
+        with self._trava:
+            return Estatisticas(self._acertos, self._falhas, self._despejos, self._expirados,
+                                len(self._entradas), self._bytes, self.max_bytes)
@@ -0,0 +1,278 @@
+"""Estatísticas suficientes, combináveis, para a aba "Análise de Correlação".
+
+Para cada partição (machine, date, failure_type) guardamos o número de
+linhas, a soma de cada variável numérica e a soma dos produtos cruzados.
+A correlação de Pearson exata para qualquer combinação de filtros sai da
+soma dessas partições, sem reler as linhas. As somas são feitas sobre os
+valores deslocados pela média global, o que evita a perda de precisão da
+fórmula ``E[xy] - E[x]E[y]`` com sensores de média alta.
+
+A correlação de Spearman precisa dos postos de cada coluna e não tem
+estatística suficiente pequena. O modo aproximado usa um esboço (*sketch*)
+por amostragem: cada linha recebe uma prioridade aleatória e cada grupo
+(machine, failure_type) guarda as ``amostra_por_grupo`` linhas de menor
+prioridade. Os grupos não dependem da data, então o esboço tem no máximo
+``amostra_por_grupo`` x máquinas x tipos de falha linhas, qualquer que
+seja o tamanho do histórico. Um grupo guarda todas as suas linhas com
+prioridade até o seu corte; as linhas amostradas que passam nos filtros,
+cortadas no menor corte entre os grupos truncados que os filtros tocam,
+são uma amostra uniforme das linhas filtradas. O Spearman dela tem erro
+padrão de no máximo ``sqrt(1.06 / (m - 3))`` para ``m`` linhas amostradas
+(Fieller, Hartley & Pearson, 1957), e o limite informado é de 3 erros
+padrão.
+
+O backend SQLite guarda as somas por partição e o esboço em tabelas do
+banco e faz as mesmas contas em SQL (``backends.SQLiteBackend``), com
+``pearson_from_sums`` e ``sample_spearman``.
+"""
+import numpy as np
+import pandas as pd
+
+CHAVES = ['machine', 'date', 'failure_type']
+CHAVES_GRUPO = ['machine', 'failure_type']  # Grupos do esboço: as partições sem a data
+AMOSTRA_POR_GRUPO = 512  # Linhas do esboço por grupo (50 máquinas x 5 falhas: até 128 mil linhas)
+COLUNAS_IGNORADAS = ['Unnamed: 0']  # Identificadores, sem sentido para correlação
+TAMANHO_BLOCO = 1_000_000  # Linhas processadas por vez ao montar as estatísticas
+
+
+def numeric_columns(df):
+    """Colunas numéricas que entram nas matrizes de correlação."""
+    numericas = df.select_dtypes(include=np.number).columns
+    return [c for c in numericas if c not in COLUNAS_IGNORADAS]
+
+
+def _chaves_particao(df):
+    # ``.array`` preserva categóricas (sem materializar um objeto por linha)
+    return pd.DataFrame({
+        'machine': df['machine'].array,
+        'date': df['timestamp'].dt.normalize().array,
+        'failure_type': df['failure_type'].array,
+    })
+
+
+def _agrupar(chaves):
+    """Códigos de partição por linha e a tabela de chaves distintas."""
+    codigos, unicas = pd.MultiIndex.from_frame(chaves).factorize()
+    return codigos, unicas.to_frame(index=False, name=list(chaves.columns))
+
+
+def _menores_por_grupo(grupos, prioridade, k):
+    """Posições das ``k`` menores prioridades de cada grupo (``grupos`` são códigos por linha)."""
+    ordem = np.lexsort((prioridade, grupos))
+    ordenados = grupos[ordem]
+    inicio_grupo = np.flatnonzero(np.r_[True, ordenados[1:] != ordenados[:-1]])
+    tamanhos = np.diff(np.r_[inicio_grupo, len(ordem)])
+    posicao_no_grupo = np.arange(len(ordem)) - np.repeat(inicio_grupo, tamanhos)
+    return ordem[posicao_no_grupo < k]
+
+
+class CorrelationStats:
+    """Estatísticas suficientes por partição e esboço de amostragem para Spearman.
+
+    ``grupos`` é o grupo do esboço (``CHAVES_GRUPO``) de cada partição; as
+    linhas do esboço guardam a partição (``amostra_particao``), para que os
+    filtros de data também se apliquem a elas.
+    """
+
+    def __init__(self, colunas, deslocamento, chaves, n, somas, produtos,
+                 amostra, amostra_prioridade, amostra_particao, amostra_por_grupo):
+        self.colunas = list(colunas)
+        self.deslocamento = deslocamento
+        self.chaves = chaves.reset_index(drop=True)
+        self.n = n
+        self.somas = somas
+        self.produtos = produtos
+        self.amostra = amostra
+        self.amostra_prioridade = amostra_prioridade
+        self.amostra_particao = amostra_particao
+        self.amostra_por_grupo = amostra_por_grupo
+        self.grupos, _ = _agrupar(self.chaves[CHAVES_GRUPO])
+
+    def freeze(self):
+        """Marca os arrays como somente leitura (as estatísticas são compartilhadas)."""
+        for array in (self.deslocamento, self.n, self.somas, self.produtos, self.amostra,
+                      self.amostra_prioridade, self.amostra_particao, self.grupos):
+            array.flags.writeable = False
+        return self
+
+    @classmethod
+    def from_frame(cls, df, colunas=None, deslocamento=None, amostra_por_grupo=AMOSTRA_POR_GRUPO, seed=0):
+        """Monta as estatísticas de ``df`` em blocos de ``TAMANHO_BLOCO`` linhas."""
+        colunas = numeric_columns(df) if colunas is None else list(colunas)
+        valores = df[colunas]
+        if deslocamento is None:
+            deslocamento = valores.mean().to_numpy(dtype='float64')
+        rng = np.random.default_rng(seed)
+        k = len(colunas)
+
+        codigos, chaves = _agrupar(_chaves_particao(df))
+        p = len(chaves)
+        n = np.bincount(codigos, minlength=p).astype(np.int64)
+        somas = np.zeros((p, k))
+        produtos = np.zeros((p, k, k))
+        for inicio in range(0, len(df), TAMANHO_BLOCO):
+            bloco = slice(inicio, inicio + TAMANHO_BLOCO)
+            x = valores.iloc[bloco].to_numpy(dtype='float64') - deslocamento
+            grupos = codigos[bloco]
+            for i in range(k):
+                somas[:, i] += np.bincount(grupos, weights=x[:, i], minlength=p)
+                for j in range(i, k):
+                    produtos[:, i, j] += np.bincount(grupos, weights=x[:, i] * x[:, j], minlength=p)
+        iu = np.triu_indices(k, 1)
+        produtos[:, iu[1], iu[0]] = produtos[:, iu[0], iu[1]]
+
+        # Esboço: as linhas de menor prioridade aleatória de cada grupo
+        prioridade = rng.random(len(df))
+        grupos, _ = _agrupar(chaves[CHAVES_GRUPO])
+        mantidas = np.sort(_menores_por_grupo(grupos[codigos], prioridade, amostra_por_grupo))
+
+        return cls(colunas, deslocamento, chaves, n, somas, produtos,
+                   valores.iloc[mantidas].to_numpy(dtype='float64'),
+                   prioridade[mantidas], codigos[mantidas], amostra_por_grupo)
+
+    def merge(self, outras):
+        """Combina com estatísticas de outras linhas (ex.: dados anexados).
+
+        As estatísticas precisam ter as mesmas colunas e o mesmo deslocamento.
+        """
+        partes = [self] + list(outras)
+        for parte in partes[1:]:
+            if parte.colunas != self.colunas or not np.array_equal(parte.deslocamento, self.deslocamento):
+                raise ValueError("Estatísticas com colunas ou deslocamento diferentes")
+        todas_chaves = pd.concat([parte.chaves for parte in partes], ignore_index=True)
+        codigos, chaves = _agrupar(todas_chaves)
+        p = len(chaves)
+        k = len(self.colunas)
+
+        n = np.zeros(p, dtype=np.int64)
+        somas = np.zeros((p, k))
+        produtos = np.zeros((p, k, k))
+        amostras, prioridades, particoes = [], [], []
+        inicio = 0
+        for parte in partes:
+            novos = codigos[inicio:inicio + len(parte.chaves)]
+            inicio += len(parte.chaves)
+            # As chaves de uma parte são distintas, então a soma indexada não tem repetições
+            n[novos] += parte.n
+            somas[novos] += parte.somas
+            produtos[novos] += parte.produtos
+            amostras.append(parte.amostra)
+            prioridades.append(parte.amostra_prioridade)
+            particoes.append(novos[parte.amostra_particao])
+
+        amostra = np.concatenate(amostras)
+        prioridade = np.concatenate(prioridades)
+        particao = np.concatenate(particoes)
+        # Só os grupos que passaram do limite precisam ser cortados de novo; com poucas
+        # linhas anexadas, isso evita reordenar a amostra inteira
+        grupos, _ = _agrupar(chaves[CHAVES_GRUPO])
+        grupo = grupos[particao]
+        excedentes = np.flatnonzero(np.bincount(grupo)[grupo] > self.amostra_por_grupo)
+        if len(excedentes):
+            mantidas = np.ones(len(particao), dtype=bool)
+            mantidas[excedentes] = False
+            mantidas[excedentes[_menores_por_grupo(grupo[excedentes], prioridade[excedentes],
+                                                   self.amostra_por_grupo)]] = True
+            amostra, prioridade, particao = amostra[mantidas], prioridade[mantidas], particao[mantidas]
+
+        return CorrelationStats(self.colunas, self.deslocamento, chaves, n, somas, produtos,
+                                amostra, prioridade, particao, self.amostra_por_grupo)
+
+    def _particoes(self, data_inicio=None, data_fim=None, maquinas=None, tipos_falha=None):
+        mascara = np.ones(len(self.chaves), dtype=bool)
+        if data_inicio is not None:
+            mascara &= (self.chaves['date'] >= pd.Timestamp(data_inicio)).to_numpy()
+        if data_fim is not None:
+            mascara &= (self.chaves['date'] <= pd.Timestamp(data_fim)).to_numpy()
+        if maquinas is not None:
+            mascara &= self.chaves['machine'].isin(maquinas).to_numpy()
+        if tipos_falha is not None:
+            mascara &= self.chaves['failure_type'].isin(tipos_falha).to_numpy()
+        return mascara
+
+    def pearson(self, data_inicio=None, data_fim=None, maquinas=None, tipos_falha=None):
+        """Matriz de Pearson exata das linhas que passam nos filtros."""
+        mascara = self._particoes(data_inicio, data_fim, maquinas, tipos_falha)
+        return pearson_from_sums(self.colunas, self.n[mascara].sum(), self.somas[mascara].sum(axis=0),
+                                 self.produtos[mascara].sum(axis=0))
+
+    def like(self, df, seed=0):
+        """Estatísticas de ``df`` combináveis com estas (mesmas colunas, deslocamento e amostra)."""
+        return CorrelationStats.from_frame(df, self.colunas, self.deslocamento, self.amostra_por_grupo, seed)
+
+    def spearman_approx(self, data_inicio=None, data_fim=None, maquinas=None, tipos_falha=None,
+                        tamanho_maximo=50_000):
+        """Spearman aproximado pelo esboço de amostragem.
+
+        Retorna ``(matriz, erro)``, em que ``erro`` é o limite de 3 erros
+        padrão para cada coeficiente (0 quando a amostra contém todas as
+        linhas filtradas).
+        """
+        mascara = self._particoes(data_inicio, data_fim, maquinas, tipos_falha)
+        selecionadas = mascara[self.amostra_particao]
+
+        # Grupos com mais linhas que o esboço guarda limitam a probabilidade de inclusão: o
+        # corte de um grupo é a maior prioridade que ele guardou
+        n_grupos = self.grupos.max() + 1 if len(self.grupos) else 0
+        tocados = np.zeros(n_grupos, dtype=bool)
+        tocados[self.grupos[mascara]] = True
+        truncados = tocados & (np.bincount(self.grupos, weights=self.n, minlength=n_grupos)
+                               > self.amostra_por_grupo)
+        completa = not truncados.any()
+        if not completa:
+            grupo = self.grupos[self.amostra_particao]
+            corte = np.zeros(n_grupos)
+            np.maximum.at(corte, grupo, self.amostra_prioridade)
+            selecionadas &= self.amostra_prioridade <= corte[truncados].min()
+        linhas = np.flatnonzero(selecionadas)
+        if len(linhas) > tamanho_maximo:
+            ordem = np.argpartition(self.amostra_prioridade[linhas], tamanho_maximo)[:tamanho_maximo]
+            linhas = linhas[ordem]
+            completa = False
+        return sample_spearman(self.colunas, self.amostra[linhas], completa)
+
+
+def pearson_from_sums(colunas, n, somas, produtos):
+    """Matriz de Pearson a partir de ``n``, das somas e da matriz de produtos (valores deslocados)."""
+    k = len(colunas)
+    if n < 2:
+        return pd.DataFrame(np.full((k, k), np.nan), index=colunas, columns=colunas)
+    cov = (produtos - np.outer(somas, somas) / n) / (n - 1)
+    variancia = np.diag(cov).copy()
+    variancia[variancia <= 0] = np.nan  # Coluna constante: correlação indefinida
+    desvio = np.sqrt(variancia)
+    corr = np.clip(cov / np.outer(desvio, desvio), -1, 1)
+    np.fill_diagonal(corr, np.where(np.isnan(desvio), np.nan, 1.0))
+    return pd.DataFrame(corr, index=colunas, columns=colunas)
+
+
+def sample_spearman(colunas, amostra, completa):
+    """Spearman de uma amostra uniforme das linhas filtradas e o limite de erro (ver o módulo).
+
+    ``completa`` indica que a amostra contém todas as linhas filtradas.
+    """
+    matriz = pd.DataFrame(amostra, columns=colunas).corr(method='spearman')
+    m = len(amostra)
+    if completa:
+        erro = 0.0
+    elif m > 3:
+        erro = 3 * np.sqrt(1.06 / (m - 3))
+    else:
+        erro = np.nan
+    return matriz, erro
+
+
+def strongest_pair(corr):
+    """Par de variáveis com maior correlação absoluta fora da diagonal.
+
+    Percorre só o triângulo superior da matriz. Retorna ``(coluna_a,
+    coluna_b, valor_absoluto)`` ou ``None`` se não houver valor definido.
+    """
+    if corr.shape[0] < 2:
+        return None
+    i, j = np.triu_indices(corr.shape[0], 1)
+    valores = np.abs(corr.to_numpy()[i, j])
+    if np.isnan(valores).all():
+        return None
+    melhor = np.nanargmax(valores)
+    return corr.index[i[melhor]], corr.columns[j[melhor]], valores[melhor]
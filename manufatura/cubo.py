@@ -0,0 +1,94 @@
+"""Cubo de agregação (rollup) para os indicadores da aba "Visão Geral".
+
+O cubo guarda, para cada combinação de (machine, date, machine_status,
+failure_type, maintenance_required), a contagem de linhas e a soma e a soma
+dos quadrados de cada sensor. Qualquer combinação de filtros da barra
+lateral é respondida reagregando o cubo, sem tocar nas linhas brutas; o
+custo depende do número de combinações, não do tamanho do histórico.
+"""
+import pandas as pd
+
+DIMENSOES = ['machine', 'date', 'machine_status', 'failure_type', 'maintenance_required']
+SENSORES = ['temperature', 'pressure', 'vibration', 'energy_consumption']
+COLUNAS_SOMA = [f'{s}_soma' for s in SENSORES]
+COLUNAS_SOMA_QUAD = [f'{s}_soma_quad' for s in SENSORES]
+
+
+def build_cube(df):
+    """Agrega linhas brutas no cubo.
+
+    ``df`` precisa das colunas de ``DIMENSOES`` (com ``date`` como dia em
+    datetime64) e de ``SENSORES``.
+    """
+    valores = df[SENSORES].astype('float64')
+    base = pd.concat([
+        df[DIMENSOES],
+        valores.set_axis(COLUNAS_SOMA, axis=1),
+        (valores ** 2).set_axis(COLUNAS_SOMA_QUAD, axis=1),
+    ], axis=1)
+    agrupado = base.groupby(DIMENSOES, observed=True)
+    cubo = agrupado[COLUNAS_SOMA + COLUNAS_SOMA_QUAD].sum()
+    cubo['contagem'] = agrupado.size()
+    return cubo.reset_index()
+
+
+def merge_cubes(cubos):
+    """Combina cubos parciais (ex.: um por lote do CSV) num único cubo."""
+    cubos = list(cubos)
+    if len(cubos) == 1:
+        return cubos[0]
+    juntos = pd.concat(cubos, ignore_index=True)
+    return juntos.groupby(DIMENSOES, observed=True, as_index=False).sum()
+
+
+def filter_cube(cubo, data_inicio=None, data_fim=None, maquinas=None, tipos_falha=None):
+    """Restringe o cubo aos filtros da barra lateral (``None`` = sem filtro)."""
+    mascara = pd.Series(True, index=cubo.index)
+    if data_inicio is not None:
+        mascara &= cubo['date'] >= pd.Timestamp(data_inicio)
+    if data_fim is not None:
+        mascara &= cubo['date'] <= pd.Timestamp(data_fim)
+    if maquinas is not None:
+        mascara &= cubo['machine'].isin(maquinas)
+    if tipos_falha is not None:
+        mascara &= cubo['failure_type'].isin(tipos_falha)
+    return cubo[mascara]
+
+
+def sensor_means(cubo):
+    """Média de cada sensor por máquina (colunas ``machine`` + ``SENSORES``)."""
+    somas = cubo.groupby('machine', observed=True)[COLUNAS_SOMA + ['contagem']].sum()
+    medias = somas[COLUNAS_SOMA].div(somas['contagem'], axis=0)
+    return medias.set_axis(SENSORES, axis=1).reset_index()
+
+
+def status_counts(cubo):
+    """Número de linhas por ``machine_status``."""
+    return cubo.groupby('machine_status', observed=True)['contagem'].sum()
+
+
+def maintenance_counts(cubo):
+    """Linhas com ``maintenance_required == "Yes"`` por máquina."""
+    manutencao = cubo[cubo['maintenance_required'] == "Yes"]
+    contagem = manutencao.groupby('machine', observed=True)['contagem'].sum()
+    return contagem.reset_index(name='contagem_manutencao')
+
+
+def status_counts_by_machine(cubo, status):
+    """Número de linhas com o ``machine_status`` dado, por máquina."""
+    selecao = cubo[cubo['machine_status'] == status]
+    return selecao.groupby('machine', observed=True)['contagem'].sum()
+
+
+def status_by_failure(cubo, status=('Idle', 'Failure')):
+    """Ocorrências por (failure_type, machine_status) para os status dados."""
+    selecao = cubo[cubo['machine_status'].isin(status)]
+    contagem = selecao.groupby(['failure_type', 'machine_status'], observed=True)['contagem'].sum()
+    return contagem.reset_index(name='contagem')
+
+
+def failures_by_machine(cubo):
+    """Falhas reais (status "Failure" com tipo conhecido) por máquina e tipo."""
+    selecao = cubo[(cubo['machine_status'] == 'Failure') & (cubo['failure_type'] != 'No Failure')]
+    contagem = selecao.groupby(['machine', 'failure_type'], observed=True)['contagem'].sum()
+    return contagem.reset_index(name='quantidade_falhas')
@@ -0,0 +1,109 @@
+"""Exportação em blocos das linhas filtradas: CSV, CSV gzip e Parquet.
+
+O arquivo é escrito direto em disco, ``TAMANHO_BLOCO`` linhas por vez: a
+coluna ``time`` e o texto CSV só existem para o bloco corrente, então a
+memória usada não cresce com o tamanho da exportação. O CSV gerado é o
+mesmo do download em memória (``nucleo.export_csv``); o Parquet leva as
+mesmas colunas, tipadas e comprimidas com zstd.
+
+As linhas vêm de qualquer sequência de blocos (``write_blocks``): as fatias
+de um DataFrame (``frame_blocks``) ou os lidos aos poucos do banco em disco
+do ``backends.SQLiteBackend``.
+
+A gravação vai para um arquivo temporário renomeado no fim, então uma
+exportação interrompida nunca deixa um arquivo pela metade no destino.
+"""
+import gzip
+import os
+import tempfile
+from collections import namedtuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from manufatura import ingestao
+
+TAMANHO_BLOCO = 100_000  # Linhas convertidas e escritas por vez
+
+Formato = namedtuple('Formato', ['rotulo', 'extensao', 'mime'])
+
+FORMATOS = {
+    'csv': Formato('CSV', 'csv', 'text/csv'),
+    'csv.gz': Formato('CSV comprimido (gzip)', 'csv.gz', 'application/gzip'),
+    'parquet': Formato('Parquet (colunar, zstd)', 'parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def frame_blocks(df, tamanho_bloco=TAMANHO_BLOCO):
+    """``df`` em fatias de ``tamanho_bloco`` linhas (ao menos uma, vazia se ``df`` estiver)."""
+    for inicio in range(0, max(len(df), 1), tamanho_bloco):
+        yield df.iloc[inicio:inicio + tamanho_bloco]
+
+
+def _escrever_csv(blocos, arquivo, avancar):
+    for i, bloco in enumerate(blocos):
+        ingestao.display_frame(bloco).to_csv(arquivo, index=False, header=(i == 0))
+        avancar(len(bloco))
+
+
+def _tabela_arrow(bloco):
+    tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+    # 'date' é só o dia (como no CSV): grava como date32, não como timestamp
+    i = tabela.schema.get_field_index('date')
+    return tabela.set_column(i, 'date', tabela.column(i).cast(pa.date32()))
+
+
+def _escrever_parquet(blocos, caminho, avancar):
+    escritor = None
+    try:
+        for bloco in blocos:
+            tabela = _tabela_arrow(ingestao.display_frame(bloco))
+            if escritor is None:
+                escritor = pq.ParquetWriter(caminho, tabela.schema, compression='zstd')
+            escritor.write_table(tabela)
+            avancar(len(bloco))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def write_blocks(blocos, total, caminho, formato='csv', progresso=None):
+    """Grava em ``caminho`` as linhas de ``blocos`` (DataFrames) no ``formato`` dado.
+
+    ``blocos`` é um iterável com pelo menos um DataFrame (vazio, se não
+    houver linhas: ele dá o cabeçalho) e ``total`` é o número de linhas, para
+    o progresso. ``progresso``, se informado, é chamado com a fração já
+    escrita (0 a 1) depois de cada bloco. Retorna o tamanho do arquivo em
+    bytes.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    progresso = progresso or (lambda fracao: None)
+    escritas = 0
+
+    def avancar(linhas):
+        nonlocal escritas
+        escritas += linhas
+        if total:
+            progresso(min(escritas / total, 1.0))
+
+    # Um temporário por chamada: duas sessões exportando o mesmo pedido não escrevem no mesmo
+    # arquivo, e a última a terminar substitui o da outra, que já estava completo
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or None,
+                                             prefix=os.path.basename(caminho) + '.', suffix='.tmp')
+    os.close(descritor)
+    try:
+        if formato == 'parquet':
+            _escrever_parquet(blocos, temporario, avancar)
+        elif formato == 'csv.gz':
+            with gzip.open(temporario, 'wt', encoding='utf-8', newline='') as arquivo:
+                _escrever_csv(blocos, arquivo, avancar)
+        else:
+            with open(temporario, 'w', encoding='utf-8', newline='') as arquivo:
+                _escrever_csv(blocos, arquivo, avancar)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    progresso(1.0)
+    return os.path.getsize(caminho)
@@ -0,0 +1,151 @@
+"""Motor de filtros indexado sobre o DataFrame carregado.
+
+Os dados ficam ordenados por ``timestamp``, então um intervalo de datas vira
+uma fatia de linhas resolvida por busca binária. Máquinas e tipos de falha
+são resolvidos por conjuntos de posições pré-calculados por categoria. Nada
+é copiado na proporção do dataset inteiro: um filtro só de datas devolve uma
+*view* (fatia) dos dados e os demais filtros materializam apenas as linhas
+selecionadas.
+
+Os índices crescem no fim (``manufatura.vetores``): anexar linhas indexa só
+as linhas novas, sem copiar as posições já calculadas.
+"""
+import numpy as np
+import pandas as pd
+
+from manufatura.vetores import GrowableArray
+
+UM_DIA = np.timedelta64(1, 'D')
+
+
+def _indexar(coluna):
+    """Códigos compactos da coluna e as posições (ordenadas) de cada categoria."""
+    codigos, categorias = pd.factorize(coluna, sort=True)
+    ordem = np.argsort(codigos, kind='stable')
+    limites = np.searchsorted(codigos[ordem], np.arange(len(categorias) + 1))
+    posicoes = {categoria: GrowableArray(ordem[limites[i]:limites[i + 1]])
+                for i, categoria in enumerate(categorias)}
+    return GrowableArray(codigos.astype(np.min_scalar_type(len(categorias)))), posicoes
+
+
+def _estender(posicoes, coluna, deslocamento):
+    """Posições por categoria acrescidas das linhas de ``coluna`` (a partir de ``deslocamento``)."""
+    _, novas = _indexar(coluna)
+    estendidas = {}
+    for categoria in sorted(set(posicoes) | set(novas)):
+        linhas = posicoes.get(categoria)
+        if categoria not in novas:
+            estendidas[categoria] = linhas
+        elif linhas is None:
+            estendidas[categoria] = GrowableArray(novas[categoria].values + deslocamento)
+        else:
+            estendidas[categoria] = linhas.append(novas[categoria].values + deslocamento)
+    return estendidas
+
+
+def _codigos(posicoes, n):
+    """Código (ordem da categoria) de cada uma das ``n`` linhas."""
+    codigos = np.empty(n, dtype=np.min_scalar_type(len(posicoes)))
+    for i, linhas in enumerate(posicoes.values()):
+        codigos[linhas.values] = i
+    return GrowableArray(codigos)
+
+
+class FilterEngine:
+    """Resolve os filtros da barra lateral sobre um DataFrame somente leitura.
+
+    ``df`` precisa ter as colunas ``timestamp``, ``machine`` e
+    ``failure_type``; se não estiver ordenado por ``timestamp`` é ordenado
+    uma única vez na construção.
+    """
+
+    def __init__(self, df):
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values('timestamp', kind='stable')
+        self.df = df.reset_index(drop=True)
+        self._timestamps = self.df['timestamp'].to_numpy()
+        _, self._linhas_maquina = _indexar(self.df['machine'])
+        self._codigos_falha, self._linhas_falha = _indexar(self.df['failure_type'])
+        self._codigo_por_falha = {t: i for i, t in enumerate(self._linhas_falha)}
+
+    def __len__(self):
+        return len(self.df)
+
+    def append(self, df):
+        """Novo motor para ``df`` = linhas atuais (na mesma ordem) + linhas novas no fim.
+
+        Quando as linhas novas não são anteriores à última já indexada (o
+        caso normal de dados anexados), só elas são indexadas: as posições
+        por máquina e por tipo de falha crescem no fim, sem copiar as
+        existentes (um tipo de falha novo recalcula os códigos por linha).
+        Senão o motor é reconstruído do zero.
+        """
+        n = len(self.df)
+        novas = df.iloc[n:]
+        timestamps_novos = novas['timestamp'].to_numpy()
+        if n and len(novas) and (timestamps_novos[0] < self._timestamps[-1]
+                                 or not novas['timestamp'].is_monotonic_increasing):
+            return FilterEngine(df)
+        motor = object.__new__(FilterEngine)
+        motor.df = df.reset_index(drop=True)
+        motor._timestamps = motor.df['timestamp'].to_numpy()
+        motor._linhas_maquina = _estender(self._linhas_maquina, novas['machine'], n)
+        motor._linhas_falha = _estender(self._linhas_falha, novas['failure_type'], n)
+        if list(motor._linhas_falha) == list(self._linhas_falha):
+            codigos_novos = pd.Categorical(novas['failure_type'], categories=list(self._linhas_falha)).codes
+            motor._codigos_falha = self._codigos_falha.append(codigos_novos)
+        else:
+            motor._codigos_falha = _codigos(motor._linhas_falha, len(df))
+        motor._codigo_por_falha = {t: i for i, t in enumerate(motor._linhas_falha)}
+        return motor
+
+    def freeze(self):
+        """Marca os índices como somente leitura (o motor é compartilhado entre threads)."""
+        # As posições e os códigos (``GrowableArray``) já são somente leitura
+        self._timestamps.flags.writeable = False
+        return self
+
+    def machine_rows(self, maquina):
+        """Posições (em ordem temporal) das linhas da ``maquina``."""
+        linhas = self._linhas_maquina.get(maquina)
+        return np.empty(0, dtype=np.intp) if linhas is None else linhas.values
+
+    def _fatia_datas(self, data_inicio, data_fim):
+        inicio = 0
+        fim = len(self._timestamps)
+        if data_inicio is not None:
+            inicio = np.searchsorted(self._timestamps, np.datetime64(data_inicio, 'D'), side='left')
+        if data_fim is not None:
+            fim = np.searchsorted(self._timestamps, np.datetime64(data_fim, 'D') + UM_DIA, side='left')
+        return slice(int(inicio), int(max(inicio, fim)))
+
+    @staticmethod
+    def _restringir(linhas, fatia):
+        # ``linhas`` está ordenado, então a fatia de datas vira outra fatia
+        i, j = np.searchsorted(linhas, [fatia.start, fatia.stop])
+        return linhas[i:j]
+
+    def _uniao(self, indices, categorias, fatia):
+        partes = [self._restringir(indices[c].values, fatia) for c in categorias if c in indices]
+        if not partes:
+            return np.empty(0, dtype=np.intp)
+        if len(partes) == 1:
+            return partes[0]
+        return np.sort(np.concatenate(partes))
+
+    def select(self, data_inicio=None, data_fim=None, maquinas=None, tipos_falha=None):
+        """Posições das linhas que passam nos filtros (``None`` = sem filtro).
+
+        Retorna uma ``slice`` quando só há filtro de datas, senão um array
+        ordenado de posições.
+        """
+        fatia = self._fatia_datas(data_inicio, data_fim)
+        if maquinas is None and tipos_falha is None:
+            return fatia
+        if maquinas is None:
+            return self._uniao(self._linhas_falha, tipos_falha, fatia)
+        linhas = self._uniao(self._linhas_maquina, maquinas, fatia)
+        if tipos_falha is not None:
+            codigos = [self._codigo_por_falha[t] for t in tipos_falha if t in self._codigo_por_falha]
+            linhas = linhas[np.isin(self._codigos_falha.values[linhas], codigos)]
+        return linhas
@@ -0,0 +1,565 @@
+"""Ingestão do CSV de sensores para um cache colunar particionado.
+
+O CSV é convertido uma única vez para um dataset Parquet particionado por
+data e máquina (layout *hive*: ``mes=202501/machine=M1/``), já com as
+colunas tipadas. A partição de data é mensal: partições diárias geram
+dezenas de milhares de arquivos pequenos por ano, e abrir esses arquivos
+custa mais que lê-los. Dentro de cada arquivo as linhas seguem a ordem
+temporal, em grupos de linhas pequenos, e a coluna ``date`` tem
+estatísticas de mínimo/máximo por grupo; assim um recorte de dias e
+máquinas em ``load_data`` descarta meses e máquinas inteiros pela partição
+e o resto pelos grupos de linhas. As leituras seguintes carregam o dataset
+(ou só a janela pedida) a partir dele, sem voltar a tocar no CSV; os
+filtros da barra lateral são resolvidos em memória
+(``manufatura.filtros``) ou pelo banco do ``backends.SQLiteBackend``.
+
+Cada linha leva o seu número no CSV (``COLUNA_LINHA``), usado só para
+restaurar a ordem na leitura: as partições não guardam a ordem do arquivo,
+e linhas com o mesmo ``timestamp`` voltam na ordem em que estavam no CSV.
+
+Na mesma passada é montado o cubo de agregação (``manufatura.cubo``) do
+arquivo inteiro, gravado em ``cubo.parquet`` dentro do cache.
+
+O CSV pode continuar crescendo: o manifesto guarda até que byte as linhas
+já foram ingeridas, e ``update_columnar_cache`` lê só as linhas completas
+anexadas depois dele. Uma última linha sem ``\n`` só fica para depois
+enquanto o arquivo cresce: se o tamanho não mudou desde a verificação
+anterior (ou na ingestão completa), o fim do arquivo encerra a linha. Elas vão para arquivos Parquet em ``anexos/`` (sem
+particionamento, listados no manifesto), e o cubo é atualizado somando o
+cubo das linhas novas. Quando os anexos passam de ``MAX_ANEXOS`` arquivos,
+são compactados num só. Se o início do arquivo mudou (não foi só um
+acréscimo), o cache é reconstruído do zero.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from manufatura import cubo, paralelo, perfil
+
+VERSAO_CACHE = 5
+TAMANHO_LOTE = 500_000  # Linhas do CSV processadas por vez durante a ingestão
+LINHAS_POR_GRUPO = 64 * 1024  # Grupos de linhas menores = poda mais fina por data
+COLUNAS_CATEGORICAS = ['machine', 'machine_status', 'failure_type', 'maintenance_required']
+MAX_CASAS_DECIMAIS = 6  # Acima disso o sensor fica em float64
+MAX_ANEXOS = 32  # Arquivos de linhas anexadas antes de compactá-los num só
+BYTES_VERIFICACAO = 4096  # Trecho antes do último byte ingerido usado para detectar reescritas
+COLUNA_LINHA = '_linha'  # Número da linha no CSV (a partir de 0, sem o cabeçalho)
+
+PARTICIONAMENTO = ds.partitioning(
+    pa.schema([('mes', pa.int32()), ('machine', pa.string())]),
+    flavor='hive',
+)
+
+
+def cache_dir_for(file_path):
+    """Diretório do cache colunar associado a um CSV (ao lado do arquivo)."""
+    return os.path.splitext(file_path)[0] + '_cache'
+
+
+def _mes(dia):
+    """Chave da partição mensal (ex.: 202501) de um ``datetime.date``."""
+    return dia.year * 100 + dia.month
+
+
+def _assinatura(file_path):
+    info = os.stat(file_path)
+    return {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns}
+
+
+# Resultado de ``update_columnar_cache``: ``novas_linhas`` e ``cubo`` (só das linhas
+# novas) são None quando nada foi anexado; ``tabela`` tem as mesmas linhas novas em Arrow,
+# na mesma ordem e com os tipos do CSV (sem a compactação de ``compact_frame``)
+Atualizacao = namedtuple('Atualizacao', ['manifesto', 'novas_linhas', 'cubo', 'reconstruido', 'tabela'],
+                         defaults=(None,))
+
+
+class _Trecho(io.RawIOBase):
+    """Leitura de um arquivo binário da posição atual até ``fim`` (exclusivo)."""
+
+    def __init__(self, arquivo, fim):
+        self._arquivo = arquivo
+        self._restante = fim - arquivo.tell()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), max(self._restante, 0))
+        lidos = self._arquivo.readinto(memoryview(buffer)[:n])
+        self._restante -= lidos
+        return lidos
+
+
+def _fim_linhas_completas(arquivo, tamanho):
+    """Posição logo após o último ``\n`` (uma linha ainda em escrita fica de fora)."""
+    fim = tamanho
+    while fim > 0:
+        inicio = max(0, fim - 64 * 1024)
+        arquivo.seek(inicio)
+        bloco = arquivo.read(fim - inicio)
+        posicao = bloco.rfind(b'\n')
+        if posicao >= 0:
+            return inicio + posicao + 1
+        fim = inicio
+    return 0
+
+
+def _termina_em_quebra(arquivo, offset):
+    """True se o trecho até ``offset`` termina numa quebra de linha (ou está vazio)."""
+    if offset == 0:
+        return True
+    arquivo.seek(offset - 1)
+    return arquivo.read(1) == b'\n'
+
+
+def _verificacao(arquivo, offset):
+    """Hash do trecho que termina em ``offset``: muda se o arquivo for reescrito."""
+    inicio = max(0, offset - BYTES_VERIFICACAO)
+    arquivo.seek(inicio)
+    return hashlib.sha1(arquivo.read(offset - inicio)).hexdigest()
+
+
+def _gravar_json(caminho, conteudo):
+    # Grava e renomeia: quem lê nunca vê um arquivo pela metade
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, ensure_ascii=False, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def read_manifest(cache_dir):
+    """Lê o manifesto do cache; retorna None se o cache não existir."""
+    try:
+        with open(os.path.join(cache_dir, 'manifesto.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _preparar_lote(lote):
+    # Mesmo tratamento que o load_data original fazia sobre o arquivo inteiro
+    lote.dropna(axis=0, inplace=True)
+    lote['timestamp'] = pd.to_datetime(lote['timestamp'])
+    return lote
+
+
+def _numerar_lote(lote, manifesto):
+    """Indexa o lote pelo número das linhas no CSV, continuando a contagem do manifesto."""
+    lidas = manifesto.get('linhas_lidas', 0)
+    lote.index = pd.RangeIndex(lidas, lidas + len(lote))
+    manifesto['linhas_lidas'] = lidas + len(lote)
+    return lote
+
+
+def _converter_lote(lote, schema=None):
+    """Tabela Arrow de um lote já tratado, com as colunas ``date``, ``mes`` e ``COLUNA_LINHA``."""
+    tabela = pa.Table.from_pandas(lote, preserve_index=False)
+    if schema is not None:
+        # Lotes diferentes podem inferir tipos diferentes (ex.: int x float)
+        tabela = tabela.cast(schema)
+    # O índice do lote é o número da linha no CSV (ver _numerar_lote), mantido pelo dropna
+    tabela = tabela.append_column(COLUNA_LINHA, pa.array(lote.index.to_numpy(np.int64)))
+    datas = pc.cast(tabela['timestamp'], pa.date32())
+    tabela = tabela.append_column('date', datas)
+    meses = pc.add(pc.multiply(pc.year(datas), 100), pc.month(datas))
+    return tabela.append_column('mes', pc.cast(meses, pa.int32()))
+
+
+def _resumo(tabela, manifesto):
+    """Acrescenta ao manifesto as máquinas, tipos de falha, datas e linhas da tabela."""
+    datas = tabela['date']
+    extremos = pc.min_max(datas).as_py()
+    if manifesto.get('data_min') is not None:
+        extremos['min'] = min(extremos['min'], date.fromisoformat(manifesto['data_min']))
+        extremos['max'] = max(extremos['max'], date.fromisoformat(manifesto['data_max']))
+    manifesto['maquinas'] = sorted(set(manifesto.get('maquinas', []))
+                                   | set(pc.unique(tabela['machine']).to_pylist()))
+    manifesto['tipos_falha'] = sorted(set(manifesto.get('tipos_falha', []))
+                                      | set(pc.unique(tabela['failure_type']).to_pylist()))
+    manifesto['data_min'] = extremos['min'].isoformat()
+    manifesto['data_max'] = extremos['max'].isoformat()
+    manifesto['linhas'] = manifesto.get('linhas', 0) + tabela.num_rows
+
+
+def build_columnar_cache(file_path, cache_dir=None):
+    """Converte o CSV para o dataset Parquet particionado e grava o manifesto.
+
+    O CSV é lido em lotes de ``TAMANHO_LOTE`` linhas, então a memória usada
+    não depende do tamanho do arquivo. Todo o arquivo é lido, inclusive uma
+    última linha sem ``\n``; se ela ainda estava em escrita e continuar
+    depois, ``update_columnar_cache`` percebe e reconstrói o cache. O
+    cache é montado num diretório temporário e só substitui o anterior
+    quando está completo.
+    """
+    cache_dir = cache_dir or cache_dir_for(file_path)
+    tmp_dir = cache_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    dados_dir = os.path.join(tmp_dir, 'dados')
+
+    assinatura = _assinatura(file_path)
+    schema = None
+    manifesto = {'versao': VERSAO_CACHE, 'origem': assinatura}
+    cubos = []
+
+    arquivo = open(file_path, 'rb')
+    with arquivo:
+        fim = assinatura['tamanho']
+        manifesto['offset'] = fim
+        manifesto['verificacao'] = _verificacao(arquivo, fim)
+        manifesto['quebra_final'] = _termina_em_quebra(arquivo, fim)
+        arquivo.seek(0)
+        leitor = io.BufferedReader(_Trecho(arquivo, fim))
+        lotes = perfil.iterate('leitura_csv', pd.read_csv(leitor, chunksize=TAMANHO_LOTE))
+        for i, lote in enumerate(lotes):
+            with perfil.fase('limpeza'):
+                lote = _preparar_lote(_numerar_lote(lote, manifesto))
+            if lote.empty:
+                continue
+            with perfil.fase('conversao_arrow'):
+                tabela = _converter_lote(lote, schema)
+            if schema is None:
+                schema = pa.schema([campo for campo in tabela.schema
+                                    if campo.name not in ('date', 'mes', COLUNA_LINHA)])
+                manifesto['colunas'] = schema.names
+            _resumo(tabela, manifesto)
+            with perfil.fase('cubo'):
+                lote_cubo = lote.assign(date=lote['timestamp'].dt.normalize())
+                cubos.append(paralelo.aggregate(lote_cubo, com_estatisticas=False).cubo)
+            with perfil.fase('gravacao_parquet'):
+                _escrever_particoes(tabela, dados_dir, f'lote-{i}')
+
+    if schema is None:
+        raise ValueError(f"Nenhuma linha válida em {file_path}")
+
+    cubo.merge_cubes(cubos).to_parquet(os.path.join(tmp_dir, 'cubo.parquet'), index=False)
+    manifesto['anexos'] = []
+    _gravar_json(os.path.join(tmp_dir, 'manifesto.json'), manifesto)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return manifesto
+
+
+def _escrever_particoes(tabela, dados_dir, prefixo):
+    ds.write_dataset(
+        tabela, dados_dir,
+        format='parquet',
+        partitioning=PARTICIONAMENTO,
+        basename_template=f'{prefixo}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        max_partitions=1 << 20,  # Um lote pode cobrir muitos meses x máquinas
+        min_rows_per_group=LINHAS_POR_GRUPO,
+        max_rows_per_group=LINHAS_POR_GRUPO,
+    )
+
+
+def _anexavel(arquivo, tamanho, manifesto):
+    """True se o arquivo só ganhou linhas depois do trecho já ingerido."""
+    offset = manifesto['offset']
+    if tamanho < offset or _verificacao(arquivo, offset) != manifesto['verificacao']:
+        return False
+    if manifesto['quebra_final'] or tamanho == offset:
+        return True
+    # A última linha ingerida terminava no fim do arquivo: o que vier depois tem de
+    # começar numa linha nova, senão ela ainda estava em escrita e foi lida pela metade
+    arquivo.seek(offset)
+    return arquivo.read(1) in (b'\r', b'\n')
+
+
+def _compactar_anexos(cache_dir, manifesto):
+    """Junta os arquivos de ``anexos/`` num só; retorna os nomes substituídos."""
+    anexos_dir = os.path.join(cache_dir, 'anexos')
+    antigos = manifesto['anexos']
+    tabela = pa.concat_tables(pq.read_table(os.path.join(anexos_dir, nome)) for nome in antigos)
+    nome = f'anexo-{manifesto["offset"]:020d}-compactado.parquet'
+    pq.write_table(tabela, os.path.join(anexos_dir, nome), row_group_size=LINHAS_POR_GRUPO)
+    manifesto['anexos'] = [nome]
+    return antigos
+
+
+def update_columnar_cache(file_path, cache_dir=None):
+    """Põe o cache em dia com o CSV, lendo só as linhas anexadas desde a última ingestão.
+
+    Retorna uma ``Atualizacao``:
+
+    - CSV igual ao ingerido, ou sem linhas novas válidas: ``novas_linhas``
+      é None;
+    - linhas anexadas: ``novas_linhas`` tem só essas linhas, no formato de
+      ``load_data``, ``cubo`` é o cubo delas, e o cache já as inclui;
+    - CSV reescrito (ou cache ausente/de outra versão): o cache é
+      reconstruído, ``reconstruido`` é True e ``novas_linhas`` é None.
+
+    O manifesto é gravado por último, então uma atualização interrompida
+    não deixa o cache inconsistente: os arquivos novos só passam a contar
+    quando aparecem na lista ``anexos`` do manifesto.
+    """
+    cache_dir = cache_dir or cache_dir_for(file_path)
+    manifesto = read_manifest(cache_dir)
+    if manifesto is None or manifesto.get('versao') != VERSAO_CACHE:
+        return Atualizacao(build_columnar_cache(file_path, cache_dir), None, None, True)
+    assinatura = _assinatura(file_path)
+    if manifesto['origem'] == assinatura:
+        return Atualizacao(manifesto, None, None, False)
+
+    with open(file_path, 'rb') as arquivo:
+        if not _anexavel(arquivo, assinatura['tamanho'], manifesto):
+            return Atualizacao(build_columnar_cache(file_path, cache_dir), None, None, True)
+        tamanho = assinatura['tamanho']
+        fim = _fim_linhas_completas(arquivo, tamanho)
+        if fim < tamanho and manifesto.get('tamanho_pendente') == tamanho:
+            fim = tamanho  # A última linha não cresceu desde a verificação anterior: está completa
+        inicio = manifesto['offset']
+        if fim <= inicio:  # Nada novo, ou só uma linha ainda incompleta
+            atual = dict(manifesto, tamanho_pendente=tamanho)
+            if tamanho == inicio:
+                atual['origem'] = assinatura
+            if atual != manifesto:
+                _gravar_json(os.path.join(cache_dir, 'manifesto.json'), atual)
+            return Atualizacao(atual, None, None, False)
+        arquivo.seek(0)
+        colunas_csv = pd.read_csv(io.BytesIO(arquivo.readline()), nrows=0).columns
+        arquivo.seek(inicio)
+        leitor = io.BufferedReader(_Trecho(arquivo, fim))
+        lotes = perfil.iterate('leitura_csv',
+                               pd.read_csv(leitor, header=None, names=colunas_csv, chunksize=TAMANHO_LOTE))
+        schema = pa.schema([_schema_dados(cache_dir).field(c) for c in manifesto['colunas']])
+        manifesto = dict(manifesto)
+        tabelas, cubos = [], []
+        for lote in lotes:
+            with perfil.fase('limpeza'):
+                lote = _preparar_lote(_numerar_lote(lote, manifesto))
+            if not lote.empty:
+                with perfil.fase('conversao_arrow'):
+                    tabelas.append(_converter_lote(lote, schema))
+                with perfil.fase('cubo'):
+                    lote_cubo = lote.assign(date=lote['timestamp'].dt.normalize())
+                    cubos.append(paralelo.aggregate(lote_cubo, com_estatisticas=False).cubo)
+        verificacao = _verificacao(arquivo, fim)
+        quebra_final = _termina_em_quebra(arquivo, fim)
+
+    # Com uma linha incompleta no fim, a assinatura não é atualizada: a próxima verificação
+    # volta a olhar o arquivo e, se o tamanho continuar o mesmo, lê a linha
+    manifesto = dict(manifesto, offset=fim, verificacao=verificacao, quebra_final=quebra_final,
+                     tamanho_pendente=tamanho)
+    if fim == tamanho:
+        manifesto['origem'] = assinatura
+    substituidos = []
+    cubo_novas = None
+    if tabelas:
+        cubo_novas = cubo.merge_cubes(cubos)
+        tabela = pa.concat_tables(tabelas)
+        _resumo(tabela, manifesto)
+        anexos_dir = os.path.join(cache_dir, 'anexos')
+        os.makedirs(anexos_dir, exist_ok=True)
+        nome = f'anexo-{inicio:020d}.parquet'
+        pq.write_table(tabela, os.path.join(anexos_dir, nome), row_group_size=LINHAS_POR_GRUPO)
+        manifesto['anexos'] = manifesto['anexos'] + [nome]
+        if len(manifesto['anexos']) > MAX_ANEXOS:
+            substituidos = _compactar_anexos(cache_dir, manifesto)
+
+        caminho_cubo = os.path.join(cache_dir, 'cubo.parquet')
+        cubo_atual = pd.read_parquet(caminho_cubo)
+        cubo.merge_cubes([cubo_atual, cubo_novas]).to_parquet(caminho_cubo + '.tmp', index=False)
+        os.replace(caminho_cubo + '.tmp', caminho_cubo)
+    _gravar_json(os.path.join(cache_dir, 'manifesto.json'), manifesto)
+    for nome in substituidos:
+        os.remove(os.path.join(cache_dir, 'anexos', nome))
+
+    if not tabelas:  # Todas as linhas novas descartadas pelo dropna
+        return Atualizacao(manifesto, None, None, False)
+    tabela = _ordenar(pa.concat_tables(tabelas).select(manifesto['colunas'] + ['date', COLUNA_LINHA]))
+    return Atualizacao(manifesto, table_to_frame(tabela), cubo_novas, False, tabela)
+
+
+def ensure_columnar_cache(file_path, cache_dir=None):
+    """Retorna o manifesto do cache, pondo-o em dia se o CSV mudou.
+
+    Linhas anexadas ao CSV são ingeridas incrementalmente; qualquer outra
+    mudança reconstrói o cache.
+    """
+    return update_columnar_cache(file_path, cache_dir).manifesto
+
+
+def _casas_decimais(valores):
+    """Menor número de casas decimais que representa ``valores`` sem perda."""
+    for casas in range(MAX_CASAS_DECIMAIS + 1):
+        if np.array_equal(np.round(valores, casas), valores):
+            return casas
+    return None
+
+
+def _cabe_em_float32(valores):
+    if len(valores) == 0 or not np.isfinite(valores).all():
+        return False
+    casas = _casas_decimais(valores)
+    if casas is None:
+        return False
+    # Volta de float32 para float64 e arredonda na precisão original do CSV
+    reconvertido = np.round(valores.astype(np.float32).astype(np.float64), casas)
+    return np.array_equal(reconvertido, valores)
+
+
+def _cabe_no_inteiro(valores, tipo):
+    if len(valores) == 0:
+        return True
+    limites = np.iinfo(tipo)
+    return limites.min <= valores.min() and valores.max() <= limites.max
+
+
+def compact_frame(df, tipos=None):
+    """Reduz o DataFrame carregado a tipos compactos, sem mudar os valores.
+
+    - colunas de texto repetitivas viram ``category`` (categorias ordenadas);
+    - sensores ``float64`` viram ``float32`` quando todos os valores voltam
+      idênticos na precisão decimal do CSV;
+    - inteiros usam o menor tipo que comporta o intervalo.
+
+    Com ``tipos`` (os dtypes de um DataFrame já compactado), as colunas
+    numéricas ficam nesses tipos sempre que os valores couberem neles, para
+    que as linhas possam ser anexadas àquele DataFrame sem conversão.
+    """
+    tipos = {} if tipos is None else dict(tipos)
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df:
+            categorias = df[coluna].astype('category')
+            df[coluna] = categorias.cat.reorder_categories(sorted(categorias.cat.categories))
+    for coluna in df.select_dtypes(include='float64').columns:
+        if tipos.get(coluna, np.float32) == np.float32 and _cabe_em_float32(df[coluna].to_numpy()):
+            df[coluna] = df[coluna].astype(np.float32)
+    for coluna in df.select_dtypes(include='integer').columns:
+        tipo = tipos.get(coluna)
+        if pd.api.types.is_integer_dtype(tipo) and _cabe_no_inteiro(df[coluna].to_numpy(), tipo):
+            df[coluna] = df[coluna].astype(tipo)
+        else:
+            df[coluna] = pd.to_numeric(df[coluna], downcast='integer')
+    return df
+
+
+def display_frame(df):
+    """Acrescenta a coluna ``time`` (``datetime.time``) para exibição e exportação.
+
+    A coluna só é materializada para as linhas mostradas ou exportadas; o
+    dataset em memória guarda apenas ``timestamp`` e a chave de dia ``date``.
+    """
+    exibicao = df.copy(deep=False)
+    exibicao['time'] = exibicao['timestamp'].dt.time
+    return exibicao
+
+
+def load_data(file_path, manifesto=None, data_inicio=None, data_fim=None, maquinas=None):
+    """Carrega as linhas do cache colunar, lendo só as partições necessárias.
+
+    Com ``manifesto`` (de ``ensure_columnar_cache``), lê exatamente as
+    linhas que ele lista, sem verificar o CSV de novo; sem ele, põe o cache
+    em dia antes de ler.
+    ``data_inicio``/``data_fim`` (inclusivos) e ``maquinas`` viram filtros
+    sobre as chaves de partição e sobre a coluna ``date``; ``None``
+    significa sem restrição.
+    O DataFrame retornado tem as mesmas colunas que o CSV tratado, mais
+    ``date`` (dia em ``datetime64``), ordenado por ``timestamp`` e com os
+    tipos compactos de ``compact_frame``. A coluna ``time`` da versão
+    anterior é gerada só na exibição (``display_frame``).
+    """
+    cache_dir = cache_dir_for(file_path)
+    if manifesto is None:
+        manifesto = ensure_columnar_cache(file_path, cache_dir)
+    dataset = _dataset(cache_dir, manifesto)
+
+    condicoes = []
+    if data_inicio is not None:
+        condicoes.append(ds.field('mes') >= _mes(data_inicio))
+        condicoes.append(ds.field('date') >= pa.scalar(data_inicio, pa.date32()))
+    if data_fim is not None:
+        condicoes.append(ds.field('mes') <= _mes(data_fim))
+        condicoes.append(ds.field('date') <= pa.scalar(data_fim, pa.date32()))
+    if maquinas is not None:
+        condicoes.append(ds.field('machine').isin(list(maquinas)))
+    filtro = None
+    for cond in condicoes:
+        filtro = cond if filtro is None else filtro & cond
+
+    with perfil.fase('leitura_parquet'):
+        tabela = dataset.to_table(columns=manifesto['colunas'] + ['date', COLUNA_LINHA], filter=filtro)
+    with perfil.fase('conversao_pandas'):
+        return table_to_frame(tabela)
+
+
+def _schema_dados(cache_dir):
+    return ds.dataset(os.path.join(cache_dir, 'dados'),
+                      format='parquet', partitioning=PARTICIONAMENTO).schema
+
+
+def _dataset(cache_dir, manifesto):
+    """Dataset Arrow com as partições e os anexos listados no manifesto."""
+    dados = ds.dataset(os.path.join(cache_dir, 'dados'),
+                       format='parquet', partitioning=PARTICIONAMENTO)
+    if not manifesto['anexos']:
+        return dados
+    anexos = ds.dataset([os.path.join(cache_dir, 'anexos', nome) for nome in manifesto['anexos']],
+                        format='parquet', schema=dados.schema)
+    return ds.dataset([dados, anexos])
+
+
+def scan_cache(cache_dir, manifesto, tamanho_lote=TAMANHO_LOTE):
+    """Percorre as linhas do cache em tabelas Arrow de cerca de ``tamanho_lote`` linhas.
+
+    As tabelas têm as colunas do CSV mais ``date`` (``date32``) e
+    ``COLUNA_LINHA``, com os tipos do CSV, e vêm na ordem dos arquivos do
+    cache, não na ordem temporal. Só um lote fica em memória por vez.
+    """
+    dataset = _dataset(cache_dir, manifesto)
+    lotes, linhas = [], 0
+    for lote in dataset.to_batches(columns=manifesto['colunas'] + ['date', COLUNA_LINHA]):
+        lotes.append(lote)
+        linhas += lote.num_rows
+        if linhas >= tamanho_lote:
+            yield pa.Table.from_batches(lotes)
+            lotes, linhas = [], 0
+    if lotes:
+        yield pa.Table.from_batches(lotes)
+
+
+def _ordenar(tabela):
+    """Linhas em ordem temporal e, no mesmo ``timestamp``, na ordem do CSV; sem ``COLUNA_LINHA``."""
+    if COLUNA_LINHA not in tabela.column_names:
+        return tabela
+    ordem = pc.sort_indices(tabela, sort_keys=[('timestamp', 'ascending'), (COLUNA_LINHA, 'ascending')])
+    return tabela.take(ordem).drop_columns([COLUNA_LINHA])
+
+
+def table_to_frame(tabela, tipos=None):
+    """Tabela Arrow do cache → DataFrame em ordem temporal e com tipos compactos.
+
+    ``tipos`` como em ``compact_frame``.
+    """
+    # A ordem das partições no disco não é a do CSV; restauramos a ordem temporal
+    tabela = _ordenar(tabela)
+    for coluna in COLUNAS_CATEGORICAS:
+        # Codificar no Arrow evita criar um objeto str por linha no pandas
+        tabela = tabela.set_column(tabela.schema.get_field_index(coluna), coluna,
+                                   pc.dictionary_encode(tabela[coluna]))
+    # Chave de dia vetorizada (datetime64) em vez de objetos datetime.date
+    tabela = tabela.set_column(tabela.schema.get_field_index('date'), 'date',
+                               pc.cast(tabela['date'], pa.timestamp('ns')))
+    return compact_frame(tabela.to_pandas(), tipos)
+
+
+def load_cube(file_path, manifesto=None):
+    """Carrega o cubo de agregação do arquivo inteiro (ver ``manufatura.cubo``).
+
+    ``manifesto`` como em ``load_data``: com ele, o CSV não é verificado de novo.
+    """
+    cache_dir = cache_dir_for(file_path)
+    if manifesto is None:
+        ensure_columnar_cache(file_path, cache_dir)
+    return pd.read_parquet(os.path.join(cache_dir, 'cubo.parquet'))
@@ -0,0 +1,375 @@
+"""API do dashboard sem interface: carga, filtros, indicadores e correlação.
+
+O ``Dashboard.py`` só monta widgets e gráficos a partir destas funções, que
+também são usadas pelo benchmark (``python -m manufatura.benchmark``) e
+podem ser chamadas de qualquer script ou teste, sem uma sessão Streamlit.
+
+Um ``Dataset`` é carregado uma vez por processo e compartilhado por todas as
+sessões do dashboard: é imutável depois de construído e pode ser lido de
+várias threads ao mesmo tempo. Cada sessão guarda só os seus ``Filtros``;
+os resultados (recortes filtrados, indicadores e matrizes de correlação)
+ficam num cache compartilhado e limitado em memória (``manufatura.cache``),
+indexado pelos filtros normalizados. Os arquivos de exportação ficam em
+disco, num diretório temporário do ``Dataset``, e entram no mesmo cache
+(e no mesmo orçamento) pelo tamanho do arquivo.
+
+As consultas em si (recortes, cubo, páginas, blocos e séries) passam pelo
+backend de consultas do ``Dataset`` (``manufatura.backends``): o pandas,
+com tudo em memória, ou o SQLite, que consulta um banco em disco sem
+carregar o histórico.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+
+import pandas as pd
+
+from manufatura import backends, correlacao, cubo, exportacao, ingestao, paralelo, perfil, series
+from manufatura.cache import ResultCache
+
+OPCAO_TODAS_MAQUINAS = 'Todas'
+OPCAO_TODOS_TIPOS = 'Todos'
+
+# Rótulos das médias de sensores no gráfico da Visão Geral
+NOMES_SENSORES = {'temperature': 'Temperatura',
+                  'pressure': 'Pressão',
+                  'vibration': 'Vibração',
+                  'energy_consumption': 'Consumo de Energia'}
+
+
+# Filtros já normalizados: None significa "sem filtro" na dimensão
+Filtros = namedtuple('Filtros', ['data_inicio', 'data_fim', 'maquinas', 'tipos_falha'],
+                     defaults=(None, None, None, None))
+
+KPIs = namedtuple('KPIs', [
+    'total_linhas',
+    'medias_melted',             # machine, Metrica, Valor Médio
+    'manutencao',                # machine, contagem_manutencao
+    'status_maquinas',           # Status, Porcentagem
+    'status_por_falha',          # failure_type, machine_status, contagem
+    'tipos_falha_por_maquina',   # machine, failure_type, quantidade_falhas
+    'maquina_mais_paradas', 'cont_mais_paradas',
+    'maquina_menos_paradas', 'cont_menos_paradas',
+])
+
+Correlacoes = namedtuple('Correlacoes', ['colunas', 'pearson', 'spearman', 'erro_spearman'])
+
+
+def normalize_filters(data_inicio, data_fim, maquinas_selecionadas, tipos_falha_selecionados):
+    """Converte a seleção da barra lateral em ``Filtros``.
+
+    "Todas"/"Todos" ou uma seleção vazia viram ``None``. Um intervalo de
+    datas invertido também vira "sem filtro de datas"; cabe à interface
+    avisar o usuário (ver ``dates_valid``).
+    """
+    if not dates_valid(data_inicio, data_fim):
+        data_inicio = data_fim = None
+    maquinas = None
+    if not (OPCAO_TODAS_MAQUINAS in maquinas_selecionadas or not maquinas_selecionadas):
+        maquinas = tuple(sorted(maquinas_selecionadas))
+    tipos_falha = None
+    if not (OPCAO_TODOS_TIPOS in tipos_falha_selecionados or not tipos_falha_selecionados):
+        tipos_falha = tuple(sorted(tipos_falha_selecionados))
+    return Filtros(data_inicio, data_fim, maquinas, tipos_falha)
+
+
+def dates_valid(data_inicio, data_fim):
+    return data_inicio is None or data_fim is None or data_inicio <= data_fim
+
+
+def window_from_env(manifesto):
+    """Janela dos últimos ``DASHBOARD_JANELA_DIAS`` dias do arquivo (sem a variável, None: tudo)."""
+    dias = os.environ.get('DASHBOARD_JANELA_DIAS')
+    if not dias:
+        return None
+    data_max = date.fromisoformat(manifesto['data_max'])
+    return Filtros(data_max - timedelta(days=int(dias) - 1))
+
+
+class Dataset:
+    """Tudo o que o dashboard consulta sobre um arquivo de dados já carregado.
+
+    Somente leitura: os arrays dos índices e das estatísticas são marcados
+    como não graváveis, e os DataFrames devolvidos (views, indicadores,
+    matrizes) não devem ser alterados por quem os recebe. Com o
+    *copy-on-write* do pandas ativo (como no dashboard), uma alteração
+    acidental copia os dados em vez de escrever no dataset compartilhado.
+
+    ``backend`` é o ``backends.QueryBackend`` que responde às consultas.
+    ``cache`` guarda os resultados por filtros; sem ele, usa um
+    ``ResultCache`` com o orçamento das variáveis de ambiente.
+    """
+
+    def __init__(self, manifesto, backend, cache=None):
+        self.manifesto = manifesto
+        self.backend = backend
+        self.cache = ResultCache.from_env() if cache is None else cache
+        self.series = series.SeriesIndex(backend, self.cache)
+        self._dir_exportacao = tempfile.TemporaryDirectory(prefix='exportacao_manufatura_')
+        self._trava_exportacao = threading.Lock()
+        self._exportacao_avulsa = None  # (chave, caminho) da última exportação maior que o orçamento
+
+    @classmethod
+    def load(cls, file_path, cache=None, backend=None, janela=None):
+        """Carrega ``file_path`` no backend ``backend`` (ver ``backends.get_backend``).
+
+        O CSV é verificado uma única vez: o backend (linhas, cubo e
+        estatísticas de correlação) usa as linhas do manifesto, e o que for
+        anexado durante a carga fica para a próxima atualização (``append``).
+        ``janela`` (``Filtros`` só com datas e máquinas; sem ela, a de
+        ``window_from_env``) limita o que o backend pandas carrega em
+        memória: só as partições dela são lidas do cache colunar, e os
+        filtros, indicadores e opções da barra lateral ficam dentro dela.
+        """
+        classe = backends.get_backend(backend)
+        with perfil.fase('cache_colunar'):
+            manifesto = ingestao.ensure_columnar_cache(file_path)
+        if janela is None:
+            janela = window_from_env(manifesto)
+        return cls(manifesto, classe.load(file_path, manifesto, janela), cache)
+
+    def append(self, atualizacao):
+        """Novo Dataset com as linhas de uma ``ingestao.Atualizacao`` anexadas.
+
+        Nada é relido do disco: o backend só acrescenta as linhas novas, o
+        cubo e as estatísticas de correlação delas (com o mesmo deslocamento).
+        O Dataset atual não muda, então quem ainda o usa continua vendo um
+        snapshot consistente; o novo começa com o cache de resultados vazio,
+        exceto pelas pirâmides das séries, estendidas com as linhas novas.
+        """
+        backend = self.backend.append(atualizacao)
+        dataset = Dataset(atualizacao.manifesto, backend, ResultCache(self.cache.max_bytes, self.cache.ttl))
+        # As linhas novas como o backend as guarda (tipos e janela), para somar nas pirâmides
+        novas = ingestao.table_to_frame(atualizacao.tabela, backend.schema.dtypes)
+        self.series.carry_over(dataset.series, backends.rows_in_window(novas, backend.janela))
+        return dataset
+
+    def __len__(self):
+        return len(self.backend)
+
+    @property
+    def columns(self):
+        """Colunas das linhas devolvidas por ``filter``, ``table_page`` e na exportação."""
+        return self.backend.schema.columns
+
+    @property
+    def maquinas(self):
+        janela = self.backend.janela
+        if janela is None or janela.maquinas is None:
+            return self.manifesto['maquinas']
+        return [m for m in self.manifesto['maquinas'] if m in janela.maquinas]
+
+    @property
+    def tipos_falha(self):
+        return self.manifesto['tipos_falha']
+
+    @property
+    def data_min(self):
+        data_min = date.fromisoformat(self.manifesto['data_min'])
+        janela = self.backend.janela
+        if janela is None or janela.data_inicio is None:
+            return data_min
+        return min(max(data_min, janela.data_inicio), self.data_max)
+
+    @property
+    def data_max(self):
+        data_max = date.fromisoformat(self.manifesto['data_max'])
+        janela = self.backend.janela
+        if janela is None or janela.data_fim is None:
+            return data_max
+        return min(data_max, janela.data_fim)
+
+    def filter(self, filtros):
+        """Linhas que passam nos filtros, em memória (view, no pandas, quando só há filtro de datas)."""
+        chave = ('filtro', filtros)
+        df = self.cache.get(chave)
+        if df is None:
+            df = self.backend.frame(filtros)
+            # Uma view do dataset compartilhado não ocupa memória além dele
+            self.cache.put(chave, df, 0 if self.backend.is_view(df) else None)
+        return df
+
+    def filter_cube(self, filtros):
+        return self.backend.cube(filtros)
+
+    def count(self, filtros):
+        """Número de linhas que passam nos filtros (do cubo, sem ler as linhas)."""
+        return self.kpis(filtros).total_linhas
+
+    def kpis(self, filtros):
+        return self.cache.get_or_compute(('kpis', filtros),
+                                         lambda: compute_kpis(self.filter_cube(filtros)))
+
+    def correlations(self, filtros, spearman_aproximado=None):
+        """Matrizes de correlação (ver ``compute_correlations``); sem modo, o padrão do backend."""
+        if spearman_aproximado is None:
+            spearman_aproximado = self.backend.spearman_aproximado
+        return self.cache.get_or_compute(
+            ('correlacao', filtros, spearman_aproximado),
+            lambda: compute_correlations(self, filtros, spearman_aproximado))
+
+    def trend(self, filtros, maquina, sensor, inicio, fim, largura):
+        """Série de ``sensor`` da ``maquina`` entre ``inicio`` e ``fim``, reduzida a ``largura`` pontos.
+
+        Sem filtro de tipo de falha a consulta usa as pirâmides de
+        pré-agregados (``series.SeriesIndex``); com ele, reduz as linhas
+        filtradas da máquina no período.
+        """
+        def calcular():
+            if filtros.tipos_falha is None:
+                return self.series.query(maquina, sensor, inicio, fim, largura)
+            # O período da série fica dentro das datas dos filtros
+            t0, t1 = pd.Timestamp(inicio), pd.Timestamp(fim)
+            if filtros.data_inicio is not None:
+                t0 = max(t0, pd.Timestamp(filtros.data_inicio))
+            if filtros.data_fim is not None:
+                t1 = min(t1, pd.Timestamp(filtros.data_fim) + pd.Timedelta(days=1) - pd.Timedelta(1))
+            timestamps, valores, _ = self.backend.series_rows(maquina, sensor, t0, t1, filtros.tipos_falha)
+            return series.downsample_rows(timestamps, valores, largura)
+        return self.cache.get_or_compute(('tendencia', filtros, maquina, sensor, inicio, fim, largura), calcular)
+
+    def table_page(self, filtros, numero, tamanho, ordenar_por=None, ascendente=True, busca=None):
+        """Uma página da tabela de dados (ver ``tabela.page``).
+
+        A seleção buscada/ordenada fica no cache, então trocar de página
+        não refaz a busca nem a ordenação.
+        """
+        linhas = self.cache.get_or_compute(
+            ('tabela', filtros, ordenar_por, ascendente, busca),
+            lambda: self.backend.table_rows(filtros, ordenar_por, ascendente, busca))
+        return self.backend.page(linhas, numero, tamanho)
+
+    def export_file(self, filtros, formato='csv', progresso=None):
+        """Caminho de um arquivo com as linhas filtradas (ver ``exportacao.write_blocks``).
+
+        O arquivo é nomeado pelos filtros e pelo formato e guardado no cache
+        de resultados com o tamanho dele: o mesmo pedido, de qualquer sessão,
+        reaproveita o arquivo já gerado (um acerto), e quando a entrada é
+        despejada ou expira o arquivo é apagado. Um arquivo maior que o
+        orçamento inteiro não entra no cache: fica como a exportação avulsa,
+        reaproveitada pelo mesmo pedido, e é apagado na próxima exportação
+        que também não couber.
+        """
+        chave = ('exportacao', filtros, formato)
+        caminho = self.cache.get(chave)
+        if caminho is not None and os.path.exists(caminho):
+            return caminho
+        avulsa = self._exportacao_avulsa
+        if avulsa is not None and avulsa[0] == chave and os.path.exists(avulsa[1]):
+            return avulsa[1]
+        nome = hashlib.sha1(repr((filtros, formato)).encode('utf-8')).hexdigest()[:16]
+        caminho = os.path.join(self._dir_exportacao.name,
+                               f'{nome}.{exportacao.FORMATOS[formato].extensao}')
+        exportacao.write_blocks(self.backend.blocks(filtros, exportacao.TAMANHO_BLOCO),
+                                self.count(filtros), caminho, formato, progresso=progresso)
+        if not self.cache.put(chave, caminho, os.path.getsize(caminho), _remover_arquivo):
+            with self._trava_exportacao:
+                anterior, self._exportacao_avulsa = self._exportacao_avulsa, (chave, caminho)
+            if anterior is not None and anterior[1] != caminho:
+                _remover_arquivo(anterior[1])
+        return caminho
+
+
+def _remover_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:  # Já removido (ex.: junto com o diretório temporário)
+        pass
+
+
+def compute_kpis(cubo_filtrado):
+    """Indicadores da aba "Visão Geral" a partir do cubo já filtrado.
+
+    Todos os DataFrames retornados podem estar vazios (com as colunas
+    esperadas) quando não há linhas na seleção.
+    """
+    medias = cubo.sensor_means(cubo_filtrado).rename(columns=NOMES_SENSORES)
+    medias.dropna(inplace=True) # Remove linhas se alguma métrica estiver faltando para uma máquina
+    if not medias.empty:
+        medias_melted = medias.melt(id_vars=['machine'],
+                                    value_vars=list(NOMES_SENSORES.values()),
+                                    var_name='Metrica',
+                                    value_name='Valor Médio')
+    else:
+        medias_melted = pd.DataFrame(columns=['machine', 'Metrica', 'Valor Médio'])
+
+    contagem_por_status = cubo.status_counts(cubo_filtrado)
+    total = contagem_por_status.sum()
+    percentuais = [
+        (contagem_por_status.get(status, 0) / total) * 100 if total > 0 else 0
+        for status in ("Running", "Failure", "Idle")
+    ]
+    status_maquinas = pd.DataFrame({
+        'Status': ['Rodando', 'Em Falha', 'Paradas'],
+        'Porcentagem': percentuais
+    })
+    status_maquinas = status_maquinas[status_maquinas['Porcentagem'] > 0.001] # Evitar floats muito pequenos
+
+    # Métricas de paradas por máquina
+    maquina_mais_paradas, cont_mais_paradas = "N/A", 0
+    maquina_menos_paradas, cont_menos_paradas = "N/A", 0
+    paradas_por_maquina = cubo.status_counts_by_machine(cubo_filtrado, 'Idle').sort_values(ascending=False)
+    if not paradas_por_maquina.empty:
+        maquina_mais_paradas = paradas_por_maquina.index[0]
+        cont_mais_paradas = paradas_por_maquina.iloc[0]
+        maquina_menos_paradas = paradas_por_maquina.index[-1]
+        cont_menos_paradas = paradas_por_maquina.iloc[-1]
+
+    status_por_falha = cubo.status_by_failure(cubo_filtrado, ['Idle', 'Failure'])
+    # Os rótulos abaixo não são categorias do cubo (que pode ter dimensões categóricas)
+    status_por_falha = status_por_falha.astype({'failure_type': object})
+    status_por_falha.loc[
+        (status_por_falha['machine_status'] == 'Idle') & (status_por_falha['failure_type'] == 'No Failure'),
+        'failure_type'
+    ] = 'Parada Programada/Outra'
+    status_por_falha.loc[
+        (status_por_falha['machine_status'] == 'Failure') & (status_por_falha['failure_type'] == 'No Failure'),
+        'failure_type'
+    ] = 'Falha (Tipo Não Especificado)'
+
+    return KPIs(
+        total_linhas=int(total),
+        medias_melted=medias_melted,
+        manutencao=cubo.maintenance_counts(cubo_filtrado),
+        status_maquinas=status_maquinas,
+        status_por_falha=status_por_falha,
+        tipos_falha_por_maquina=cubo.failures_by_machine(cubo_filtrado),
+        maquina_mais_paradas=maquina_mais_paradas,
+        cont_mais_paradas=cont_mais_paradas,
+        maquina_menos_paradas=maquina_menos_paradas,
+        cont_menos_paradas=cont_menos_paradas,
+    )
+
+
+def compute_correlations(dataset, filtros, spearman_aproximado=False):
+    """Matrizes de Pearson e Spearman das linhas que passam nos filtros.
+
+    Só o Spearman exato lê as linhas (as colunas numéricas, do backend),
+    com os postos de cada coluna em paralelo (``paralelo.spearman``).
+    Com menos de duas colunas numéricas, ou sem linhas, as matrizes voltam
+    vazias.
+    """
+    colunas = correlacao.numeric_columns(dataset.backend.schema)
+    if dataset.count(filtros) == 0 or len(colunas) <= 1:
+        return Correlacoes(colunas, pd.DataFrame(), pd.DataFrame(), None)
+    # Pearson exato a partir das estatísticas por partição, sem reler as linhas
+    with perfil.fase('pearson'):
+        pearson = dataset.backend.pearson(filtros)
+    erro_spearman = None
+    with perfil.fase('spearman'):
+        if spearman_aproximado:
+            spearman, erro_spearman = dataset.backend.spearman_approx(filtros)
+        else:
+            spearman = paralelo.spearman(dataset.backend.frame(filtros, colunas))
+    return Correlacoes(colunas, pearson, spearman, erro_spearman)
+
+
+def export_csv(df):
+    """Conteúdo CSV (UTF-8) das linhas filtradas, inteiro em memória.
+
+    É o mesmo arquivo que ``exportacao.write_blocks`` grava em blocos.
+    """
+    return ingestao.display_frame(df).to_csv(index=False).encode('utf-8')
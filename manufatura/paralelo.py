@@ -0,0 +1,264 @@
+"""Agregações do dataset em vários processos, por faixas de tempo.
+
+O cubo da Visão Geral (médias por máquina, contagens por status, por tipo
+de falha e de manutenção) e as estatísticas de correlação são somas por
+partição, então podem ser montados por partes e combinados depois
+(``cubo.merge_cubes`` e ``CorrelationStats.merge``). Aqui o DataFrame, em
+ordem temporal, é dividido em faixas contíguas de linhas (intervalos de
+tempo), uma por trabalhador, e cada processo agrega a sua faixa. Usam
+``aggregate`` a ingestão (o cubo de cada lote do CSV), a carga do backend
+pandas e a montagem do banco SQLite (as estatísticas de correlação).
+
+O Spearman exato (``spearman``), recalculado a cada pedido sem modo
+aproximado, divide o trabalho por coluna: cada processo calcula os postos
+de uma coluna, e a correlação de Pearson dos postos é feita no fim.
+
+São processos, não threads: o groupby, a fatoração das chaves e a
+ordenação no pandas seguram o GIL na maior parte do tempo. As colunas são
+copiadas uma vez para memória compartilhada
+(``multiprocessing.shared_memory``) e cada processo monta arrays sobre os
+mesmos buffers, sem serializar as linhas; as categóricas (e as colunas de
+texto, como as do CSV recém-lido) vão como códigos, com as categorias na
+descrição. Só os resultados parciais, pequenos, voltam pelo pool.
+
+O número de processos vem de ``DASHBOARD_TRABALHADORES`` (padrão 1, que
+agrega no próprio processo, como antes; 0 usa um por núcleo). O pool é
+criado na primeira agregação paralela e reaproveitado.
+"""
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from manufatura import cubo, perfil
+from manufatura.correlacao import AMOSTRA_POR_GRUPO, CHAVES, CorrelationStats, numeric_columns
+
+TRABALHADORES_PADRAO = 1
+LINHAS_MINIMAS = 50_000  # Por faixa ou coluna; com menos linhas, o custo de despachar não compensa
+
+Agregado = namedtuple('Agregado', ['cubo', 'estatisticas'])
+
+_trava = threading.Lock()
+_pools = {}
+
+
+def workers_from_env():
+    """Número de processos de ``DASHBOARD_TRABALHADORES`` (0 = um por núcleo)."""
+    trabalhadores = int(os.environ.get('DASHBOARD_TRABALHADORES', TRABALHADORES_PADRAO))
+    return trabalhadores if trabalhadores > 0 else os.cpu_count() or 1
+
+
+def _pool(trabalhadores):
+    with _trava:
+        pool = _pools.get(trabalhadores)
+        if pool is None:
+            # 'spawn': um fork do servidor copiaria as threads e travas dele. Cada processo novo
+            # reexecutaria o arquivo do ``__main__``, que no Streamlit é o script do dashboard;
+            # as funções dos processos estão neste módulo, então ele fica escondido enquanto o
+            # pool (que cria todos os processos de uma vez) é montado
+            principal = sys.modules['__main__']
+            sys.modules['__main__'] = types.ModuleType('__main__')
+            try:
+                pool = multiprocessing.get_context('spawn').Pool(trabalhadores)
+            finally:
+                sys.modules['__main__'] = principal
+            _pools[trabalhadores] = pool
+        return pool
+
+
+@atexit.register
+def _encerrar_pools():
+    # Encerrados antes do fim do interpretador: no ``__del__`` do pool, os módulos já foram descarregados
+    with _trava:
+        for pool in _pools.values():
+            pool.terminate()
+        _pools.clear()
+
+
+class SharedFrame:
+    """Colunas de um DataFrame copiadas para blocos de memória compartilhada.
+
+    ``descricao`` é o que os processos recebem para abrir as mesmas colunas
+    sem cópia (ver ``open_shared``). Os blocos são liberados em ``close``
+    ou ao sair do ``with``.
+    """
+
+    def __init__(self, df, colunas):
+        self._blocos = []
+        especificacao = []
+        try:
+            for coluna in colunas:
+                serie = df[coluna]
+                categorias = None
+                if serie.dtype == object:
+                    serie = serie.astype('category')  # Objetos não vão para memória compartilhada
+                if isinstance(serie.dtype, pd.CategoricalDtype):
+                    categorias = serie.cat.categories
+                    valores = serie.cat.codes.to_numpy()
+                else:
+                    valores = serie.to_numpy()
+                bloco = shared_memory.SharedMemory(create=True, size=max(valores.nbytes, 1))
+                self._blocos.append(bloco)
+                np.ndarray(valores.shape, valores.dtype, buffer=bloco.buf)[:] = valores
+                especificacao.append((coluna, bloco.name, valores.dtype.str, categorias))
+        except BaseException:
+            self.close()
+            raise
+        self.descricao = (len(df), especificacao)
+
+    def close(self):
+        for bloco in self._blocos:
+            bloco.close()
+            bloco.unlink()
+        self._blocos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.close()
+
+
+def open_shared(descricao, inicio=0, fim=None):
+    """DataFrame das linhas ``inicio:fim`` de um ``SharedFrame``, sobre os buffers compartilhados.
+
+    Retorna ``(df, blocos)``; os ``blocos`` devem ser fechados (``close``)
+    depois que ``df`` e tudo o que aponta para ele forem descartados.
+    """
+    linhas, especificacao = descricao
+    blocos, dados = [], {}
+    for coluna, nome, tipo, categorias in especificacao:
+        bloco = shared_memory.SharedMemory(name=nome)
+        blocos.append(bloco)
+        valores = np.ndarray(linhas, np.dtype(tipo), buffer=bloco.buf)[inicio:fim]
+        if categorias is not None:
+            valores = pd.Categorical.from_codes(valores, dtype=pd.CategoricalDtype(categorias))
+        dados[coluna] = valores
+    return pd.DataFrame(dados, copy=False), blocos
+
+
+def _agregar_faixa(descricao, inicio, fim, com_cubo, colunas, deslocamento, amostra_por_grupo, seed):
+    """Cubo e estatísticas de uma faixa de linhas (roda nos processos do pool)."""
+    df, blocos = open_shared(descricao, inicio, fim)
+    try:
+        parcial = cubo.build_cube(df) if com_cubo else None
+        estatisticas = None
+        if colunas is not None:
+            estatisticas = CorrelationStats.from_frame(df, colunas, deslocamento, amostra_por_grupo, seed)
+    finally:
+        # Os resultados são arrays novos; só ``df`` aponta para os buffers
+        del df
+        for bloco in blocos:
+            bloco.close()
+    return parcial, estatisticas
+
+
+def aggregate(df, trabalhadores=None, com_cubo=True, com_estatisticas=True, colunas=None,
+              deslocamento=None, amostra_por_grupo=AMOSTRA_POR_GRUPO, seed=0):
+    """Cubo (``com_cubo``) e estatísticas de correlação (``com_estatisticas``) de ``df``, em paralelo.
+
+    ``df`` tem as colunas de ``cubo.build_cube`` e de
+    ``CorrelationStats.from_frame``; em ordem temporal, cada faixa é um
+    intervalo de tempo (as somas não dependem da ordem). Com um trabalhador, ou poucas
+    linhas, é o mesmo que ``cubo.build_cube`` e
+    ``CorrelationStats.from_frame`` no próprio processo. Em paralelo, as
+    somas são as mesmas (a menos do arredondamento), as dimensões do cubo
+    têm os tipos de ``df`` e a amostra do Spearman aproximado é outra, com
+    as mesmas garantias.
+    """
+    trabalhadores = workers_from_env() if trabalhadores is None else trabalhadores
+    partes = min(trabalhadores, len(df) // LINHAS_MINIMAS)
+    if partes <= 1:
+        return Agregado(
+            cubo.build_cube(df) if com_cubo else None,
+            CorrelationStats.from_frame(df, colunas, deslocamento, amostra_por_grupo, seed)
+            if com_estatisticas else None)
+
+    necessarias = cubo.DIMENSOES + cubo.SENSORES if com_cubo else []
+    if com_estatisticas:
+        colunas = numeric_columns(df) if colunas is None else list(colunas)
+        if deslocamento is None:
+            # O mesmo deslocamento em todas as faixas, para que as somas possam ser combinadas
+            deslocamento = df[colunas].mean().to_numpy(dtype='float64')
+        necessarias = ['timestamp'] + CHAVES + colunas + necessarias
+    else:
+        colunas = None
+    necessarias = [c for c in dict.fromkeys(necessarias) if c in df]
+    limites = np.linspace(0, len(df), partes + 1).astype(np.intp)
+
+    with perfil.fase('memoria_compartilhada'):
+        compartilhado = SharedFrame(df, necessarias)
+    with compartilhado, perfil.fase('agregacao_paralela'):
+        pool = _pool(trabalhadores)
+        pedidos = [pool.apply_async(_agregar_faixa, (compartilhado.descricao, int(inicio), int(fim), com_cubo,
+                                                     colunas, deslocamento, amostra_por_grupo, [seed, i]))
+                   for i, (inicio, fim) in enumerate(zip(limites[:-1], limites[1:]))]
+        parciais = [pedido.get() for pedido in pedidos]
+
+    with perfil.fase('combinacao'):
+        cubos, estatisticas = zip(*parciais)
+        cubo_total = None
+        if com_cubo:
+            # As dimensões de texto voltam categóricas dos processos; o cubo fica com os tipos de df
+            cubo_total = cubo.merge_cubes(cubos).astype(
+                {d: object for d in cubo.DIMENSOES if df[d].dtype == object})
+        return Agregado(cubo_total, estatisticas[0].merge(estatisticas[1:]) if com_estatisticas else None)
+
+
+def _postos_coluna(descricao, coluna, nome_saida):
+    """Postos (médios, nos empates) de uma coluna, gravados no bloco ``nome_saida``."""
+    df, blocos = open_shared(descricao)
+    saida = shared_memory.SharedMemory(name=nome_saida)
+    try:
+        postos = np.ndarray(len(df), np.float64, buffer=saida.buf)
+        postos[:] = df[coluna].rank(method='average').to_numpy(dtype=np.float64)
+        del postos
+    finally:
+        del df
+        for bloco in blocos + [saida]:
+            bloco.close()
+
+
+def spearman(df, trabalhadores=None):
+    """Matriz de Spearman exata das colunas de ``df``, com os postos de cada coluna em paralelo.
+
+    Com um trabalhador, poucas linhas ou valores ausentes (o pandas trata
+    ausentes par a par), é ``df.corr(method='spearman')``.
+    """
+    trabalhadores = workers_from_env() if trabalhadores is None else trabalhadores
+    colunas = list(df.columns)
+    if min(trabalhadores, len(colunas)) <= 1 or len(df) < LINHAS_MINIMAS or df.isna().any().any():
+        return df.corr(method='spearman')
+
+    with perfil.fase('memoria_compartilhada'):
+        compartilhado = SharedFrame(df, colunas)
+    saidas = []
+    try:
+        for _ in colunas:
+            saidas.append(shared_memory.SharedMemory(create=True, size=max(len(df) * 8, 1)))
+        with perfil.fase('postos_paralelos'):
+            pool = _pool(trabalhadores)
+            pedidos = [pool.apply_async(_postos_coluna, (compartilhado.descricao, coluna, saida.name))
+                       for coluna, saida in zip(colunas, saidas)]
+            for pedido in pedidos:
+                pedido.get()
+        with perfil.fase('combinacao'), np.errstate(invalid='ignore', divide='ignore'):
+            postos = np.stack([np.ndarray(len(df), np.float64, buffer=saida.buf) for saida in saidas])
+            # Como no pandas: coluna constante dá NaN, inclusive na diagonal
+            matriz = np.clip(np.corrcoef(postos), -1, 1)
+            constantes = postos.min(axis=1) == postos.max(axis=1)
+            np.fill_diagonal(matriz, np.where(constantes, np.nan, 1.0))
+            del postos
+    finally:
+        compartilhado.close()
+        for saida in saidas:
+            saida.close()
+            saida.unlink()
+    return pd.DataFrame(matriz, index=colunas, columns=colunas)
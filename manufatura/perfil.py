@@ -0,0 +1,248 @@
+"""Medição por fase de cada execução do dashboard: tempo e memória alocada.
+
+Um ``Perfil`` cobre uma execução do script (``start``/``stop``) e registra,
+para cada fase aberta com ``fase(nome)``, o tempo de parede, o tempo próprio
+(sem as fases internas) e, com ``memoria=True``, a memória alocada que ficou
+retida e o pico de alocação dentro da fase (``tracemalloc``). Fases internas
+ganham o nome da externa como prefixo (``dados/leitura_csv``) e fases
+repetidas na mesma execução são somadas.
+
+O código de ``manufatura`` marca suas fases com a função ``fase`` deste
+módulo, que registra no perfil ativo na thread corrente e não faz nada
+quando não há perfil ativo (uso fora do dashboard, thread de atualização).
+
+O ``tracemalloc`` deixa o Python várias vezes mais lento e é global ao
+processo: fica ligado enquanto houver algum perfil medindo memória, e com
+duas sessões medindo ao mesmo tempo os picos de uma incluem alocações da
+outra. Com ``rastrear=True``, a execução inteira também roda sob
+``cProfile``, para uma análise função a função.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+# ``alocado`` e ``pico`` em bytes (None sem medição de memória)
+Medida = namedtuple('Medida', ['fase', 'chamadas', 'segundos', 'segundos_proprios', 'alocado', 'pico'])
+
+_FIM = object()
+
+_perfil_ativo = contextvars.ContextVar('perfil_ativo', default=None)
+
+_trava = threading.Lock()
+_usuarios_tracemalloc = 0
+_tracemalloc_nosso = False  # Se fomos nós que ligamos o tracemalloc (não desligamos o dos outros)
+
+
+def _ligar_tracemalloc():
+    global _usuarios_tracemalloc, _tracemalloc_nosso
+    with _trava:
+        if _usuarios_tracemalloc == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_nosso = True
+        _usuarios_tracemalloc += 1
+
+
+def _desligar_tracemalloc():
+    global _usuarios_tracemalloc, _tracemalloc_nosso
+    with _trava:
+        _usuarios_tracemalloc -= 1
+        if _usuarios_tracemalloc == 0 and _tracemalloc_nosso:
+            tracemalloc.stop()
+            _tracemalloc_nosso = False
+
+
+class _Quadro:
+    """Fase aberta: onde começou e o que as fases internas já consumiram."""
+    __slots__ = ('caminho', 'inicio', 'base', 'pico', 'filhos')
+
+    def __init__(self, caminho, inicio, base):
+        self.caminho = caminho
+        self.inicio = inicio
+        self.base = base  # Memória em uso ao abrir a fase
+        self.pico = 0  # Maior pico das fases internas (o tracemalloc só guarda um pico por vez)
+        self.filhos = 0.0
+
+
+class Perfil:
+    """Tempos e memória das fases de uma execução."""
+
+    def __init__(self, memoria=False, rastrear=False, relogio=time.perf_counter):
+        self.memoria = memoria
+        self.rastrear = rastrear
+        self.inicio = None  # Data e hora do início da execução
+        self.total = None  # Medida da execução inteira, preenchida em ``stop``
+        self._relogio = relogio
+        self._pilha = []
+        self._medidas = {}  # caminho -> [chamadas, segundos, próprios, alocado, pico], na ordem de abertura
+        self._rastreador = None
+        self._ativo = False
+
+    def start(self):
+        self.inicio = datetime.now()
+        if self.memoria:
+            _ligar_tracemalloc()
+        if self.rastrear:
+            self._rastreador = cProfile.Profile()
+            try:
+                self._rastreador.enable()
+            except ValueError:  # Outro profiler já ativo (em Python 3.12+, um por processo)
+                self._rastreador = None
+        self._ativo = True
+        _perfil_ativo.set(self)
+        self._pilha.append(self._abrir(None))
+        return self
+
+    def stop(self):
+        """Encerra a medição (idempotente) e preenche ``total``."""
+        if not self._ativo:
+            return
+        while len(self._pilha) > 1:  # Fases deixadas abertas por uma exceção
+            self._fechar(self._pilha.pop())
+        raiz = self._pilha.pop()
+        self.total = Medida('total', 1, *self._fechar(raiz))
+        if self._rastreador is not None:
+            self._rastreador.disable()
+        if self.memoria:
+            _desligar_tracemalloc()
+        if _perfil_ativo.get() is self:
+            _perfil_ativo.set(None)
+        self._ativo = False
+
+    def _abrir(self, caminho):
+        base = None
+        if self.memoria:
+            atual, pico = tracemalloc.get_traced_memory()
+            if self._pilha:
+                self._pilha[-1].pico = max(self._pilha[-1].pico, pico)
+            tracemalloc.reset_peak()
+            base = atual
+        return _Quadro(caminho, self._relogio(), base)
+
+    def _fechar(self, quadro):
+        """Retorna ``(segundos, segundos_proprios, alocado, pico)`` da fase e repassa à fase externa."""
+        segundos = self._relogio() - quadro.inicio
+        alocado = pico = None
+        if self.memoria:
+            atual, pico_atual = tracemalloc.get_traced_memory()
+            pico_absoluto = max(quadro.pico, pico_atual)
+            alocado, pico = atual - quadro.base, pico_absoluto - quadro.base
+        if self._pilha:
+            externo = self._pilha[-1]
+            externo.filhos += segundos
+            if self.memoria:
+                externo.pico = max(externo.pico, pico_absoluto)
+        return segundos, segundos - quadro.filhos, alocado, pico
+
+    @contextmanager
+    def fase(self, nome):
+        if not self._ativo:
+            yield
+            return
+        externo = self._pilha[-1].caminho
+        caminho = nome if externo is None else f'{externo}/{nome}'
+        self._medidas.setdefault(caminho, [0, 0.0, 0.0, None, None])
+        quadro = self._abrir(caminho)
+        self._pilha.append(quadro)
+        try:
+            yield
+        finally:
+            if self._pilha and self._pilha[-1] is quadro:
+                self._pilha.pop()
+                segundos, proprios, alocado, pico = self._fechar(quadro)
+                medida = self._medidas[caminho]
+                medida[0] += 1
+                medida[1] += segundos
+                medida[2] += proprios
+                if alocado is not None:
+                    medida[3] = (medida[3] or 0) + alocado
+                    medida[4] = max(medida[4] or 0, pico)
+
+    def measures(self):
+        """Medidas das fases, na ordem em que foram abertas pela primeira vez."""
+        return [Medida(caminho, *valores) for caminho, valores in self._medidas.items() if valores[0]]
+
+    def to_dict(self, **extra):
+        """Registro da execução para logs em JSON (``extra`` entra no nível de cima)."""
+        registro = {'inicio': self.inicio.isoformat(timespec='milliseconds') if self.inicio else None,
+                    **extra}
+        if self.total is not None:
+            registro['total'] = self.total._asdict()
+        registro['fases'] = [medida._asdict() for medida in self.measures()]
+        return registro
+
+    def append_log(self, caminho, **extra):
+        """Acrescenta a execução, como uma linha JSON, ao arquivo ``caminho``."""
+        linha = json.dumps(self.to_dict(**extra), ensure_ascii=False)
+        with _trava, open(caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha + '\n')
+
+    def to_metrics(self, prefixo='dashboard_fase'):
+        """Medidas no formato texto do Prometheus (uma série por fase)."""
+        medidas = self.measures() + ([self.total] if self.total is not None else [])
+        series = [('chamadas', 'Vezes que a fase rodou na execução', 'chamadas'),
+                  ('segundos', 'Tempo de parede da fase, em segundos', 'segundos'),
+                  ('segundos_proprios', 'Tempo da fase sem as fases internas, em segundos',
+                   'segundos_proprios'),
+                  ('alocado_bytes', 'Memória alocada e retida pela fase, em bytes', 'alocado'),
+                  ('pico_bytes', 'Pico de memória alocada durante a fase, em bytes', 'pico')]
+        linhas = []
+        for nome, ajuda, campo in series:
+            valores = [(m.fase, getattr(m, campo)) for m in medidas if getattr(m, campo) is not None]
+            if not valores:
+                continue
+            linhas.append(f'# HELP {prefixo}_{nome} {ajuda}')
+            linhas.append(f'# TYPE {prefixo}_{nome} gauge')
+            linhas.extend(f'{prefixo}_{nome}{{fase="{fase}"}} {valor}' for fase, valor in valores)
+        return '\n'.join(linhas) + '\n'
+
+    @property
+    def rastreado(self):
+        """Se a execução rodou sob ``cProfile`` (pode falhar com outro profiler ativo)."""
+        return self._rastreador is not None
+
+    def profile_data(self):
+        """Estatísticas do ``cProfile`` no formato de ``pstats.dump_stats`` (arquivo ``.prof``)."""
+        self._rastreador.create_stats()
+        return marshal.dumps(self._rastreador.stats)
+
+    def profile_report(self, linhas=30, ordem='cumulative'):
+        """As ``linhas`` funções com maior tempo (``ordem`` do ``pstats``), em texto."""
+        saida = io.StringIO()
+        pstats.Stats(self._rastreador, stream=saida).strip_dirs().sort_stats(ordem).print_stats(linhas)
+        return saida.getvalue()
+
+
+@contextmanager
+def fase(nome):
+    """Marca uma fase no perfil ativo nesta thread (sem efeito se não houver)."""
+    perfil = _perfil_ativo.get()
+    if perfil is None:
+        yield
+    else:
+        with perfil.fase(nome):
+            yield
+
+
+def iterate(nome, iteravel):
+    """Itera ``iteravel`` contando o tempo de produzir cada item como a fase ``nome``.
+
+    Útil para leitores em lotes (``pd.read_csv(chunksize=...)``), em que o
+    trabalho acontece a cada ``next``.
+    """
+    iterador = iter(iteravel)
+    while True:
+        with fase(nome):
+            item = next(iterador, _FIM)
+        if item is _FIM:
+            return
+        yield item
+
@@ -0,0 +1,198 @@
+"""Séries temporais dos sensores por máquina, reduzidas no servidor.
+
+Enviar milhões de pontos a um gráfico de linha trava o navegador; aqui cada
+série é reduzida a no máximo ``largura`` pontos (a largura do gráfico em
+pixels) antes de sair do servidor, preservando a forma da curva:
+
+- com poucas linhas no período (até ``FATOR_BRUTO * largura``), as linhas
+  brutas são reduzidas por LTTB (*Largest-Triangle-Three-Buckets*,
+  Steinarsson, 2013), que mantém picos e vales visíveis;
+- acima disso, usa-se uma pirâmide de pré-agregados por máquina (mínimo,
+  máximo, soma e contagem por intervalo de ``NIVEIS``), cada nível montado a
+  partir do anterior. A consulta escolhe o nível mais fino que cabe no
+  orçamento e junta intervalos vizinhos até ``largura`` pontos, devolvendo
+  média, mínimo e máximo de cada um. O custo depende do número de
+  intervalos no período, não do número de linhas.
+
+As linhas e o nível de partida da pirâmide vêm do backend de consultas
+(``manufatura.backends``): as linhas brutas da máquina, em memória, ou
+intervalos de 1 minuto já agregados pelo banco em disco. A pirâmide de uma
+máquina é montada na primeira consulta a ela e guardada no cache de
+resultados do ``Dataset``, compartilhada por todas as sessões; a cada
+atualização ao vivo ela passa para o snapshot seguinte só com os últimos
+intervalos refeitos (``extend_pyramid``).
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+SENSORES = ['temperature', 'pressure', 'vibration', 'energy_consumption']
+# Larguras dos intervalos de cada nível da pirâmide, do mais fino ao mais grosso
+NIVEIS = ['1min', '10min', '1h', '6h', '1D', '7D']
+FATOR_BRUTO = 4  # Até FATOR_BRUTO * largura linhas, reduz as linhas brutas por LTTB
+
+# Intervalos agregados de um nível: início (ns), e mínimo/máximo/soma por sensor
+Nivel = namedtuple('Nivel', ['nome', 'inicio', 'minimo', 'maximo', 'soma', 'contagem'])
+
+# Série reduzida: DataFrame (timestamp, media, minimo, maximo), linhas brutas cobertas e origem
+Serie = namedtuple('Serie', ['pontos', 'linhas', 'resolucao'])
+
+
+def lttb(x, y, n_saida):
+    """Índices dos ``n_saida`` pontos escolhidos por LTTB (sempre inclui o primeiro e o último)."""
+    n = len(x)
+    if n_saida >= n or n_saida < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_saida - 2 baldes entre o primeiro e o último ponto; o último balde "seguinte" é o ponto final
+    limites = np.r_[np.linspace(1, n - 1, n_saida - 1).astype(np.intp), n]
+    indices = np.empty(n_saida, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for i in range(n_saida - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        x_medio = x[fim:limites[i + 2]].mean()
+        y_medio = y[fim:limites[i + 2]].mean()
+        # Área do triângulo (ponto anterior, candidato, média do balde seguinte), sem o fator 1/2
+        area = np.abs((x[anterior] - x_medio) * (y[inicio:fim] - y[anterior])
+                      - (x[anterior] - x[inicio:fim]) * (y_medio - y[anterior]))
+        anterior = inicio + int(np.argmax(area))
+        indices[i + 1] = anterior
+    return indices
+
+
+def _agrupar_intervalos(minimo, maximo, soma, contagem, ids):
+    """Junta intervalos consecutivos com o mesmo ``ids``; retorna também as fronteiras."""
+    fronteiras = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    return (fronteiras,
+            np.minimum.reduceat(minimo, fronteiras),
+            np.maximum.reduceat(maximo, fronteiras),
+            np.add.reduceat(soma, fronteiras),
+            np.add.reduceat(contagem, fronteiras))
+
+
+def rows_level(timestamps, valores):
+    """As próprias linhas (``timestamps`` ordenados, ``valores`` linhas x sensores) como um ``Nivel``."""
+    return Nivel('linhas', timestamps.view(np.int64), valores, valores, valores,
+                 np.ones(len(timestamps), dtype=np.int64))
+
+
+def build_pyramid(base):
+    """Níveis de ``NIVEIS`` montados a partir de ``base``, um ``Nivel`` mais fino que todos eles."""
+    niveis = []
+    inicio, minimo, maximo, soma, contagem = base[1:]
+    for nome in NIVEIS:
+        largura = pd.Timedelta(nome).value
+        if len(inicio):
+            ids = inicio // largura
+            fronteiras, minimo, maximo, soma, contagem = _agrupar_intervalos(minimo, maximo, soma, contagem, ids)
+            inicio = ids[fronteiras] * largura
+        niveis.append(Nivel(nome, inicio, minimo, maximo, soma, contagem))
+    return niveis
+
+
+def extend_pyramid(niveis, base):
+    """``niveis`` (de ``build_pyramid``) com os intervalos de ``base``, mais recentes, somados no fim.
+
+    ``base`` é agregado à parte e só o último intervalo de cada nível é
+    refeito (quando o primeiro de ``base`` cai nele); os demais são
+    copiados. Se ``base`` começa antes do último intervalo do nível mais
+    fino, não há como somar sem as linhas antigas: retorna None.
+    """
+    if not len(base.inicio):
+        return niveis
+    if len(niveis[0].inicio) and base.inicio[0] < niveis[0].inicio[-1]:
+        return None
+    estendidos = []
+    for nivel, novo in zip(niveis, build_pyramid(base)):
+        if len(nivel.inicio) and novo.inicio[0] == nivel.inicio[-1]:
+            ultimo = Nivel(nivel.nome, nivel.inicio[-1:], np.minimum(nivel.minimo[-1:], novo.minimo[:1]),
+                           np.maximum(nivel.maximo[-1:], novo.maximo[:1]), nivel.soma[-1:] + novo.soma[:1],
+                           nivel.contagem[-1:] + novo.contagem[:1])
+            novo = Nivel(nivel.nome, *(np.concatenate([a, b[1:]]) for a, b in zip(ultimo[1:], novo[1:])))
+            nivel = Nivel(nivel.nome, *(a[:-1] for a in nivel[1:]))
+        estendidos.append(Nivel(nivel.nome, *(np.concatenate([a, b]) for a, b in zip(nivel[1:], novo[1:]))))
+    return estendidos
+
+
+def _reduzir_intervalos(nivel, fatia, largura, coluna):
+    """Até ``largura`` pontos (média/mín./máx.) a partir dos intervalos ``fatia`` de um nível."""
+    n = fatia.stop - fatia.start
+    grupos = np.arange(n) * largura // max(n, 1)  # Grupos de intervalos vizinhos de tamanho ~igual
+    inicio = nivel.inicio[fatia]
+    fronteiras, minimo, maximo, soma, contagem = _agrupar_intervalos(
+        nivel.minimo[fatia, coluna], nivel.maximo[fatia, coluna],
+        nivel.soma[fatia, coluna], nivel.contagem[fatia], grupos)
+    return pd.DataFrame({'timestamp': pd.to_datetime(inicio[fronteiras]), 'media': soma / contagem,
+                         'minimo': minimo, 'maximo': maximo})
+
+
+def downsample_rows(timestamps, valores, largura):
+    """Série reduzida direto das linhas (sem pirâmide): LTTB ou mínimo/máximo por grupo de linhas."""
+    n = len(timestamps)
+    if n <= FATOR_BRUTO * largura:
+        escolhidos = lttb(timestamps.view(np.int64), valores, largura)
+        v = valores[escolhidos]
+        pontos = pd.DataFrame({'timestamp': timestamps[escolhidos], 'media': v, 'minimo': v, 'maximo': v})
+        return Serie(pontos, n, 'LTTB sobre as linhas' if n > largura else 'linhas brutas')
+    nivel = rows_level(timestamps, valores.astype(np.float64)[:, None])
+    return Serie(_reduzir_intervalos(nivel, slice(0, n), largura, 0), n, 'mínimo/máximo das linhas')
+
+
+class SeriesIndex:
+    """Pirâmides de pré-agregados por máquina sobre as linhas de um backend de consultas."""
+
+    def __init__(self, backend, cache, sensores=SENSORES):
+        self.backend = backend
+        self.cache = cache
+        self.sensores = [s for s in sensores if s in backend.schema]
+        self._montadas = set()  # Máquinas com pirâmide guardada em ``cache``
+
+    def pyramid(self, maquina):
+        """Níveis de pré-agregados da ``maquina`` (ver ``build_pyramid``)."""
+        self._montadas.add(maquina)
+        return self.cache.get_or_compute(
+            ('piramide', maquina),
+            lambda: build_pyramid(self.backend.series_base(maquina, self.sensores)))
+
+    def carry_over(self, indice, novas):
+        """Passa as pirâmides já montadas para ``indice``, o do snapshot com as linhas ``novas``.
+
+        ``novas`` são as linhas que o backend de ``indice`` tem a mais que o
+        deste (com ``timestamp``, ``machine`` e os sensores). Cada pirâmide
+        é estendida com as da sua máquina (``extend_pyramid``) em vez de
+        remontada do histórico; a de uma máquina que recebeu linhas
+        anteriores ao último intervalo fica para a próxima consulta.
+        """
+        por_maquina = {maquina: linhas for maquina, linhas in novas.groupby('machine', observed=True)}
+        for maquina in list(self._montadas):
+            niveis = self.cache.get(('piramide', maquina))
+            if niveis is None:  # Despejada
+                continue
+            linhas = por_maquina.get(maquina)
+            if linhas is not None:
+                valores = linhas[self.sensores].to_numpy(dtype=np.float64)
+                niveis = extend_pyramid(niveis, rows_level(linhas['timestamp'].to_numpy(), valores))
+            if niveis is not None:
+                indice._montadas.add(maquina)
+                indice.cache.put(('piramide', maquina), niveis)
+
+    def query(self, maquina, sensor, inicio, fim, largura):
+        """Série de ``sensor`` da ``maquina`` entre ``inicio`` e ``fim`` (inclusive), com até ``largura`` pontos."""
+        timestamps, valores, linhas = self.backend.series_rows(maquina, sensor, inicio, fim,
+                                                               limite=FATOR_BRUTO * largura)
+        if timestamps is not None:
+            return downsample_rows(timestamps, valores, largura)
+        niveis = self.pyramid(maquina)
+        coluna = self.sensores.index(sensor)
+        t0, t1 = pd.Timestamp(inicio).value, pd.Timestamp(fim).value
+        for nivel in niveis:
+            largura_nivel = pd.Timedelta(nivel.nome).value
+            # Intervalos que começam no período (incluindo o que contém ``inicio``)
+            a = np.searchsorted(nivel.inicio, t0 // largura_nivel * largura_nivel, side='left')
+            b = np.searchsorted(nivel.inicio, t1, side='right')
+            if b - a <= FATOR_BRUTO * largura or nivel is niveis[-1]:
+                return Serie(_reduzir_intervalos(nivel, slice(a, b), largura, coluna), linhas,
+                             f'intervalos de {nivel.nome}')
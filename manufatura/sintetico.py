@@ -0,0 +1,104 @@
+"""Gerador de dados sintéticos no formato do CSV de sensores.
+
+    python -m manufatura.sintetico 1000000 dados_sinteticos.csv
+
+As colunas são as do arquivo real (timestamp, machine, temperature,
+pressure, vibration, energy_consumption, machine_status, failure_type,
+maintenance_required, mais a coluna de índice que vira ``Unnamed: 0``). Os
+sensores são correlacionados entre si e com o status da máquina, e uma
+pequena fração de valores é nula, para exercitar o ``dropna`` da ingestão.
+O arquivo é escrito em lotes, então 10^8 linhas cabem em memória limitada.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+STATUS = ['Running', 'Idle', 'Failure']
+PROB_STATUS = [0.80, 0.12, 0.08]
+TIPOS_FALHA = ['Overheating', 'Vibration Issue', 'Pressure Drop', 'Electrical Fault']
+INICIO_PADRAO = '2025-01-01'
+TAMANHO_LOTE = 1_000_000
+
+
+def generate_chunk(rng, n_linhas, inicio, fim, n_maquinas=50, indice_inicial=0, taxa_nulos=0.005):
+    """Gera ``n_linhas`` linhas com timestamps ordenados em ``[inicio, fim)``."""
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    segundos = np.sort(rng.integers(0, int((fim - inicio).total_seconds()), n_linhas))
+    timestamps = inicio + pd.to_timedelta(segundos, unit='s')
+
+    nomes_maquinas = np.array([f'Machine_{i}' for i in range(1, n_maquinas + 1)])
+    maquinas = rng.integers(0, n_maquinas, n_linhas)
+    status = rng.choice(len(STATUS), n_linhas, p=PROB_STATUS)
+    em_falha = status == 2
+
+    # Falhas esquentam e fazem vibrar; consumo acompanha a temperatura
+    temperatura = rng.normal(75, 5, n_linhas) + 8 * em_falha
+    pressao = rng.normal(3, 0.3, n_linhas)
+    vibracao = 0.5 - 0.2 * (pressao - 3) + rng.normal(0, 0.1, n_linhas) + 0.3 * em_falha
+    energia = 200 + 3 * (temperatura - 75) + rng.normal(0, 10, n_linhas)
+
+    tipo = rng.integers(0, len(TIPOS_FALHA), n_linhas)
+    tipo_falha = np.where(status == 0, 'No Failure',
+                          np.where(rng.random(n_linhas) < 0.3, 'No Failure',
+                                   np.array(TIPOS_FALHA)[tipo]))
+    manutencao = np.where(rng.random(n_linhas) < np.where(em_falha, 0.6, 0.05), 'Yes', 'No')
+
+    lote = pd.DataFrame({
+        'timestamp': timestamps,
+        'machine': nomes_maquinas[maquinas],
+        'temperature': np.round(temperatura, 2),
+        'pressure': np.round(pressao, 2),
+        'vibration': np.round(vibracao, 3),
+        'energy_consumption': np.round(energia, 2),
+        'machine_status': np.array(STATUS)[status],
+        'failure_type': tipo_falha,
+        'maintenance_required': manutencao,
+    }, index=pd.RangeIndex(indice_inicial, indice_inicial + n_linhas))
+
+    if taxa_nulos > 0:
+        nulos = rng.random(n_linhas) < taxa_nulos
+        colunas = rng.choice(['temperature', 'pressure', 'vibration', 'energy_consumption'], nulos.sum())
+        for coluna in np.unique(colunas):
+            lote.loc[lote.index[nulos][colunas == coluna], coluna] = np.nan
+    return lote
+
+
+def _lotes(n_linhas, n_maquinas, dias, seed, taxa_nulos, tamanho_lote):
+    rng = np.random.default_rng(seed)
+    inicio = pd.Timestamp(INICIO_PADRAO)
+    duracao = pd.Timedelta(days=dias)
+    for indice in range(0, n_linhas, tamanho_lote):
+        n = min(tamanho_lote, n_linhas - indice)
+        # Cada lote cobre uma fatia proporcional do período, mantendo a ordem temporal
+        ini = inicio + duracao * (indice / n_linhas)
+        fim = inicio + duracao * ((indice + n) / n_linhas)
+        yield generate_chunk(rng, n, ini, fim, n_maquinas, indice, taxa_nulos)
+
+
+def generate(n_linhas, n_maquinas=50, dias=365, seed=0, taxa_nulos=0.005):
+    """DataFrame sintético inteiro em memória (para tamanhos pequenos)."""
+    return pd.concat(list(_lotes(n_linhas, n_maquinas, dias, seed, taxa_nulos, TAMANHO_LOTE)))
+
+
+def write_csv(file_path, n_linhas, n_maquinas=50, dias=365, seed=0, taxa_nulos=0.005,
+              tamanho_lote=TAMANHO_LOTE):
+    """Escreve o CSV sintético em lotes de ``tamanho_lote`` linhas."""
+    for i, lote in enumerate(_lotes(n_linhas, n_maquinas, dias, seed, taxa_nulos, tamanho_lote)):
+        lote.to_csv(file_path, mode='w' if i == 0 else 'a', header=(i == 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um CSV sintético de sensores de manufatura.")
+    parser.add_argument('linhas', type=float, help="número de linhas (aceita notação como 1e6)")
+    parser.add_argument('saida', help="caminho do CSV gerado")
+    parser.add_argument('--maquinas', type=int, default=50)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--taxa-nulos', type=float, default=0.005)
+    args = parser.parse_args(argv)
+    write_csv(args.saida, int(args.linhas), args.maquinas, args.dias, args.seed, args.taxa_nulos)
+
+
+if __name__ == '__main__':
+    main()
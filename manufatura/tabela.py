@@ -0,0 +1,116 @@
+"""Paginação, ordenação e busca da "Tabela de Dados" no servidor.
+
+Em vez de enviar o recorte filtrado inteiro ao navegador, o dashboard
+mostra uma página por vez: a busca e a ordenação produzem só um array de
+posições (8 bytes por linha), e apenas as linhas da página visível são
+materializadas. O total de linhas vem do tamanho desse array.
+
+A busca usa a estrutura das colunas em vez de comparar texto linha a linha:
+
+- categóricas: o termo é procurado nas categorias (sem diferenciar
+  maiúsculas), e as linhas são selecionadas pelos códigos;
+- datas e horários: o termo é um prefixo de data/hora (``2025-01``,
+  ``2025-01-03 10``...), convertido num intervalo; como o recorte está em
+  ordem temporal, o intervalo sai por busca binária;
+- números: igualdade com o valor digitado (aceita vírgula decimal).
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Pagina = namedtuple('Pagina', ['linhas', 'total', 'numero', 'paginas'])
+
+
+def parse_interval(termo):
+    """Intervalo ``[inicio, fim)`` coberto por um prefixo de data/hora."""
+    try:
+        periodo = pd.Period(termo)
+    except (ValueError, TypeError):
+        raise ValueError(f"Data/hora inválida: {termo!r} (use, por exemplo, 2025-01-03 ou 2025-01-03 10:30)")
+    return periodo.start_time, (periodo + 1).start_time
+
+
+def parse_number(termo):
+    """Número digitado na busca (aceita vírgula decimal)."""
+    try:
+        return float(termo.replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"Número inválido: {termo!r}")
+
+
+def search(df, coluna, termo):
+    """Posições, em ordem, das linhas de ``df`` cujo valor em ``coluna`` casa com ``termo``.
+
+    Levanta ``ValueError`` se o termo não puder ser interpretado para o
+    tipo da coluna.
+    """
+    serie = df[coluna]
+    termo = termo.strip()
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories.astype(str)
+        casam = np.flatnonzero(categorias.str.contains(termo, case=False, regex=False))
+        return np.flatnonzero(np.isin(serie.cat.codes.to_numpy(), casam))
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        inicio, fim = parse_interval(termo)
+        valores = serie.to_numpy()
+        if serie.is_monotonic_increasing:
+            return np.arange(*np.searchsorted(valores, [np.datetime64(inicio), np.datetime64(fim)]))
+        return np.flatnonzero((valores >= np.datetime64(inicio)) & (valores < np.datetime64(fim)))
+    if pd.api.types.is_numeric_dtype(serie):
+        valor = parse_number(termo)
+        valores = serie.to_numpy()
+        if pd.api.types.is_integer_dtype(serie) and not valor.is_integer():
+            return np.array([], dtype=np.intp)
+        # Mesmo tipo da coluna: float32 guarda exatamente o valor do CSV (ver compact_frame)
+        return np.flatnonzero(valores == np.array(valor).astype(valores.dtype))
+    return np.flatnonzero(serie.astype(str).str.contains(termo, case=False, regex=False).to_numpy())
+
+
+def _chave_ordenacao(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy()  # Categorias já estão em ordem alfabética
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.to_numpy().view(np.int64)
+    return serie.to_numpy()
+
+
+def _argsort(chave, ascendente):
+    if ascendente:
+        return np.argsort(chave, kind='stable')
+    # Decrescente e estável: ordena a sequência invertida e desfaz a inversão
+    n = len(chave)
+    return n - 1 - np.argsort(chave[::-1], kind='stable')[::-1]
+
+
+def table_rows(df, ordenar_por=None, ascendente=True, busca=None):
+    """Posições das linhas da tabela depois da busca e da ordenação.
+
+    ``busca`` é ``(coluna, termo)`` ou ``None``. Retorna ``None`` quando a
+    tabela mostra todas as linhas na ordem original (sem alocar nada).
+    """
+    linhas = None
+    if busca is not None:
+        linhas = search(df, *busca)
+    if ordenar_por is not None:
+        chave = _chave_ordenacao(df[ordenar_por])
+        if linhas is not None:
+            chave = chave[linhas]
+        ordem = _argsort(chave, ascendente)
+        linhas = ordem if linhas is None else linhas[ordem]
+    if linhas is not None:
+        linhas.flags.writeable = False  # Fica no cache compartilhado
+    return linhas
+
+
+def page(df, linhas, numero, tamanho):
+    """Página ``numero`` (a partir de 1) de ``tamanho`` linhas; só ela é materializada."""
+    total = len(df) if linhas is None else len(linhas)
+    paginas = max(1, -(-total // tamanho))
+    numero = min(max(numero, 1), paginas)
+    inicio = (numero - 1) * tamanho
+    if linhas is None:
+        recorte = df.iloc[inicio:inicio + tamanho]
+    else:
+        recorte = df.take(linhas[inicio:inicio + tamanho])
+    return Pagina(recorte, total, numero, paginas)
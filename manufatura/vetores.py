@@ -0,0 +1,149 @@
+"""Arrays e DataFrames que crescem no fim sem copiar as linhas já existentes.
+
+A atualização ao vivo anexa poucas linhas por vez a um dataset grande.
+Concatenar a cada atualização copiaria o histórico inteiro; aqui cada
+coluna fica num buffer com folga no fim, e anexar escreve só as linhas
+novas na folga. Quando ela acaba, o buffer é realocado com capacidade
+``FATOR_CRESCIMENTO`` vezes maior; como o crescimento é geométrico, o
+custo amortizado por linha anexada é constante.
+
+Cada versão enxerga só as suas ``n`` primeiras posições do buffer, e elas
+nunca mudam depois de escritas: uma versão anterior (o ``Dataset`` que
+outras sessões ainda usam) continua vendo os mesmos dados. Só a versão
+mais recente escreve na folga; anexar a uma versão antiga copia.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+FATOR_CRESCIMENTO = 1.5  # Folga menor que ao dobrar: o dataset inteiro é realocado a cada vez
+
+
+class _Buffer:
+    """Memória de um ``GrowableArray`` e quantas posições dela já foram escritas."""
+
+    def __init__(self, dados, usados):
+        self.dados = dados
+        self.usados = usados
+        self.trava = threading.Lock()
+
+
+class GrowableArray:
+    """Array 1D somente leitura de ``n`` posições, ao qual se pode anexar valores.
+
+    ``append`` devolve um novo ``GrowableArray``; este continua igual.
+    ``valores`` não é copiado: sem folga, o primeiro ``append`` já realoca,
+    e nada é escrito nele.
+    """
+
+    def __init__(self, valores, dtype=None, _buffer=None, _n=None):
+        if _buffer is None:
+            valores = np.asarray(valores, dtype=dtype)
+            _buffer = _Buffer(valores, len(valores))
+            _n = len(valores)
+        self._buffer = _buffer
+        self.n = _n
+        self.values = _buffer.dados[:_n]
+        self.values.flags.writeable = False
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def dtype(self):
+        return self._buffer.dados.dtype
+
+    @property
+    def capacity(self):
+        return len(self._buffer.dados)
+
+    def append(self, novos):
+        """Novo array com ``novos`` no fim (convertidos para o tipo deste)."""
+        novos = np.asarray(novos)
+        if len(novos) == 0:
+            return self
+        total = self.n + len(novos)
+        buffer = self._buffer
+        with buffer.trava:
+            # Só escreve na folga se ninguém anexou a partir desta versão antes
+            if buffer.usados == self.n and total <= len(buffer.dados):
+                buffer.dados[self.n:total] = novos
+                buffer.usados = total
+                return GrowableArray(None, _buffer=buffer, _n=total)
+        dados = np.empty(max(total, int(FATOR_CRESCIMENTO * total)), dtype=self.dtype)
+        dados[:self.n] = self.values
+        dados[self.n:total] = novos
+        return GrowableArray(None, _buffer=_Buffer(dados, total), _n=total)
+
+
+def _codigos_em(categorias, valores):
+    """Códigos de ``valores`` nas ``categorias`` (-1 para nulos e valores fora delas)."""
+    return pd.Categorical(valores, categories=categorias).codes
+
+
+class AppendableFrame:
+    """DataFrame guardado em ``GrowableArray`` por coluna; ``frame()`` não copia nada.
+
+    Colunas categóricas guardam os códigos e as categorias (ordenadas, como em
+    ``ingestao.compact_frame``). Anexar linhas com o mesmo tipo e as mesmas
+    categorias custa só as linhas novas. Uma categoria nova (ex.: uma
+    máquina nova) ou valores que não cabem no tipo da coluna (ex.: um
+    ``float64`` numa coluna ``float32``) fazem a coluna ser copiada com as
+    categorias ou o tipo novos; as demais colunas continuam sem cópia.
+    """
+
+    def __init__(self, df, _colunas=None, _n=None):
+        if _colunas is None:
+            _colunas = {}
+            for coluna in df.columns:
+                serie = df[coluna]
+                if isinstance(serie.dtype, pd.CategoricalDtype):
+                    _colunas[coluna] = (GrowableArray(serie.array.codes), serie.dtype)
+                else:
+                    _colunas[coluna] = (GrowableArray(serie.to_numpy()), None)
+            _n = len(df)
+        self._colunas = _colunas
+        self.n = _n
+
+    def __len__(self):
+        return self.n
+
+    def frame(self):
+        """DataFrame das ``n`` linhas, sobre os buffers (somente leitura)."""
+        dados = {}
+        for coluna, (valores, categorias) in self._colunas.items():
+            if categorias is None:
+                dados[coluna] = valores.values
+            else:
+                # Códigos já validados ao anexar; sem validar, a coluna é montada sem percorrê-los
+                dados[coluna] = pd.Categorical.from_codes(valores.values, dtype=categorias, validate=False)
+        return pd.DataFrame(dados, copy=False)
+
+    def append(self, novas):
+        """Novo ``AppendableFrame`` com as linhas de ``novas`` (mesmas colunas) no fim."""
+        colunas = {}
+        for coluna, (valores, tipo) in self._colunas.items():
+            serie = novas[coluna]
+            if tipo is not None:
+                colunas[coluna] = self._anexar_categorica(valores, tipo, serie)
+            elif np.can_cast(serie.dtype, valores.dtype, casting='safe'):
+                colunas[coluna] = (valores.append(serie.to_numpy()), None)
+            else:
+                # Tipo mais largo: a coluna inteira é convertida (ex.: float32 -> float64)
+                largo = np.result_type(valores.dtype, serie.dtype)
+                colunas[coluna] = (GrowableArray(valores.values, largo).append(serie.to_numpy()), None)
+        return AppendableFrame(None, colunas, self.n + len(novas))
+
+    @staticmethod
+    def _anexar_categorica(codigos, tipo, serie):
+        novos = _codigos_em(tipo.categories, serie)
+        if not ((novos < 0) & serie.notna().to_numpy()).any():
+            return codigos.append(novos), tipo
+        # Categoria nova: recodifica as linhas existentes nas categorias unidas (ordenadas)
+        categorias = tipo.categories.union(pd.Index(serie.dropna().unique()))
+        novo_tipo = pd.CategoricalDtype(categorias, ordered=tipo.ordered)
+        mapa = np.append(categorias.get_indexer(tipo.categories), -1)  # O -1 (nulo) continua -1
+        dtype = pd.Categorical([], dtype=novo_tipo).codes.dtype
+        recodificados = GrowableArray(mapa[codigos.values], dtype)
+        return recodificados.append(_codigos_em(categorias, serie)), novo_tipo
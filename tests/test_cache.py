@@ -0,0 +1,73 @@
+from manufatura.cache import ResultCache
+
+
+class _Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_despeja_a_entrada_usada_ha_mais_tempo():
+    cache = ResultCache(max_bytes=30)
+    for chave in 'abc':
+        cache.put(chave, chave, tamanho=10)
+    assert cache.get('a') == 'a'  # 'b' passa a ser a menos recente
+    cache.put('d', 'd', tamanho=10)
+    assert cache.get('b') is None
+    assert [cache.get(c) for c in 'acd'] == ['a', 'c', 'd']
+    estatisticas = cache.stats()
+    assert (estatisticas.despejos, estatisticas.entradas, estatisticas.bytes) == (1, 3, 30)
+
+
+def test_resultado_maior_que_o_orcamento_nao_e_guardado():
+    cache = ResultCache(max_bytes=10)
+    cache.put('a', 'a', tamanho=5)
+    assert not cache.put('grande', 'grande', tamanho=11)
+    assert cache.get('grande') is None
+    assert cache.get('a') == 'a'
+
+
+def test_entrada_expira_pelo_ttl():
+    relogio = _Relogio()
+    cache = ResultCache(max_bytes=100, ttl=10, relogio=relogio)
+    cache.put('a', 1, tamanho=1)
+    relogio.agora = 10
+    assert cache.get('a') == 1
+    relogio.agora = 10.5
+    assert cache.get('a') is None
+    assert cache.stats().expirados == 1
+    assert len(cache) == 0
+
+
+def test_get_or_compute_so_calcula_na_falha():
+    cache = ResultCache(max_bytes=2**20)
+    chamadas = []
+    for _ in range(3):
+        assert cache.get_or_compute('a', lambda: chamadas.append(1) or 42) == 42
+    assert len(chamadas) == 1
+    assert cache.stats()[:2] == (2, 1)
+
+
+def test_ao_remover_no_despejo_na_expiracao_e_no_clear():
+    relogio = _Relogio()
+    removidos = []
+    cache = ResultCache(max_bytes=20, ttl=5, relogio=relogio)
+    for chave in 'abc':
+        cache.put(chave, chave, tamanho=10, ao_remover=removidos.append)
+    assert removidos == ['a']
+    relogio.agora = 6
+    cache.get('b')
+    assert removidos == ['a', 'b']
+    cache.clear()
+    assert removidos == ['a', 'b', 'c']
+
+
+def test_substituir_a_chave_nao_chama_ao_remover():
+    removidos = []
+    cache = ResultCache(max_bytes=100)
+    cache.put('a', 'arquivo', tamanho=10, ao_remover=removidos.append)
+    cache.put('a', 'arquivo', tamanho=10, ao_remover=removidos.append)
+    assert removidos == []
+    assert cache.stats().bytes == 10
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from manufatura import ingestao, sintetico
+from manufatura.correlacao import CorrelationStats
+
+
+def _dados(n_linhas, seed=0):
+    df = sintetico.generate(n_linhas, n_maquinas=10, dias=60, seed=seed, taxa_nulos=0)
+    return ingestao.compact_frame(df.reset_index(drop=True))
+
+
+def test_tamanho_do_esboco_nao_cresce_com_as_linhas():
+    # 10 máquinas x 5 tipos de falha: no máximo 50 grupos de 64 linhas, com 20 ou 160 mil linhas
+    particoes = []
+    for n_linhas in (20_000, 160_000):
+        estatisticas = CorrelationStats.from_frame(_dados(n_linhas), amostra_por_grupo=64)
+        particoes.append(len(estatisticas.chaves))
+        assert 64 * 45 <= len(estatisticas.amostra) <= 64 * 50
+    assert particoes[1] > particoes[0]
+
+
+def test_merge_mantem_o_limite_do_esboco():
+    df = _dados(40_000)
+    primeira = CorrelationStats.from_frame(df.iloc[:30_000], amostra_por_grupo=64)
+    segunda = CorrelationStats.from_frame(df.iloc[30_000:], primeira.colunas, primeira.deslocamento,
+                                          amostra_por_grupo=64, seed=1)
+    juntas = primeira.merge([segunda])
+    assert len(juntas.amostra) == len(primeira.amostra)
+    assert juntas.n.sum() == len(df)
+
+
+@pytest.mark.parametrize('filtros', [(), (None, None, ('Machine_1', 'Machine_2')),
+                                     (None, None, None, ('Overheating',))])
+def test_spearman_aproximado_dentro_do_erro(filtros):
+    df = _dados(60_000)
+    estatisticas = CorrelationStats.from_frame(df, amostra_por_grupo=256)
+    aproximado, erro = estatisticas.spearman_approx(*filtros)
+    linhas = df
+    if len(filtros) > 2 and filtros[2] is not None:
+        linhas = linhas[linhas['machine'].isin(filtros[2])]
+    if len(filtros) > 3:
+        linhas = linhas[linhas['failure_type'].isin(filtros[3])]
+    exato = linhas[estatisticas.colunas].corr(method='spearman')
+    # Erro 0: a amostra tem todas as linhas filtradas
+    assert erro < 1
+    assert np.nanmax(np.abs(aproximado.to_numpy() - exato.to_numpy())) <= erro + 1e-9
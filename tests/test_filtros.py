@@ -0,0 +1,73 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from manufatura import ingestao, sintetico
+from manufatura.filtros import FilterEngine
+
+
+def _dados(n_linhas, seed=0):
+    df = sintetico.generate(n_linhas, n_maquinas=6, dias=20, seed=seed, taxa_nulos=0)
+    df = ingestao.compact_frame(df.reset_index(drop=True))
+    df['date'] = df['timestamp'].dt.normalize()
+    return df
+
+
+def _mascara(df, data_inicio=None, data_fim=None, maquinas=None, tipos_falha=None):
+    # Como o filtro do dashboard original, com máscaras booleanas
+    mascara = np.ones(len(df), dtype=bool)
+    if data_inicio is not None:
+        mascara &= df['date'] >= pd.Timestamp(data_inicio)
+    if data_fim is not None:
+        mascara &= df['date'] <= pd.Timestamp(data_fim)
+    if maquinas is not None:
+        mascara &= df['machine'].isin(maquinas)
+    if tipos_falha is not None:
+        mascara &= df['failure_type'].isin(tipos_falha)
+    return np.flatnonzero(mascara)
+
+
+FILTROS = [
+    (),
+    (date(2025, 1, 3), date(2025, 1, 7)),
+    (date(2025, 1, 5), date(2025, 1, 5)),
+    (date(2024, 12, 1), date(2024, 12, 31)),  # Antes dos dados
+    (date(2025, 1, 7), date(2025, 1, 3)),  # Invertido: nenhuma linha
+    (None, None, ('Machine_2',)),
+    (None, None, ('Machine_1', 'Machine_4', 'Machine_9')),  # Machine_9 não existe
+    (None, None, None, ('Overheating', 'No Failure')),
+    (date(2025, 1, 2), None, ('Machine_3', 'Machine_5'), ('Electrical Fault',)),
+    (None, date(2025, 1, 10), ('Machine_6',), ('Tipo inexistente',)),
+    (None, None, ('Machine_9',), ('Sensor Fault', 'Overheating')),
+]
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_select_igual_as_mascaras(filtros):
+    df = _dados(20_000)
+    motor = FilterEngine(df)
+    linhas = motor.select(*filtros)
+    if isinstance(linhas, slice):
+        linhas = np.arange(len(df))[linhas]
+    np.testing.assert_array_equal(linhas, _mascara(df, *filtros))
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_append_igual_a_construir_de_novo(filtros):
+    df = _dados(20_000)
+    # Linhas novas com uma máquina e um tipo de falha que o motor ainda não conhece
+    novas = _dados(2_000, seed=1).iloc[1_000:].copy()
+    novas['timestamp'] += pd.Timedelta(days=25)
+    novas['date'] = novas['timestamp'].dt.normalize()
+    novas['machine'] = novas['machine'].cat.rename_categories({'Machine_1': 'Machine_9'})
+    novas['failure_type'] = novas['failure_type'].cat.rename_categories({'Pressure Drop': 'Sensor Fault'})
+    todas = pd.concat([df, novas], ignore_index=True)
+    todas[['machine', 'failure_type']] = todas[['machine', 'failure_type']].astype('category')
+
+    anexado = FilterEngine(df).append(todas)
+    linhas = anexado.select(*filtros)
+    if isinstance(linhas, slice):
+        linhas = np.arange(len(todas))[linhas]
+    np.testing.assert_array_equal(linhas, _mascara(todas, *filtros))
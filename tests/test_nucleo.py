@@ -0,0 +1,336 @@
+import filecmp
+import gc
+import glob
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from manufatura import ingestao, nucleo, sintetico
+from manufatura.cache import ResultCache
+from manufatura.nucleo import Filtros
+
+N_LINHAS = 30_000
+
+FILTROS = [
+    Filtros(),
+    Filtros(date(2025, 1, 4), date(2025, 1, 9)),
+    Filtros(None, None, ('Machine_2', 'Machine_5')),
+    Filtros(None, None, None, ('Overheating', 'No Failure')),
+    Filtros(date(2025, 1, 2), date(2025, 1, 20), ('Machine_1', 'Machine_3', 'Machine_7'), ('Electrical Fault',)),
+    Filtros(date(2024, 12, 1), date(2024, 12, 2)),  # Nenhuma linha
+]
+
+
+def _escrever(caminho, df):
+    df.to_csv(caminho)
+    return str(caminho)
+
+
+@pytest.fixture(scope='module')
+def dados():
+    # Com nulos, para exercitar o ``dropna`` da ingestão
+    return sintetico.generate(N_LINHAS, n_maquinas=8, dias=30, seed=7, taxa_nulos=0.01)
+
+
+@pytest.fixture(scope='module')
+def csv(dados, tmp_path_factory):
+    return _escrever(tmp_path_factory.mktemp('csv') / 'dados.csv', dados)
+
+
+@pytest.fixture(scope='module')
+def datasets(csv):
+    return {backend: nucleo.Dataset.load(csv, ResultCache(), backend) for backend in ('pandas', 'sqlite')}
+
+
+def _original(caminho, filtros):
+    """Recorte e indicadores como o ``Dashboard.py`` original calculava, em pandas."""
+    df = pd.read_csv(caminho)
+    df.dropna(axis=0, inplace=True)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['date'] = df['timestamp'].dt.date
+    if filtros.data_inicio is not None:
+        df = df[(df['date'] >= filtros.data_inicio) & (df['date'] <= filtros.data_fim)]
+    if filtros.maquinas is not None:
+        df = df[df['machine'].isin(filtros.maquinas)]
+    if filtros.tipos_falha is not None:
+        df = df[df['failure_type'].isin(filtros.tipos_falha)]
+
+    medias = df.groupby('machine')[list(nucleo.NOMES_SENSORES)].mean().rename(columns=nucleo.NOMES_SENSORES)
+    medias = medias.reset_index().dropna().melt(id_vars=['machine'], var_name='Metrica', value_name='Valor Médio')
+    manutencao = df[df['maintenance_required'] == 'Yes'].groupby('machine').size()
+    status = [(df['machine_status'] == s).sum() / len(df) * 100 if len(df) else 0
+              for s in ('Running', 'Failure', 'Idle')]
+    paradas = df[df['machine_status'] == 'Idle'].groupby('machine').size()
+    status_por_falha = df[df['machine_status'].isin(['Idle', 'Failure'])] \
+        .groupby(['failure_type', 'machine_status']).size().reset_index(name='contagem')
+    sem_tipo = status_por_falha['failure_type'] == 'No Failure'
+    status_por_falha.loc[sem_tipo & (status_por_falha['machine_status'] == 'Idle'),
+                         'failure_type'] = 'Parada Programada/Outra'
+    status_por_falha.loc[sem_tipo & (status_por_falha['machine_status'] == 'Failure'),
+                         'failure_type'] = 'Falha (Tipo Não Especificado)'
+    falhas = df[(df['machine_status'] == 'Failure') & (df['failure_type'] != 'No Failure')]
+    numericas = df.select_dtypes(include=np.number).drop(columns=['Unnamed: 0'], errors='ignore')
+    return dict(df=df, medias=medias, manutencao=manutencao, status=status, paradas=paradas,
+                status_por_falha=status_por_falha, falhas=falhas.groupby(['machine', 'failure_type']).size(),
+                pearson=numericas.corr(method='pearson'), spearman=numericas.corr(method='spearman'))
+
+
+def _contagens(df, chaves, coluna):
+    """``{chaves: contagem}`` sem as contagens zero (o cubo guarda todas as combinações)."""
+    return {tuple(str(v) for v in linha[:-1]): int(linha[-1])
+            for linha in df[chaves + [coluna]].itertuples(index=False) if linha[-1]}
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_indicadores_iguais_ao_dashboard_original(datasets, csv, filtros):
+    original = _original(csv, filtros)
+    for dataset in datasets.values():
+        kpis = dataset.kpis(filtros)
+        assert kpis.total_linhas == len(original['df'])
+
+        medias = kpis.medias_melted.astype({'machine': str}).sort_values(['machine', 'Metrica'])
+        esperadas = original['medias'].sort_values(['machine', 'Metrica'])
+        assert list(medias[['machine', 'Metrica']].itertuples(index=False)) == \
+            list(esperadas[['machine', 'Metrica']].itertuples(index=False))
+        np.testing.assert_allclose(medias['Valor Médio'].astype(float), esperadas['Valor Médio'].astype(float),
+                                   rtol=1e-9)
+
+        assert _contagens(kpis.manutencao, ['machine'], 'contagem_manutencao') == \
+            {(str(m),): int(c) for m, c in original['manutencao'].items()}
+        status = dict(zip(kpis.status_maquinas['Status'], kpis.status_maquinas['Porcentagem']))
+        for rotulo, percentual in zip(['Rodando', 'Em Falha', 'Paradas'], original['status']):
+            assert status.get(rotulo, 0) == pytest.approx(percentual)
+        assert _contagens(kpis.status_por_falha, ['failure_type', 'machine_status'], 'contagem') == \
+            _contagens(original['status_por_falha'], ['failure_type', 'machine_status'], 'contagem')
+        assert _contagens(kpis.tipos_falha_por_maquina, ['machine', 'failure_type'], 'quantidade_falhas') == \
+            {tuple(k): int(c) for k, c in original['falhas'].items() if c}
+
+        paradas = original['paradas'][original['paradas'] > 0]
+        if paradas.empty:
+            assert kpis.maquina_mais_paradas == kpis.maquina_menos_paradas == 'N/A'
+        else:
+            assert (kpis.cont_mais_paradas, kpis.cont_menos_paradas) == (paradas.max(), paradas.min())
+            assert paradas[str(kpis.maquina_mais_paradas)] == paradas.max()
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_correlacoes_iguais_ao_dashboard_original(datasets, csv, filtros):
+    original = _original(csv, filtros)
+    for dataset in datasets.values():
+        correlacoes = dataset.correlations(filtros, spearman_aproximado=False)
+        if original['df'].empty:
+            assert correlacoes.pearson.empty and correlacoes.spearman.empty
+            continue
+        colunas = list(original['pearson'].columns)
+        assert list(correlacoes.pearson.columns) == colunas
+        np.testing.assert_allclose(correlacoes.pearson.loc[colunas, colunas], original['pearson'], atol=1e-7)
+        np.testing.assert_allclose(correlacoes.spearman.loc[colunas, colunas], original['spearman'], atol=1e-9)
+
+        aproximado = dataset.correlations(filtros, spearman_aproximado=True)
+        diferenca = np.abs(aproximado.spearman.loc[colunas, colunas] - original['spearman']).to_numpy()
+        assert np.nanmax(diferenca) <= aproximado.erro_spearman + 1e-9
+
+
+def _normalizar(df):
+    df = df.reset_index(drop=True)
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(str)
+        elif df[coluna].dtype.kind in 'iuf':
+            df[coluna] = df[coluna].astype('float64')
+    return df
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_backends_pandas_e_sqlite_iguais(datasets, filtros):
+    pandas_, sqlite = datasets['pandas'], datasets['sqlite']
+    assert len(pandas_) == len(sqlite) and list(pandas_.columns) == list(sqlite.columns)
+    pd.testing.assert_frame_equal(_normalizar(pandas_.filter(filtros)), _normalizar(sqlite.filter(filtros)))
+    np.testing.assert_allclose(pandas_.backend.pearson(filtros), sqlite.backend.pearson(filtros), atol=1e-9)
+
+    for ordenar_por, ascendente, busca in [(None, True, None), ('temperature', False, None),
+                                           ('machine', True, ('failure_type', 'over')),
+                                           (None, True, ('timestamp', '2025-01-05'))]:
+        for numero in (1, 3):
+            a = pandas_.table_page(filtros, numero, 50, ordenar_por, ascendente, busca)
+            b = sqlite.table_page(filtros, numero, 50, ordenar_por, ascendente, busca)
+            assert (a.total, a.numero, a.paginas) == (b.total, b.numero, b.paginas)
+            pd.testing.assert_frame_equal(_normalizar(a.linhas), _normalizar(b.linhas))
+
+    assert filecmp.cmp(pandas_.export_file(filtros, 'csv'), sqlite.export_file(filtros, 'csv'), shallow=False)
+    pd.testing.assert_frame_equal(_normalizar(pd.read_parquet(pandas_.export_file(filtros, 'parquet'))),
+                                  _normalizar(pd.read_parquet(sqlite.export_file(filtros, 'parquet'))))
+
+    for inicio, fim in [(datetime(2025, 1, 3), datetime(2025, 1, 3, 6)), (datetime(2025, 1, 1), datetime(2025, 2, 1))]:
+        a = pandas_.trend(filtros, 'Machine_2', 'temperature', inicio, fim, 200)
+        b = sqlite.trend(filtros, 'Machine_2', 'temperature', inicio, fim, 200)
+        assert (a.linhas, a.resolucao) == (b.linhas, b.resolucao)
+        pd.testing.assert_frame_equal(_normalizar(a.pontos), _normalizar(b.pontos), rtol=1e-6)
+
+
+@pytest.mark.parametrize('backend', ['pandas', 'sqlite'])
+def test_anexar_igual_a_recarregar(dados, tmp_path, backend):
+    caminho = _escrever(tmp_path / 'anexado.csv', dados.iloc[:20_000])
+    dataset = nucleo.Dataset.load(caminho, ResultCache(), backend)
+    anterior = dataset
+    # O último trecho é anterior ao que já foi anexado: as linhas chegam fora de ordem
+    for inicio, fim in [(20_000, 20_010), (25_000, N_LINHAS), (20_010, 25_000)]:
+        dados.iloc[inicio:fim].to_csv(caminho, mode='a', header=False)
+        atualizacao = ingestao.update_columnar_cache(caminho)
+        assert not atualizacao.reconstruido
+        dataset = dataset.append(atualizacao)
+
+    completo = str(tmp_path / 'completo.csv')
+    shutil.copyfile(caminho, completo)
+    recarregado = nucleo.Dataset.load(completo, ResultCache(), backend)
+    assert len(dataset) == len(recarregado) > len(anterior)
+    assert dataset.filter(Filtros())['timestamp'].is_monotonic_increasing
+    for filtros in FILTROS:
+        pd.testing.assert_frame_equal(_normalizar(dataset.filter(filtros)), _normalizar(recarregado.filter(filtros)))
+        a, b = dataset.kpis(filtros), recarregado.kpis(filtros)
+        assert a.total_linhas == b.total_linhas
+        for campo in ('medias_melted', 'manutencao', 'status_maquinas', 'status_por_falha', 'tipos_falha_por_maquina'):
+            pd.testing.assert_frame_equal(_normalizar(getattr(a, campo)), _normalizar(getattr(b, campo)))
+        if a.total_linhas:
+            np.testing.assert_allclose(dataset.backend.pearson(filtros), recarregado.backend.pearson(filtros),
+                                       atol=1e-9)
+            np.testing.assert_allclose(dataset.correlations(filtros, False).spearman,
+                                       recarregado.correlations(filtros, False).spearman, atol=1e-12)
+    # O snapshot anterior continua com as linhas dele
+    assert anterior.count(Filtros()) == len(anterior) < len(dataset)
+
+
+@pytest.mark.parametrize('backend', ['pandas', 'sqlite'])
+def test_exportacoes_simultaneas(csv, backend):
+    dataset = nucleo.Dataset.load(csv, ResultCache(), backend)
+    pedidos = [(filtros, formato) for filtros in FILTROS[:3] for formato in ('csv', 'parquet')] * 4
+    with ThreadPoolExecutor(8) as executor:
+        caminhos = list(executor.map(lambda pedido: dataset.export_file(*pedido), pedidos))
+    for (filtros, formato), caminho in zip(pedidos, caminhos):
+        assert caminho == dataset.export_file(filtros, formato)
+        if formato == 'csv':
+            with open(caminho, 'rb') as arquivo:
+                assert arquivo.read() == nucleo.export_csv(dataset.filter(filtros))
+        else:
+            # A coluna ``date`` é gravada como dia (date32)
+            exportado = pd.read_parquet(caminho).astype({'date': 'datetime64[ns]'})
+            pd.testing.assert_frame_equal(_normalizar(exportado),
+                                          _normalizar(ingestao.display_frame(dataset.filter(filtros))))
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_load_data_com_recorte_igual_a_mascara(csv, filtros):
+    completo = ingestao.load_data(csv)
+    mascara = np.ones(len(completo), dtype=bool)
+    if filtros.data_inicio is not None:
+        mascara &= completo['date'] >= pd.Timestamp(filtros.data_inicio)
+        mascara &= completo['date'] <= pd.Timestamp(filtros.data_fim)
+    if filtros.maquinas is not None:
+        mascara &= completo['machine'].isin(filtros.maquinas)
+    recorte = ingestao.load_data(csv, None, *filtros[:3])
+    pd.testing.assert_frame_equal(_normalizar(recorte), _normalizar(completo[mascara]))
+
+
+JANELA = Filtros(date(2025, 1, 10), date(2025, 1, 25), ('Machine_1', 'Machine_3', 'Machine_4'))
+
+
+def _comparar_com_a_janela(dataset, completo):
+    """``dataset`` (carregado com ``JANELA``) responde como ``completo`` filtrado por ela."""
+    for tipos_falha in (None, ('Overheating', 'No Failure')):
+        filtros = Filtros(tipos_falha=tipos_falha)
+        na_janela = JANELA._replace(tipos_falha=tipos_falha)
+        pd.testing.assert_frame_equal(_normalizar(dataset.filter(filtros)),
+                                      _normalizar(completo.filter(na_janela)))
+        a, b = dataset.kpis(filtros), completo.kpis(na_janela)
+        assert a.total_linhas == b.total_linhas > 0
+        for campo in ('medias_melted', 'manutencao', 'status_maquinas', 'status_por_falha', 'tipos_falha_por_maquina'):
+            pd.testing.assert_frame_equal(_normalizar(getattr(a, campo)), _normalizar(getattr(b, campo)))
+        np.testing.assert_allclose(dataset.backend.pearson(filtros), completo.backend.pearson(na_janela), atol=1e-9)
+
+
+def test_janela_carrega_so_o_recorte(csv, datasets):
+    dataset = nucleo.Dataset.load(csv, ResultCache(), 'pandas', janela=JANELA)
+    assert len(dataset) == datasets['pandas'].count(JANELA) < len(datasets['pandas'])
+    assert (dataset.data_min, dataset.data_max) == (JANELA.data_inicio, JANELA.data_fim)
+    assert dataset.maquinas == list(JANELA.maquinas)
+    _comparar_com_a_janela(dataset, datasets['pandas'])
+
+
+def test_janela_no_anexo(dados, tmp_path, datasets):
+    caminho = _escrever(tmp_path / 'janela.csv', dados.iloc[:20_000])
+    dataset = nucleo.Dataset.load(caminho, ResultCache(), 'pandas', janela=JANELA)
+    dados.iloc[20_000:].to_csv(caminho, mode='a', header=False)
+    dataset = dataset.append(ingestao.update_columnar_cache(caminho))
+    _comparar_com_a_janela(dataset, datasets['pandas'])
+
+
+def test_janela_pelo_ambiente(csv, monkeypatch):
+    monkeypatch.setenv('DASHBOARD_JANELA_DIAS', '7')
+    dataset = nucleo.Dataset.load(csv, ResultCache(), 'pandas')
+    assert (dataset.data_max - dataset.data_min).days == 6
+    assert dataset.count(Filtros()) == dataset.count(Filtros(dataset.data_min, dataset.data_max)) > 0
+
+
+def test_sqlite_snapshot_anterior_sobrevive_a_reconstrucao(dados, tmp_path):
+    caminho = _escrever(tmp_path / 'reescrito.csv', dados.iloc[:10_000])
+    anterior = nucleo.Dataset.load(caminho, ResultCache(), 'sqlite')
+    banco_anterior = anterior.backend.banco.caminho
+    _escrever(caminho, dados.iloc[5_000:20_000])  # Reescrito: o cache colunar é refeito
+    assert ingestao.update_columnar_cache(caminho).reconstruido
+    atual = nucleo.Dataset.load(caminho, ResultCache(), 'sqlite')
+    assert atual.backend.banco.caminho != banco_anterior
+
+    # Uma thread nova (sem conexão aberta) ainda consulta o snapshot anterior
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(anterior.count, Filtros()).result() == len(anterior)
+    assert len(atual) > len(anterior)
+
+    del anterior
+    gc.collect()
+    assert not os.path.exists(banco_anterior)
+    assert glob.glob(os.path.join(os.path.dirname(banco_anterior), '*.sqlite')) == [atual.backend.banco.caminho]
+
+
+def test_exportacao_maior_que_o_orcamento_e_reaproveitada(csv, monkeypatch):
+    dataset = nucleo.Dataset.load(csv, ResultCache(max_bytes=1024), 'pandas')
+    escritas = []
+    escrever = nucleo.exportacao.write_blocks
+
+    def contar(*args, **kwargs):
+        escritas.append(args[2])
+        return escrever(*args, **kwargs)
+
+    monkeypatch.setattr(nucleo.exportacao, 'write_blocks', contar)
+    caminho = dataset.export_file(FILTROS[1], 'csv')
+    assert dataset.export_file(FILTROS[1], 'csv') == caminho and len(escritas) == 1
+    # Outra exportação avulsa substitui (e apaga) a anterior
+    outro = dataset.export_file(FILTROS[2], 'csv')
+    assert not os.path.exists(caminho) and os.path.exists(outro) and len(escritas) == 2
+    assert dataset.export_file(FILTROS[1], 'csv') == caminho and len(escritas) == 3
+
+
+@pytest.mark.parametrize('backend', ['pandas', 'sqlite'])
+def test_piramides_passam_para_o_snapshot_seguinte(dados, tmp_path, backend, monkeypatch):
+    caminho = _escrever(tmp_path / 'series.csv', dados.iloc[:20_000])
+    dataset = nucleo.Dataset.load(caminho, ResultCache(), backend)
+    periodo = (datetime(2025, 1, 1), datetime(2025, 2, 1))
+    dataset.trend(Filtros(), 'Machine_2', 'temperature', *periodo, 100)  # Monta a pirâmide
+    for inicio, fim in [(20_000, 20_010), (20_010, N_LINHAS)]:
+        dados.iloc[inicio:fim].to_csv(caminho, mode='a', header=False)
+        dataset = dataset.append(ingestao.update_columnar_cache(caminho))
+        assert dataset.cache.get(('piramide', 'Machine_2')) is not None
+    monkeypatch.setattr(dataset.backend, 'series_base', None)  # A consulta tem de usar a pirâmide estendida
+
+    completo = str(tmp_path / 'completo.csv')
+    shutil.copyfile(caminho, completo)
+    recarregado = nucleo.Dataset.load(completo, ResultCache(), backend)
+    for sensor in ('temperature', 'vibration'):
+        a = dataset.trend(Filtros(), 'Machine_2', sensor, *periodo, 100)
+        b = recarregado.trend(Filtros(), 'Machine_2', sensor, *periodo, 100)
+        assert (a.linhas, a.resolucao) == (b.linhas, b.resolucao)
+        pd.testing.assert_frame_equal(a.pontos, b.pontos, rtol=1e-9)
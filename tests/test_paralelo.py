@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from manufatura import cubo, ingestao, paralelo, sintetico
+
+N_LINHAS = 120_000  # Duas faixas de ``paralelo.LINHAS_MINIMAS`` com 2 processos
+
+
+@pytest.fixture(scope='module')
+def dados():
+    df = sintetico.generate(N_LINHAS, n_maquinas=8, dias=30, seed=11, taxa_nulos=0)
+    df = ingestao.compact_frame(df.reset_index(drop=True))
+    df['date'] = df['timestamp'].dt.normalize()
+    return df
+
+
+def _ordenar_cubo(df):
+    df = df.sort_values(cubo.DIMENSOES).reset_index(drop=True)
+    for dimensao in cubo.DIMENSOES:
+        if isinstance(df[dimensao].dtype, pd.CategoricalDtype):
+            df[dimensao] = df[dimensao].astype(str)
+    return df
+
+
+@pytest.mark.parametrize('dimensoes', ['category', object])
+def test_aggregate_paralelo_igual_ao_serial(dados, dimensoes):
+    df = dados.astype({c: dimensoes for c in ingestao.COLUNAS_CATEGORICAS})
+    serial = paralelo.aggregate(df, 1)
+    paralelo_ = paralelo.aggregate(df, 2)
+    # Texto volta como objeto, como em ``df`` (os processos recebem categorias)
+    for dimensao in cubo.DIMENSOES:
+        assert (paralelo_.cubo[dimensao].dtype == object) == (df[dimensao].dtype == object)
+    pd.testing.assert_frame_equal(_ordenar_cubo(paralelo_.cubo), _ordenar_cubo(serial.cubo), check_dtype=False)
+
+    assert paralelo_.estatisticas.n.sum() == serial.estatisticas.n.sum() == N_LINHAS
+    np.testing.assert_allclose(paralelo_.estatisticas.pearson(), serial.estatisticas.pearson(), atol=1e-9)
+    filtros = (pd.Timestamp('2025-01-05'), pd.Timestamp('2025-01-12'), ['Machine_2', 'Machine_6'])
+    np.testing.assert_allclose(paralelo_.estatisticas.pearson(*filtros), serial.estatisticas.pearson(*filtros),
+                               atol=1e-9)
+
+
+def test_spearman_paralelo_igual_ao_pandas(dados):
+    df = dados[cubo.SENSORES]
+    np.testing.assert_allclose(paralelo.spearman(df, 2), df.corr(method='spearman'), atol=1e-12)
+
+
+def test_open_shared_le_as_linhas_da_faixa(dados):
+    colunas = ['timestamp', 'machine', 'temperature']
+    df = dados[colunas].astype({'machine': object})
+    with paralelo.SharedFrame(df, colunas) as compartilhado:
+        faixa, blocos = paralelo.open_shared(compartilhado.descricao, 1_000, 2_500)
+        try:
+            esperado = df.iloc[1_000:2_500].reset_index(drop=True).astype({'machine': 'category'})
+            pd.testing.assert_frame_equal(faixa, esperado, check_categorical=False)
+        finally:
+            del faixa
+            for bloco in blocos:
+                bloco.close()
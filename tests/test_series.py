@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from manufatura import series
+from manufatura.cache import ResultCache
+
+
+def _serie(n, seed=0):
+    rng = np.random.default_rng(seed)
+    segundos = np.sort(rng.integers(0, 90 * 86_400, n))
+    timestamps = (pd.Timestamp('2025-01-01') + pd.to_timedelta(segundos, unit='s')).to_numpy()
+    valores = np.cumsum(rng.normal(size=(n, 2)), axis=0)
+    return timestamps, valores
+
+
+@pytest.mark.parametrize('n, n_saida, esperado', [(1_000, 100, 100), (1_000, 3, 3), (101, 100, 100),
+                                                  (50, 100, 50), (10, 2, 10)])
+def test_lttb_mantem_as_pontas(n, n_saida, esperado):
+    timestamps, valores = _serie(n)
+    indices = series.lttb(timestamps.view(np.int64), valores[:, 0], n_saida)
+    assert len(indices) == esperado
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_guarda_os_extremos_de_um_pico():
+    x = np.arange(1_000)
+    y = np.zeros(1_000)
+    y[500], y[700] = 10.0, -10.0
+    indices = series.lttb(x, y, 50)
+    assert 500 in indices and 700 in indices
+
+
+@pytest.mark.parametrize('n', [300, 1_000, 50_000])
+def test_downsample_rows_dentro_dos_limites(n):
+    timestamps, valores = _serie(n)
+    serie = series.downsample_rows(timestamps, valores[:, 0], 200)
+    pontos = serie.pontos
+    assert serie.linhas == n
+    assert len(pontos) <= 200
+    assert pontos['timestamp'].iloc[0] == timestamps[0]
+    if serie.resolucao != 'mínimo/máximo das linhas':
+        assert pontos['timestamp'].iloc[-1] == timestamps[-1]
+    assert (pontos['minimo'] <= pontos['media'] + 1e-9).all()
+    assert (pontos['media'] <= pontos['maximo'] + 1e-9).all()
+    assert pontos['minimo'].min() == valores[:, 0].min()
+    assert pontos['maximo'].max() == valores[:, 0].max()
+
+
+def test_piramide_preserva_contagem_soma_e_extremos():
+    timestamps, valores = _serie(20_000)
+    niveis = series.build_pyramid(series.rows_level(timestamps, valores))
+    assert [nivel.nome for nivel in niveis] == series.NIVEIS
+    for nivel in niveis:
+        largura = pd.Timedelta(nivel.nome).value
+        assert nivel.contagem.sum() == len(timestamps)
+        np.testing.assert_allclose(nivel.soma.sum(axis=0), valores.sum(axis=0))
+        np.testing.assert_array_equal(nivel.minimo.min(axis=0), valores.min(axis=0))
+        np.testing.assert_array_equal(nivel.maximo.max(axis=0), valores.max(axis=0))
+        assert (np.diff(nivel.inicio) > 0).all() and (nivel.inicio % largura == 0).all()
+        # Cada intervalo cobre exatamente as linhas que começam nele
+        ids = timestamps.view(np.int64) // largura
+        np.testing.assert_array_equal(nivel.contagem, np.bincount(ids - ids[0])[np.unique(ids) - ids[0]])
+
+
+class _Backend:
+    """Só o necessário para ``series.SeriesIndex``, com as linhas de uma máquina em memória."""
+
+    def __init__(self, timestamps, valores):
+        self.schema = pd.DataFrame(columns=series.SENSORES[:2])
+        self.timestamps = timestamps
+        self.valores = valores
+
+    def series_base(self, maquina, sensores):
+        return series.rows_level(self.timestamps, self.valores)
+
+    def series_rows(self, maquina, sensor, inicio, fim, tipos_falha=None, limite=None):
+        a = np.searchsorted(self.timestamps, np.datetime64(inicio), side='left')
+        b = np.searchsorted(self.timestamps, np.datetime64(fim), side='right')
+        if limite is not None and b - a > limite:
+            return None, None, b - a
+        return self.timestamps[a:b], self.valores[a:b, series.SENSORES.index(sensor)], b - a
+
+
+@pytest.mark.parametrize('inicio, fim', [('2025-01-01', '2025-04-01'), ('2025-02-01', '2025-02-03'),
+                                         ('2025-02-01 10:00', '2025-02-01 11:00')])
+def test_consulta_da_piramide_dentro_dos_limites(inicio, fim):
+    timestamps, valores = _serie(200_000)
+    indice = series.SeriesIndex(_Backend(timestamps, valores), ResultCache())
+    serie = indice.query('Machine_1', 'pressure', pd.Timestamp(inicio), pd.Timestamp(fim), 300)
+    dentro = (timestamps >= np.datetime64(inicio)) & (timestamps <= np.datetime64(fim))
+    pontos = serie.pontos
+    assert serie.linhas == dentro.sum()
+    assert 0 < len(pontos) <= 300
+    assert (pontos['minimo'] <= pontos['maximo']).all()
+    # Os intervalos do nível escolhido podem começar antes de ``inicio`` (o que o contém)
+    largura = pd.Timedelta(serie.resolucao.rsplit(' ', 1)[-1]).value if 'intervalos' in serie.resolucao else 1
+    assert pontos['timestamp'].iloc[0].value >= pd.Timestamp(inicio).value // largura * largura
+    assert pontos['timestamp'].iloc[-1] <= pd.Timestamp(fim)
+    coberto = (timestamps >= pontos['timestamp'].iloc[0].to_datetime64()) & (timestamps <= np.datetime64(fim))
+    assert pontos['minimo'].min() >= valores[coberto, 1].min()
+    assert pontos['maximo'].max() <= valores[coberto, 1].max()
+
+
+@pytest.mark.parametrize('corte', [1, 15_000, 19_999])
+def test_piramide_estendida_igual_a_remontada(corte):
+    timestamps, valores = _serie(20_000)
+    niveis = series.build_pyramid(series.rows_level(timestamps[:corte], valores[:corte]))
+    estendidos = series.extend_pyramid(niveis, series.rows_level(timestamps[corte:], valores[corte:]))
+    for nivel, esperado in zip(estendidos, series.build_pyramid(series.rows_level(timestamps, valores))):
+        assert nivel.nome == esperado.nome
+        for campo in ('inicio', 'minimo', 'maximo', 'contagem'):
+            np.testing.assert_array_equal(getattr(nivel, campo), getattr(esperado, campo))
+        np.testing.assert_allclose(nivel.soma, esperado.soma)
+
+
+def test_piramide_nao_estende_com_linhas_anteriores():
+    timestamps, valores = _serie(1_000)
+    niveis = series.build_pyramid(series.rows_level(timestamps[500:], valores[500:]))
+    assert series.extend_pyramid(niveis, series.rows_level(timestamps[:500], valores[:500])) is None
+    assert series.extend_pyramid(niveis, series.rows_level(timestamps[:0], valores[:0])) is niveis